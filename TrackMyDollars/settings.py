@@ -112,6 +112,18 @@ import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=600)
 DATABASES['default'].update(db_from_env)
 
+# Cached reports and their version keys are shared by every worker process, so an invalidation in one is seen by all
+# of them. The table is created by the budgets migrations.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
 # Password validation
 # TODO: Check out options for password validation
 AUTH_PASSWORD_VALIDATORS = [
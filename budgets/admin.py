@@ -23,6 +23,14 @@ class InstallmentDebtBalanceAdmin(admin.ModelAdmin):
     list_display = ('debt', 'balance', 'date')
 
 
+class NetWorthSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'asset_total', 'installment_debt_total', 'revolving_debt_total')
+
+
+class BudgetPeriodSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'month', 'total_actual_income', 'total_actual_expenses')
+
+
 class RevolvingDebtAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'interest_rate', 'credit_limit',)
 
@@ -37,8 +45,10 @@ admin.site.register(InstallmentDebt, InstallmentDebtAdmin)
 admin.site.register(InstallmentDebtBalance, InstallmentDebtBalanceAdmin)
 admin.site.register(RevolvingDebt, RevolvingDebtAdmin)
 admin.site.register(RevolvingDebtBalance, RevolvingDebtBalanceAdmin)
+admin.site.register(NetWorthSnapshot, NetWorthSnapshotAdmin)
 admin.site.register(ScheduleItem)
 admin.site.register(BudgetPeriod, BudgetPeriodAdmin)
+admin.site.register(BudgetPeriodSummary, BudgetPeriodSummaryAdmin)
 admin.site.register(IncomeBudgetItem)
 admin.site.register(IncomeTransaction)
 admin.site.register(ExpenseCategory)
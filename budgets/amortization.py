@@ -0,0 +1,228 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+
+from .cache_versions import bump_cache_version, get_cache_versions
+
+AMORTIZATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+CENT = Decimal('0.01')
+
+# Schedules are cut off after this many months, a debt that isn't paid off by then is treated as never paid off
+AMORTIZATION_MAX_MONTHS = 50 * 12
+
+# payments, interest, principal and balances are per month numpy arrays in dollars, rounded to cents, with the first
+# month being the month after start_date. payoff_date and total_interest are None when the payment never pays the
+# debt off.
+AmortizationSchedule = namedtuple(
+    'AmortizationSchedule',
+    ['debt_id', 'start_date', 'starting_balance', 'monthly_payment', 'months', 'payments', 'interest', 'principal',
+     'balances', 'payoff_date', 'total_interest'],
+)
+
+
+def to_cents(value):
+    """ Converts a float amount of dollars to a Decimal rounded to cents """
+    return Decimal(str(round(float(value), 2))).quantize(CENT)
+
+
+def get_monthly_rate(interest_rate):
+    """ Converts an annual percentage rate, e.g. 6.5 for 6.5%, to a monthly rate, e.g. 0.0054 """
+    return float(interest_rate or 0) / 100 / 12
+
+
+def get_payment_for_payoff(balance, monthly_rate, month_count):
+    """
+    Gets the fixed monthly payment that pays off a balance in a number of months.
+
+    Parameters:
+        balance (float): The balance to pay off.
+        monthly_rate (float): The monthly interest rate, see get_monthly_rate.
+        month_count (int): The number of monthly payments.
+
+    Returns:
+        float: The payment, or None if there are no months left to pay in.
+    """
+    if month_count < 1:
+        return None
+    if not monthly_rate:
+        return balance / month_count
+    return balance * monthly_rate / (1 - (1 + monthly_rate) ** -month_count)
+
+
+def get_amortization_inputs(debt):
+    """
+    Gets what a debt's schedule is calculated from.
+
+    The schedule starts from the latest balance entry, or from the initial amount this month when there are no
+    balances. The payment is the minimum payment, or the payment that reaches the payoff date when no minimum payment
+    is set.
+
+    Parameters:
+        debt (InstallmentDebt): The debt.
+
+    Returns:
+        tuple[float, date, float, float] | None: (starting balance, start date, monthly rate, monthly payment) or
+            None when the debt doesn't have enough information.
+    """
+    if debt.latest_balance is not None:
+        balance = float(debt.latest_balance)
+        start_date = debt.latest_balance_date or date.today()
+    elif debt.initial_amount is not None:
+        balance = float(debt.initial_amount)
+        start_date = date.today()
+    else:
+        return None
+
+    monthly_rate = get_monthly_rate(debt.interest_rate)
+    payment = float(debt.minimum_payment) if debt.minimum_payment else None
+    if payment is None and debt.payoff_date:
+        delta = relativedelta(debt.payoff_date, start_date)
+        payment = get_payment_for_payoff(balance, monthly_rate, delta.years * 12 + delta.months)
+    if not payment or payment <= 0:
+        return None
+    return balance, start_date, monthly_rate, payment
+
+
+def calculate_amortization(balances, monthly_rates, payments, max_months=AMORTIZATION_MAX_MONTHS):
+    """
+    Calculates the amortization schedules of several loans at once.
+
+    Uses the closed form of a fixed payment loan, where the balance after k payments is
+    B * (1 + r)^k - P * ((1 + r)^k - 1) / r, so every month of every loan is worked out with array operations instead
+    of stepping through the months. A loan is paid off after n = ceil(-log(1 - r * B / P) / log(1 + r)) payments.
+
+    Parameters:
+        balances (Sequence[float]): The starting balance of each loan.
+        monthly_rates (Sequence[float]): The monthly interest rate of each loan.
+        payments (Sequence[float]): The fixed monthly payment of each loan.
+        max_months (int): The most months to calculate.
+
+    Returns:
+        tuple: The number of payments each loan takes, or -1 when it isn't paid off within max_months, then 2D arrays
+            of the payments, interest, principal and balances with one row per loan and one column per month.
+    """
+    balances = np.asarray(balances, dtype=np.float64)
+    rates = np.asarray(monthly_rates, dtype=np.float64)
+    payments = np.asarray(payments, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Payments that don't cover the interest never pay the loan off and log1p gives nan for them
+        month_counts = np.where(
+            rates > 0,
+            np.ceil(-np.log1p(-rates * balances / payments) / np.log1p(rates)),
+            np.ceil(balances / payments),
+        )
+    month_counts = np.where(balances <= 0, 0, month_counts)
+    paid_off = np.isfinite(month_counts) & (month_counts <= max_months)
+    month_counts = np.where(paid_off, month_counts, max_months).astype(np.int64)
+    column_count = int(month_counts.max()) if len(month_counts) else 0
+
+    # Balances before the first payment and after each payment
+    k = np.arange(column_count + 1, dtype=np.float64)
+    growth = (1 + rates[:, None]) ** k
+    with np.errstate(divide='ignore', invalid='ignore'):
+        paid = np.where(rates[:, None] > 0, (growth - 1) / rates[:, None], k)
+    path = balances[:, None] * growth - payments[:, None] * paid
+    path = np.where(k < month_counts[:, None], np.maximum(path, 0), 0)
+    path[:, 0] = np.maximum(balances, 0)
+
+    interest = path[:, :-1] * rates[:, None]
+    principal = path[:, :-1] - path[:, 1:]
+    return (
+        np.where(paid_off, month_counts, -1),
+        interest + principal,
+        interest,
+        principal,
+        path[:, 1:],
+    )
+
+
+def build_amortization_schedules(debts):
+    """
+    Calculates the amortization schedules of several installment debts in one batch.
+
+    Parameters:
+        debts (Iterable[InstallmentDebt]): The debts.
+
+    Returns:
+        dict: Maps the id of each debt that has enough information to its AmortizationSchedule.
+    """
+    inputs = [(debt.id, get_amortization_inputs(debt)) for debt in debts]
+    inputs = [(debt_id, debt_inputs) for debt_id, debt_inputs in inputs if debt_inputs is not None]
+    if not inputs:
+        return {}
+
+    debt_ids = [debt_id for debt_id, debt_inputs in inputs]
+    balances, start_dates, rates, payments = zip(*(debt_inputs for debt_id, debt_inputs in inputs))
+    month_counts, all_payments, all_interest, all_principal, all_balances = \
+        calculate_amortization(balances, rates, payments)
+
+    schedules = {}
+    for row, debt_id in enumerate(debt_ids):
+        month_count = int(month_counts[row])
+        paid_off = month_count >= 0
+        columns = month_count if paid_off else AMORTIZATION_MAX_MONTHS
+        start_date = start_dates[row]
+        interest = np.round(all_interest[row, :columns], 2)
+        schedules[debt_id] = AmortizationSchedule(
+            debt_id=debt_id,
+            start_date=start_date,
+            starting_balance=to_cents(balances[row]),
+            monthly_payment=to_cents(payments[row]),
+            months=np.datetime64(start_date, 'M') + np.arange(1, columns + 1),
+            payments=np.round(all_payments[row, :columns], 2),
+            interest=interest,
+            principal=np.round(all_principal[row, :columns], 2),
+            balances=np.round(all_balances[row, :columns], 2),
+            payoff_date=start_date.replace(day=1) + relativedelta(months=month_count) if paid_off else None,
+            total_interest=to_cents(interest.sum()) if paid_off else None,
+        )
+    return schedules
+
+
+def get_amortization_cache_keys(debt_ids):
+    """ Gets the current cache key of each debt's schedule, which changes whenever the schedule goes stale """
+    version_keys = {debt_id: f'amortization-version:{debt_id}' for debt_id in debt_ids}
+    versions = get_cache_versions(version_keys.values())
+    return {debt_id: f'amortization:{debt_id}:{versions[key]}' for debt_id, key in version_keys.items()}
+
+
+def get_amortization_schedules(debts):
+    """
+    Gets the amortization schedules of several installment debts.
+
+    Schedules are cached per debt until the debt or one of its balances changes. The ones that aren't cached are
+    calculated together in a single batch.
+
+    Parameters:
+        debts (Iterable[InstallmentDebt]): The debts.
+
+    Returns:
+        dict: Maps the id of each debt that has enough information to its AmortizationSchedule.
+    """
+    debts = list(debts)
+    cache_keys = get_amortization_cache_keys([debt.id for debt in debts])
+    cached = cache.get_many(cache_keys.values())
+    schedules = {debt.id: cached[cache_keys[debt.id]] for debt in debts if cache_keys[debt.id] in cached}
+
+    calculated = build_amortization_schedules([debt for debt in debts if debt.id not in schedules])
+    if calculated:
+        cache.set_many({cache_keys[debt_id]: schedule for debt_id, schedule in calculated.items()},
+                       AMORTIZATION_CACHE_TIMEOUT)
+    schedules.update(calculated)
+    return schedules
+
+
+def get_amortization_schedule(debt):
+    """ Gets the amortization schedule of one installment debt, or None when it doesn't have enough information """
+    return get_amortization_schedules([debt]).get(debt.id)
+
+
+def invalidate_amortization_schedule(debt_id):
+    """ Moves a debt's schedule to a new cache version so the next request recalculates it """
+    bump_cache_version(f'amortization-version:{debt_id}')
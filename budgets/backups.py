@@ -0,0 +1,209 @@
+import json
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .budget_summary import refresh_budget_period_summaries
+from .categorization import forget_categorization_index
+from .models import Asset, AssetBalance, BudgetPeriod, ContactEntry, ExpenseBudgetItem, ExpenseCategory
+from .models import ExpenseTransaction, IncomeBudgetItem, IncomeTransaction, InstallmentDebt, InstallmentDebtBalance
+from .models import RevolvingDebt, RevolvingDebtBalance, ScheduleItem
+from .net_worth import refresh_net_worth_snapshots
+from .reports import invalidate_reports
+
+BACKUP_FORMAT = 'trackmydollars-backup'
+BACKUP_VERSION = 1
+
+# Objects are read and written this many at a time
+BACKUP_BATCH_SIZE = 1000
+
+# Every model in a backup, in an order where each model only refers to models before it. Net worth snapshots and
+# budget period summaries are left out since they are rebuilt after a restore.
+BACKUP_MODELS = (
+    Asset,
+    InstallmentDebt,
+    RevolvingDebt,
+    AssetBalance,
+    InstallmentDebtBalance,
+    RevolvingDebtBalance,
+    ScheduleItem,
+    BudgetPeriod,
+    IncomeBudgetItem,
+    ExpenseCategory,
+    ExpenseBudgetItem,
+    IncomeTransaction,
+    ExpenseTransaction,
+    ContactEntry,
+)
+
+
+def get_backup_fields(model):
+    """ Returns the fields of a model that are written to a backup - everything but the id and the owner """
+    return [field for field in model._meta.concrete_fields if not field.primary_key and field.name != 'user']
+
+
+def iter_backup_lines(user):
+    """
+    Yields a user's whole account as newline-delimited JSON.
+
+    The first line describes the backup and every other line is one object, e.g.
+    {"model": "budgets.assetbalance", "id": 7, "fields": {"balance": "100.00", "date": "2023-01-01", "asset_id": 2}}.
+    Foreign keys hold the ids used in the backup. Objects come in BACKUP_MODELS order and are read a batch at a time
+    so memory use stays the same for any size of account.
+
+    Parameters:
+        user (CustomUser): The user to back up.
+
+    Yields:
+        str: One line of JSON including the trailing newline.
+    """
+    yield json.dumps({
+        'format': BACKUP_FORMAT,
+        'version': BACKUP_VERSION,
+        'email': user.email,
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }) + '\n'
+
+    for model in BACKUP_MODELS:
+        label = model._meta.label_lower
+        attnames = [field.attname for field in get_backup_fields(model)]
+        rows = model.objects\
+            .filter(user_id=user.id)\
+            .order_by('pk')\
+            .values_list('pk', *attnames)
+        for pk, *values in rows.iterator(chunk_size=BACKUP_BATCH_SIZE):
+            yield json.dumps({'model': label, 'id': pk, 'fields': dict(zip(attnames, values))},
+                             cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_gzip(lines):
+    """ Compresses text a piece at a time into a gzip stream """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for line in lines:
+        compressed = compressor.compress(line.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def has_account_data(user):
+    """ Returns whether a user has anything that a restore would add to """
+    return any(model.objects.filter(user_id=user.id).exists() for model in BACKUP_MODELS)
+
+
+def delete_account_data(user):
+    """ Deletes everything a backup would restore, newest dependents first """
+    for model in reversed(BACKUP_MODELS):
+        model.objects.filter(user_id=user.id).delete()
+
+
+def read_backup_header(line):
+    """
+    Checks the first line of a backup.
+
+    Raises:
+        ValueError: If the line is not the header of a supported backup.
+    """
+    try:
+        header = json.loads(line)
+    except ValueError:
+        raise ValueError('The file is not a backup.')
+    if not isinstance(header, dict) or header.get('format') != BACKUP_FORMAT:
+        raise ValueError('The file is not a backup.')
+    if header.get('version') != BACKUP_VERSION:
+        raise ValueError(f'Backup version {header.get("version")} is not supported.')
+    return header
+
+
+def restore_backup(user, lines, replace=False):
+    """
+    Loads a backup made by iter_backup_lines into a user's account.
+
+    Objects are inserted with bulk_create a batch at a time. New ids are recorded as each batch is saved so later
+    objects can be pointed at them, which works because backups list every model before the models that refer to
+    it. Everything happens in one transaction, so a bad backup leaves the account as it was. Net worth snapshots,
+    budget period summaries and cached reports are rebuilt at the end.
+
+    Parameters:
+        user (CustomUser): The user to restore into.
+        lines (Iterable[str]): The lines of the backup.
+        replace (bool): Whether to delete the user's current data first. Otherwise the user must have no data.
+
+    Returns:
+        Counter: The number of objects restored for each model label.
+
+    Raises:
+        ValueError: If the backup can't be read or the user already has data and replace is False.
+    """
+    lines = iter(lines)
+    read_backup_header(next(lines, ''))
+
+    models_by_label = {model._meta.label_lower: model for model in BACKUP_MODELS}
+    fields_by_model = {model: {field.attname: field for field in get_backup_fields(model)} for model in BACKUP_MODELS}
+    id_maps = {model: {} for model in BACKUP_MODELS}
+    restored = Counter()
+
+    def save_batch(model, batch):
+        objs = model.objects.bulk_create([obj for backup_id, obj in batch])
+        for (backup_id, unsaved), obj in zip(batch, objs):
+            id_maps[model][backup_id] = obj.pk
+        restored[model._meta.label_lower] += len(batch)
+
+    with transaction.atomic():
+        if replace:
+            delete_account_data(user)
+        elif has_account_data(user):
+            raise ValueError(f'{user.email} already has data. Restore with replace to overwrite it.')
+
+        model = None
+        batch = []
+        for line_number, line in enumerate(lines, start=2):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                line_model = models_by_label[entry['model']]
+                backup_id = entry['id']
+                values = entry['fields']
+            except (ValueError, KeyError, TypeError):
+                raise ValueError(f'Line {line_number} of the backup is not valid.')
+
+            if line_model is not model:
+                if batch:
+                    save_batch(model, batch)
+                    batch = []
+                model = line_model
+
+            fields = {}
+            for attname, field in fields_by_model[model].items():
+                if attname not in values:  # Left to the field's default
+                    continue
+                value = values[attname]
+                if field.is_relation and value is not None:
+                    try:
+                        value = id_maps[field.related_model][value]
+                    except KeyError:
+                        raise ValueError(f'Line {line_number} of the backup refers to a missing '
+                                         f'{field.related_model._meta.verbose_name}.')
+                elif value is not None:
+                    value = field.to_python(value)
+                fields[attname] = value
+            batch.append((backup_id, model(user_id=user.id, **fields)))
+
+            if len(batch) >= BACKUP_BATCH_SIZE:
+                save_batch(model, batch)
+                batch = []
+        if batch:
+            save_batch(model, batch)
+
+        # bulk_create skips the model signals, so rebuild what they would have
+        refresh_net_worth_snapshots(user.id)
+        budget_period_ids = list(id_maps[BudgetPeriod].values())
+        for start in range(0, len(budget_period_ids), BACKUP_BATCH_SIZE):
+            refresh_budget_period_summaries(budget_period_ids[start:start + BACKUP_BATCH_SIZE])
+    invalidate_reports(user.id)
+    forget_categorization_index(user.id)
+    return restored
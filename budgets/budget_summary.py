@@ -0,0 +1,350 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from .models import BudgetPeriod, BudgetPeriodSummary, ExpenseBudgetItem, ExpenseTransaction, IncomeBudgetItem
+from .models import IncomeTransaction
+
+# Totals read from the database for each budget period - (model, budget period lookup, aggregates)
+SUMMARY_AGGREGATES = (
+    (IncomeBudgetItem, 'budget_period', {
+        'total_planned_income': Sum('planned_amount'),
+        'reserved_income': Sum('planned_amount', filter=Q(type='Reserve')),
+    }),
+    (IncomeTransaction, 'budget_item__budget_period', {
+        'total_received': Sum('amount'),
+        'total_cash_income': Sum('amount', filter=Q(cash=True)),
+        'total_bank_income': Sum('amount', filter=Q(cash=False)),
+    }),
+    (ExpenseBudgetItem, 'expense_category__budget_period', {
+        'total_planned_expenses': Sum('planned_amount', filter=~Q(name='New Debt')),
+        'reserved_expenses': Sum('planned_amount', filter=Q(type='Reserve')),
+    }),
+    (ExpenseTransaction, 'expense_budget_item__expense_category__budget_period', {
+        'total_new_debt': Sum('amount', filter=Q(credit_purchase=True)),
+        'total_paid_debt': Sum('amount', filter=Q(credit_payoff=True)),
+        'total_cash_expenses': Sum('amount', filter=Q(credit_purchase=False, cash=True)),
+        'total_bank_expenses': Sum('amount', filter=Q(credit_purchase=False, cash=False)),
+    }),
+)
+
+# Summary totals stored on BudgetPeriodSummary, the rest are derived from these
+STORED_SUMMARY_FIELDS = (
+    'total_planned_income',
+    'total_planned_expenses',
+    'total_actual_income',
+    'total_actual_expenses',
+    'total_bank_income',
+    'total_bank_expenses',
+    'total_cash_income',
+    'total_cash_expenses',
+    'total_new_debt',
+    'total_paid_debt',
+    'reserved_funds',
+)
+
+# Each entry is (model, path to its budget period id, fields its share of the stored totals is computed from)
+SUMMARY_SOURCES = (
+    (IncomeBudgetItem, 'budget_period_id', ('planned_amount', 'type')),
+    (IncomeTransaction, 'budget_item__budget_period_id', ('amount', 'cash')),
+    (ExpenseBudgetItem, 'expense_category__budget_period_id', ('name', 'planned_amount', 'type')),
+    (ExpenseTransaction, 'expense_budget_item__expense_category__budget_period_id',
+     ('amount', 'cash', 'credit_purchase', 'credit_payoff')),
+)
+
+
+def summarize_budget_periods(budget_periods):
+    """
+    Computes the planned and actual totals of several budget periods.
+
+    Runs one grouped query per model no matter how many periods, budget items or transactions there are.
+
+    Reserve budget items count their planned amount as money received or spent. Credit card purchases count as new
+    debt instead of money spent until they are paid off.
+
+    Parameters:
+        budget_periods (Iterable[BudgetPeriod]): The budget periods to summarize.
+
+    Returns:
+        dict: Maps each budget period id to a dict of Decimal totals.
+    """
+    budget_periods = {bp.id: bp for bp in budget_periods}
+    raw_totals = {bp_id: {} for bp_id in budget_periods}
+    for model, period_lookup, aggregates in SUMMARY_AGGREGATES:
+        rows = model.objects\
+            .filter(**{f'{period_lookup}__in': list(budget_periods)})\
+            .values(period_lookup)\
+            .annotate(**aggregates)\
+            .order_by()
+        for row in rows:
+            raw_totals[row.pop(period_lookup)].update(row)
+
+    summaries = {}
+    for bp_id, bp in budget_periods.items():
+        totals = {
+            key: raw_totals[bp_id].get(key) or Decimal(0.00)
+            for model, period_lookup, aggregates in SUMMARY_AGGREGATES
+            for key in aggregates
+        }
+        total_actual_income = totals['total_received'] + totals['reserved_income']
+        total_actual_expenses = totals['total_cash_expenses'] + totals['total_bank_expenses'] \
+            + totals['reserved_expenses']
+        bank_balance_change = totals['total_bank_income'] - totals['total_bank_expenses']
+        cash_balance_change = totals['total_cash_income'] - totals['total_cash_expenses']
+
+        summaries[bp_id] = {
+            'total_planned_income': totals['total_planned_income'],
+            'total_planned_expenses': totals['total_planned_expenses'],
+            'total_actual_income': total_actual_income,
+            'total_actual_expenses': total_actual_expenses,
+            'total_bank_income': totals['total_bank_income'],
+            'total_bank_expenses': totals['total_bank_expenses'],
+            'total_cash_income': totals['total_cash_income'],
+            'total_cash_expenses': totals['total_cash_expenses'],
+            'total_new_debt': totals['total_new_debt'],
+            'total_paid_debt': totals['total_paid_debt'],
+            'total_remaining_debt': totals['total_new_debt'] - totals['total_paid_debt'],
+            'reserved_funds': totals['reserved_income'] - totals['reserved_expenses'],
+            'left_to_plan': totals['total_planned_income'] - totals['total_planned_expenses'],
+            'left_to_spend': total_actual_income - total_actual_expenses,
+            'bank_balance_change': bank_balance_change,
+            'current_bank_balance': (bp.starting_bank_balance or 0) + bank_balance_change,
+            'cash_balance_change': cash_balance_change,
+            'current_cash_balance': (bp.starting_cash_balance or 0) + cash_balance_change,
+        }
+    return summaries
+
+
+def summarize_budget_period(bp):
+    """
+    Computes the planned and actual totals of one budget period.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period to summarize.
+
+    Returns:
+        dict: Decimal totals keyed by name, see summarize_budget_periods.
+    """
+    return summarize_budget_periods([bp])[bp.id]
+
+
+def get_stored_summary_totals(bp, summary):
+    """
+    Derives the full set of totals from a budget period's stored summary.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period, for its starting balances.
+        summary (BudgetPeriodSummary): Its stored totals.
+
+    Returns:
+        dict: Decimal totals keyed by name, the same as summarize_budget_periods.
+    """
+    bank_balance_change = summary.get_bank_balance_change()
+    cash_balance_change = summary.get_cash_balance_change()
+    totals = {field: getattr(summary, field) for field in STORED_SUMMARY_FIELDS}
+    totals.update({
+        'total_remaining_debt': summary.get_remaining_debt(),
+        'left_to_plan': summary.get_left_to_plan(),
+        'left_to_spend': summary.get_left_to_spend(),
+        'bank_balance_change': bank_balance_change,
+        'current_bank_balance': (bp.starting_bank_balance or 0) + bank_balance_change,
+        'cash_balance_change': cash_balance_change,
+        'current_cash_balance': (bp.starting_cash_balance or 0) + cash_balance_change,
+    })
+    return totals
+
+
+def read_budget_period_summaries(budget_periods):
+    """
+    Reads the totals of several budget periods from their stored summaries.
+
+    Periods without a BudgetPeriodSummary row yet, e.g. one with nothing in it, are summarized instead. Nothing is
+    written, so this is safe to call from a GET.
+
+    Parameters:
+        budget_periods (Iterable[BudgetPeriod]): The budget periods to read.
+
+    Returns:
+        dict: Maps each budget period id to a dict of Decimal totals, see summarize_budget_periods.
+    """
+    budget_periods = {bp.id: bp for bp in budget_periods}
+    totals = {
+        summary.budget_period_id: get_stored_summary_totals(budget_periods[summary.budget_period_id], summary)
+        for summary in BudgetPeriodSummary.objects.filter(budget_period__in=list(budget_periods))
+    }
+    missing = [bp for bp_id, bp in budget_periods.items() if bp_id not in totals]
+    if missing:
+        totals.update(summarize_budget_periods(missing))
+    return {bp_id: totals[bp_id] for bp_id in budget_periods}
+
+
+def refresh_budget_period_summaries(budget_period_ids):
+    """
+    Rebuilds the BudgetPeriodSummary rows of several budget periods.
+
+    Periods that no longer exist are skipped, their summaries are deleted along with them.
+
+    Parameters:
+        budget_period_ids (Iterable[int]): The budget periods to refresh.
+    """
+    budget_periods = list(BudgetPeriod.objects.filter(id__in=list(budget_period_ids)))
+    summaries = summarize_budget_periods(budget_periods)
+    with transaction.atomic():
+        BudgetPeriodSummary.objects.filter(budget_period__in=budget_periods).delete()
+        BudgetPeriodSummary.objects.bulk_create([
+            BudgetPeriodSummary(budget_period=bp,
+                                user_id=bp.user_id,
+                                month=bp.month,
+                                year=bp.year,
+                                **{field: summaries[bp.id][field] for field in STORED_SUMMARY_FIELDS})
+            for bp in budget_periods
+        ])
+
+
+def refresh_budget_period_summary(budget_period_id):
+    """ Rebuilds the BudgetPeriodSummary row of one budget period """
+    refresh_budget_period_summaries([budget_period_id])
+
+
+def get_summary_contribution(model, values):
+    """
+    Gets how much one budget item or transaction adds to each of its budget period's stored totals.
+
+    Mirrors SUMMARY_AGGREGATES, so the stored totals of a budget period are the sum of the contributions of everything
+    in it.
+
+    Parameters:
+        model (type): One of the models in SUMMARY_SOURCES.
+        values (dict): The row's values for the fields listed for the model in SUMMARY_SOURCES.
+
+    Returns:
+        dict: Decimal amounts keyed by STORED_SUMMARY_FIELDS. Totals the row doesn't touch are left out.
+    """
+    contribution = {}
+    if model is IncomeBudgetItem:
+        amount = values['planned_amount'] or Decimal(0.00)
+        contribution['total_planned_income'] = amount
+        if values['type'] == 'Reserve':
+            contribution['total_actual_income'] = amount
+            contribution['reserved_funds'] = amount
+    elif model is IncomeTransaction:
+        amount = values['amount'] or Decimal(0.00)
+        contribution['total_actual_income'] = amount
+        contribution['total_cash_income' if values['cash'] else 'total_bank_income'] = amount
+    elif model is ExpenseBudgetItem:
+        amount = values['planned_amount'] or Decimal(0.00)
+        if values['name'] != 'New Debt':
+            contribution['total_planned_expenses'] = amount
+        if values['type'] == 'Reserve':
+            contribution['total_actual_expenses'] = amount
+            contribution['reserved_funds'] = -amount
+    elif model is ExpenseTransaction:
+        amount = values['amount'] or Decimal(0.00)
+        if values['credit_purchase']:
+            contribution['total_new_debt'] = amount
+        else:
+            contribution['total_actual_expenses'] = amount
+            contribution['total_cash_expenses' if values['cash'] else 'total_bank_expenses'] = amount
+        if values['credit_payoff']:
+            contribution['total_paid_debt'] = amount
+    return contribution
+
+
+def get_summary_share(instance, stored=False):
+    """
+    Gets the budget period of a budget item or transaction and what it adds to that period's stored totals.
+
+    Parameters:
+        instance (Model): An instance of one of the models in SUMMARY_SOURCES.
+        stored (bool): Whether to read the row as it is currently saved rather than as it is on the instance.
+
+    Returns:
+        tuple[int, dict] | None: (budget period id, contribution) or None when the row or its budget period doesn't
+            exist.
+    """
+    for model, period_path, fields in SUMMARY_SOURCES:
+        if model is type(instance):
+            break
+    else:
+        raise ValueError(f'{type(instance).__name__} is not part of a budget period summary.')
+
+    if stored:
+        values = model.objects.filter(pk=instance.pk).values(period_path, *fields).first()
+        if values is None:
+            return None
+        budget_period_id = values[period_path]
+    else:
+        values = {field: getattr(instance, field) for field in fields}
+        # Only the first step of the path is on the instance, the rest is read through its parent
+        field_name, _, parent_path = period_path.partition('__')
+        if parent_path:
+            parent_model = model._meta.get_field(field_name).related_model
+            budget_period_id = parent_model.objects\
+                .filter(pk=getattr(instance, f'{field_name}_id'))\
+                .values_list(parent_path, flat=True)\
+                .first()
+        else:
+            budget_period_id = getattr(instance, field_name)
+    if budget_period_id is None:
+        return None
+    return budget_period_id, get_summary_contribution(model, values)
+
+
+def get_summary_delta(previous=None, current=None):
+    """
+    Works out how the stored totals change when a row goes from one summary share to another.
+
+    Parameters:
+        previous (tuple[int, dict] | None): The share from get_summary_share before the change, None for a new row.
+        current (tuple[int, dict] | None): The share after the change, None for a deleted row.
+
+    Returns:
+        dict: Maps each budget period id whose totals change to a dict of non-zero Decimal changes.
+    """
+    deltas = {}
+    for share, sign in ((previous, -1), (current, 1)):
+        if share is not None:
+            budget_period_id, contribution = share
+            delta = deltas.setdefault(budget_period_id, {})
+            for field, amount in contribution.items():
+                delta[field] = delta.get(field, Decimal(0.00)) + sign * amount
+    return {
+        budget_period_id: {field: amount for field, amount in delta.items() if amount}
+        for budget_period_id, delta in deltas.items()
+        if any(delta.values())
+    }
+
+
+def apply_summary_delta(budget_period_id, delta):
+    """
+    Adds changes to the stored totals of a budget period without reading anything else in the period.
+
+    The totals are changed with F() expressions so concurrent changes can't overwrite each other. A period without a
+    stored summary yet is summarized in full instead.
+
+    Parameters:
+        budget_period_id (int): The budget period to change.
+        delta (dict): Decimal changes keyed by STORED_SUMMARY_FIELDS, see get_summary_delta.
+    """
+    if not delta:
+        return
+    updated = BudgetPeriodSummary.objects\
+        .filter(budget_period_id=budget_period_id)\
+        .update(**{field: F(field) + amount for field, amount in delta.items()})
+    if not updated:
+        refresh_budget_period_summary(budget_period_id)
+
+
+def get_derived_summary_delta(delta):
+    """ Works out how the totals derived from the stored ones, e.g. left to spend, change with a delta """
+    def change(field):
+        return delta.get(field, Decimal(0.00))
+
+    return {
+        'left_to_plan': change('total_planned_income') - change('total_planned_expenses'),
+        'left_to_spend': change('total_actual_income') - change('total_actual_expenses'),
+        'bank_balance_change': change('total_bank_income') - change('total_bank_expenses'),
+        'cash_balance_change': change('total_cash_income') - change('total_cash_expenses'),
+        'total_remaining_debt': change('total_new_debt') - change('total_paid_debt'),
+    }
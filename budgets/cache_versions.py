@@ -0,0 +1,46 @@
+import time
+
+from django.core.cache import cache
+
+
+def new_cache_version():
+    """
+    Starts a cache version from the current time.
+
+    A version key can be evicted while entries cached under it are still stored. Starting again from 1 could make
+    one of those stale entries current again, starting from the time can't.
+    """
+    return time.time_ns()
+
+
+def get_cache_versions(version_keys):
+    """
+    Gets the current value of several version keys, starting any that aren't cached.
+
+    Parameters:
+        version_keys (Iterable[str]): The version keys.
+
+    Returns:
+        dict: Maps each version key to its current version.
+    """
+    version_keys = list(version_keys)
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            versions[key] = cache.get_or_set(key, new_cache_version, timeout=None)
+    return versions
+
+
+def get_cache_version(version_key):
+    """ Gets the current value of a version key, starting it if it isn't cached """
+    return get_cache_versions([version_key])[version_key]
+
+
+def bump_cache_version(version_key):
+    """ Moves a version key on so everything cached under its current version is ignored, returning the new version """
+    try:
+        return cache.incr(version_key)
+    except ValueError:  # Not cached, so start a version nothing was cached under
+        version = new_cache_version()
+        cache.set(version_key, version, timeout=None)
+        return version
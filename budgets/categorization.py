@@ -0,0 +1,217 @@
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from .cache_versions import bump_cache_version, get_cache_version
+from .models import ExpenseBudgetItem, ExpenseTransaction
+from .new_debt import NEW_DEBT
+
+# How many users' indexes are kept in memory per process, least recently used are dropped first
+CATEGORIZATION_INDEX_USERS = 256
+
+# Only this many characters of a name are stored in the prefix trie
+CATEGORIZATION_PREFIX_LENGTH = 24
+
+# Store numbers, dates and card digits don't say anything about what was bought
+NAME_TOKEN = re.compile(r'[a-z]{2,}')
+
+
+def normalize_name(name):
+    """ Lower cases a transaction name and collapses its whitespace so small formatting changes still match """
+    return ' '.join(name.lower().split())
+
+
+def get_name_tokens(name):
+    """ Returns the words of a transaction name, e.g. 'WALMART #1234 Springfield' gives ['walmart', 'springfield'] """
+    return NAME_TOKEN.findall(name.lower())
+
+
+class TrieNode:
+    """ A node of the prefix trie that counts the labels of every name passing through it """
+    __slots__ = ('children', 'labels')
+
+    def __init__(self):
+        self.children = {}
+        self.labels = Counter()
+
+
+class CategorizationIndex:
+    """
+    Suggests budget items for transaction names based on a user's past expense transactions.
+
+    Labels are (category name, item name) pairs rather than budget items since each budget period has its own copy
+    of every item. Names are looked up by prefix first, so 'star' finds past 'Starbucks' purchases, and then by the
+    words they share with past names.
+    """
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, label):
+        """ Records that a transaction with the given name was put in the budget item with the given label """
+        tokens = get_name_tokens(name)
+        with self.lock:
+            node = self.root
+            for char in ' '.join(tokens)[:CATEGORIZATION_PREFIX_LENGTH]:
+                node = node.children.setdefault(char, TrieNode())
+                node.labels[label] += 1
+            for token in tokens:
+                self.tokens.setdefault(token, Counter())[label] += 1
+
+    def suggest(self, name, limit=3):
+        """
+        Suggests budget items for a transaction name.
+
+        Parameters:
+            name (str): The transaction name, complete or partly typed.
+            limit (int | None): The most suggestions to return or None for all of them.
+
+        Returns:
+            list[tuple[str, str]]: (category name, item name) labels, best match first.
+        """
+        tokens = get_name_tokens(name)
+        if not tokens:
+            return []
+
+        with self.lock:
+            node = self.root
+            for char in ' '.join(tokens)[:CATEGORIZATION_PREFIX_LENGTH]:
+                node = node.children.get(char)
+                if node is None:
+                    break
+            if node is not None:
+                return [label for label, count in node.labels.most_common(limit)]
+
+            # No past name starts the same way so vote by shared words, rare words counting for more
+            scores = Counter()
+            for token in tokens:
+                token_labels = self.tokens.get(token)
+                if token_labels:
+                    total = sum(token_labels.values())
+                    for label, count in token_labels.items():
+                        scores[label] += count / total
+            return [label for label, score in scores.most_common(limit)]
+
+
+# Indexes of the users seen by this process as (version, index), keyed by user id. The current version of each
+# user's index is kept in the shared cache so a change handled by one process makes the others rebuild theirs.
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_categorization_version_key(user_id):
+    """ Returns the shared cache key holding the current version of a user's index """
+    return f'categorization-version:{user_id}'
+
+
+def build_categorization_index(user_id):
+    """ Builds a user's categorization index from all of their past expense transactions """
+    index = CategorizationIndex()
+    transactions = ExpenseTransaction.objects\
+        .filter(user_id=user_id)\
+        .exclude(expense_budget_item__expense_category__name=NEW_DEBT)\
+        .values_list('name', 'expense_budget_item__expense_category__name', 'expense_budget_item__name')
+    for name, category_name, item_name in transactions.iterator():
+        index.add(name, (category_name, item_name))
+    return index
+
+
+def get_categorization_index(user_id):
+    """ Gets a user's categorization index, building it when this process doesn't have its current version """
+    version = get_cache_version(get_categorization_version_key(user_id))
+    with _indexes_lock:
+        entry = _indexes.get(user_id)
+        if entry is not None and entry[0] == version:
+            _indexes.move_to_end(user_id)
+            return entry[1]
+
+    # The version is read first, so a change made while building leaves this index out of date and it is rebuilt
+    index = build_categorization_index(user_id)
+    with _indexes_lock:
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > CATEGORIZATION_INDEX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def add_to_categorization_index(expense_transaction):
+    """
+    Adds a new transaction to its owner's index.
+
+    The shared version is moved on so other processes rebuild their copy. This process adds the transaction to its
+    own copy instead, unless another change was made since it was built.
+    """
+    user_id = expense_transaction.user_id
+    version = bump_cache_version(get_categorization_version_key(user_id))
+    with _indexes_lock:
+        entry = _indexes.pop(user_id, None)
+    if entry is None or entry[0] != version - 1:
+        return
+
+    label = ExpenseBudgetItem.objects\
+        .filter(pk=expense_transaction.expense_budget_item_id)\
+        .exclude(expense_category__name=NEW_DEBT)\
+        .values_list('expense_category__name', 'name')\
+        .first()
+    index = entry[1]
+    if label is not None:
+        index.add(expense_transaction.name, label)
+    with _indexes_lock:
+        _indexes.setdefault(user_id, (version, index))
+
+
+def forget_categorization_index(user_id):
+    """ Makes every process rebuild a user's index the next time it is needed, e.g. after transactions are edited """
+    bump_cache_version(get_categorization_version_key(user_id))
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def get_budget_items_by_label(bp):
+    """ Maps the (category name, item name) label of each expense budget item in a budget period to the item """
+    items = ExpenseBudgetItem.objects\
+        .filter(expense_category__budget_period=bp)\
+        .exclude(expense_category__name=NEW_DEBT)\
+        .select_related('expense_category')
+    return {(item.expense_category.name, item.name): item for item in items}
+
+
+def suggest_budget_items(bp, name, limit=3):
+    """
+    Suggests the expense budget items of a budget period that a new transaction most likely belongs in.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period the transaction is being added to.
+        name (str): The transaction name.
+        limit (int): The most suggestions to return.
+
+    Returns:
+        list[ExpenseBudgetItem]: Matching budget items, best match first. Items that don't exist in the budget
+            period are left out.
+    """
+    items_by_label = get_budget_items_by_label(bp)
+    labels = get_categorization_index(bp.user_id).suggest(name, limit=None)
+    return [items_by_label[label] for label in labels if label in items_by_label][:limit]
+
+
+def categorize_names(bp, names):
+    """
+    Picks the most likely expense budget item in a budget period for each of many transaction names.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period the transactions are being added to.
+        names (Iterable[str]): The transaction names.
+
+    Returns:
+        list[ExpenseBudgetItem | None]: The best item for each name, or None when nothing matches.
+    """
+    items_by_label = get_budget_items_by_label(bp)
+    index = get_categorization_index(bp.user_id)
+    categorized = []
+    for name in names:
+        labels = index.suggest(name, limit=None)
+        categorized.append(next((items_by_label[label] for label in labels if label in items_by_label), None))
+    return categorized
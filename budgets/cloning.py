@@ -0,0 +1,196 @@
+from django.db import transaction
+
+from .budget_summary import refresh_budget_period_summaries
+from .models import BudgetPeriod, ExpenseBudgetItem, ExpenseCategory, IncomeBudgetItem, ScheduleItem
+from .new_debt import NEW_DEBT
+from .projection import project_schedule
+
+
+def clone_budget_items(template_bp, new_bps):
+    """
+    Copies the income items, expense categories and expense items of a template budget period into new periods.
+
+    The New Debt category is not copied since it is built from each period's own credit card purchases. Runs three
+    reads and three bulk inserts no matter how many periods or items are copied.
+
+    Parameters:
+        template_bp (BudgetPeriod | int): The budget period to copy from.
+        new_bps (list[BudgetPeriod]): Saved budget periods to copy into.
+
+    Returns:
+        dict: Maps each new budget period id to {category name: (ExpenseCategory, set of its item names)}.
+    """
+    income_items = list(IncomeBudgetItem.objects.filter(budget_period=template_bp))
+    template_categories = list(
+        ExpenseCategory.objects
+        .filter(budget_period=template_bp)
+        .exclude(name=NEW_DEBT)
+        .prefetch_related('expense_budget_items')
+    )
+
+    IncomeBudgetItem.objects.bulk_create([
+        IncomeBudgetItem(user_id=bp.user_id,
+                         budget_period=bp,
+                         name=item.name,
+                         planned_amount=item.planned_amount,
+                         type=item.type)
+        for bp in new_bps
+        for item in income_items
+    ])
+
+    new_categories = [
+        (category, ExpenseCategory(user_id=bp.user_id, budget_period=bp, name=category.name))
+        for bp in new_bps
+        for category in template_categories
+    ]
+    ExpenseCategory.objects.bulk_create([new_category for category, new_category in new_categories])
+
+    ExpenseBudgetItem.objects.bulk_create([
+        ExpenseBudgetItem(user_id=new_category.user_id,
+                          expense_category=new_category,
+                          name=item.name,
+                          planned_amount=item.planned_amount,
+                          type=item.type)
+        for category, new_category in new_categories
+        for item in category.expense_budget_items.all()
+    ])
+
+    categories_by_period = {bp.id: {} for bp in new_bps}
+    for category, new_category in new_categories:
+        item_names = {item.name for item in category.expense_budget_items.all()}
+        categories_by_period[new_category.budget_period_id][new_category.name] = (new_category, item_names)
+    return categories_by_period
+
+
+def add_schedule_items(user, new_bps, categories_by_period=None):
+    """
+    Adds the schedule items that are due in each new budget period as expense budget items.
+
+    Each schedule item becomes an item in the expense category named after its category. Categories are created as
+    needed and items that already exist in a category, e.g. copied from a template, are left alone.
+
+    Parameters:
+        user (CustomUser | int): The owner of the schedule items.
+        new_bps (list[BudgetPeriod]): Saved budget periods to add items to.
+        categories_by_period (dict | None): The categories already in each period as returned by clone_budget_items.
+    """
+    categories_by_period = categories_by_period or {}
+    year_months = [(bp.year, bp.month) for bp in new_bps]
+    projection = project_schedule(ScheduleItem.objects.filter(user=user), year_months)
+
+    # Schedule items due in each period in their original order
+    due_items = [
+        (bp, [item for item, amounts in zip(projection.items, projection.amounts) if amounts[idx]])
+        for idx, bp in enumerate(new_bps)
+    ]
+
+    categories = {bp.id: dict(categories_by_period.get(bp.id, {})) for bp in new_bps}
+    missing_categories = []
+    for bp, items in due_items:
+        for item in items:
+            if item.category not in categories[bp.id]:
+                category = ExpenseCategory(user_id=bp.user_id, budget_period=bp, name=item.category)
+                categories[bp.id][item.category] = (category, set())
+                missing_categories.append(category)
+    ExpenseCategory.objects.bulk_create(missing_categories)
+
+    new_items = []
+    for bp, items in due_items:
+        for item in items:
+            category, item_names = categories[bp.id][item.category]
+            if item.name in item_names:
+                continue
+            item_names.add(item.name)
+            new_items.append(ExpenseBudgetItem(user_id=item.user_id,
+                                               expense_category=category,
+                                               name=item.name,
+                                               planned_amount=item.amount))
+    ExpenseBudgetItem.objects.bulk_create(new_items)
+
+
+def create_budget_period(user, year, month, starting_bank_balance, starting_cash_balance, usable_bank_balance=0,
+                         usable_cash_balance=0, template=None, include_schedule_items=False):
+    """
+    Creates a budget period along with its template items, reserves and schedule items in one transaction.
+
+    Parameters:
+        user (CustomUser | int): The owner of the new budget period.
+        year (int): The year of the new budget period.
+        month (int): The month of the new budget period. Jan is 1 and Dec is 12.
+        starting_bank_balance (Decimal): The bank balance at the start of the month.
+        starting_cash_balance (Decimal): The cash balance at the start of the month.
+        usable_bank_balance (Decimal): Adds a 'Bank Reserve' income item for this amount when positive.
+        usable_cash_balance (Decimal): Adds a 'Cash Reserve' income item for this amount when positive.
+        template (BudgetPeriod | None): A budget period to copy items from.
+        include_schedule_items (bool): Whether to add the schedule items due this month.
+
+    Returns:
+        BudgetPeriod: The new budget period.
+
+    Raises:
+        IntegrityError: If the user already has a budget for that month.
+    """
+    user_id = getattr(user, 'id', user)
+    with transaction.atomic():
+        bp = BudgetPeriod.objects.create(user_id=user_id,
+                                         year=year,
+                                         month=month,
+                                         starting_bank_balance=starting_bank_balance,
+                                         starting_cash_balance=starting_cash_balance)
+
+        categories_by_period = clone_budget_items(template, [bp]) if template else {}
+
+        # The reserves replace any reserve items copied from the template
+        reserves = [
+            IncomeBudgetItem(user_id=user_id, budget_period=bp, name=name, planned_amount=amount, type='Reserve')
+            for name, amount in (('Bank Reserve', usable_bank_balance), ('Cash Reserve', usable_cash_balance))
+            if amount > 0
+        ]
+        if reserves:
+            bp.income_budget_items.filter(name__in=[reserve.name for reserve in reserves]).delete()
+            IncomeBudgetItem.objects.bulk_create(reserves)
+
+        if include_schedule_items:
+            add_schedule_items(user_id, [bp], categories_by_period)
+        refresh_budget_period_summaries([bp.id])
+    return bp
+
+
+def roll_forward(template_bp, months, include_schedule_items=True):
+    """
+    Creates budget periods for the months after a template budget period, copying its items into each one.
+
+    Months that already have a budget are skipped. New periods start with zero bank and cash balances, which can be
+    updated once the previous month is finished.
+
+    Parameters:
+        template_bp (BudgetPeriod): The budget period to copy from.
+        months (int): How many months after the template to create.
+        include_schedule_items (bool): Whether to add the schedule items due in each month.
+
+    Returns:
+        list[BudgetPeriod]: The new budget periods in month order.
+    """
+    first_index = template_bp.year * 12 + template_bp.month
+    year_months = [(index // 12, index % 12 + 1) for index in range(first_index, first_index + months)]
+
+    with transaction.atomic():
+        existing = set(
+            BudgetPeriod.objects
+            .filter(user_id=template_bp.user_id, year__gte=year_months[0][0], year__lte=year_months[-1][0])
+            .values_list('year', 'month')
+        ) if year_months else set()
+        new_bps = BudgetPeriod.objects.bulk_create([
+            BudgetPeriod(user_id=template_bp.user_id, year=year, month=month,
+                         starting_bank_balance=0, starting_cash_balance=0)
+            for year, month in year_months
+            if (year, month) not in existing
+        ])
+        if not new_bps:
+            return []
+
+        categories_by_period = clone_budget_items(template_bp, new_bps)
+        if include_schedule_items:
+            add_schedule_items(template_bp.user_id, new_bps, categories_by_period)
+        refresh_budget_period_summaries([bp.id for bp in new_bps])
+    return new_bps
@@ -0,0 +1,148 @@
+import math
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Sum
+
+from .models import ScheduleItem
+from .occurrences import DUE_DATES_PER_YEAR
+from .projection import project_schedule
+
+# Contribution strategies - (strategy, display name)
+EXPENSE_FUND_STRATEGIES = (
+    ('flat', 'Flat monthly'),
+    ('minimum', 'Minimum contribution'),
+    ('front_loaded', 'Front-loaded'),
+)
+
+# contributions, outflows and balances are per month arrays of integer cents
+ExpenseFundSimulation = namedtuple(
+    'ExpenseFundSimulation',
+    ['strategy', 'year_months', 'contributions', 'outflows', 'balances', 'minimum_balance', 'minimum_balance_month'],
+)
+
+
+def get_non_monthly_total(user):
+    """
+    Gets the yearly total of every schedule item that is not due monthly.
+
+    Parameters:
+        user (CustomUser | int): The owner of the schedule items.
+
+    Returns:
+        Decimal: The yearly total.
+    """
+    frequency_sums = ScheduleItem.objects\
+        .filter(user=user)\
+        .exclude(frequency='Monthly')\
+        .values_list('frequency')\
+        .annotate(total=Sum('amount'))
+    return sum(
+        (total * DUE_DATES_PER_YEAR[frequency] for frequency, total in frequency_sums),
+        Decimal(0.00),
+    )
+
+
+def get_suggested_contribution(non_monthly_total):
+    """ Returns the monthly average of the non-monthly total rounded up to the next $10 """
+    return math.ceil(non_monthly_total / 12 / 10) * 10
+
+
+def get_minimum_contribution(outflows, starting_balance=0):
+    """
+    Finds the smallest constant monthly contribution that keeps the balance from going negative.
+
+    After month n the balance is starting_balance + n * contribution - the outflows through month n, so the
+    contribution has to cover the largest running shortfall divided by the number of months it builds up over.
+
+    Parameters:
+        outflows (numpy.ndarray): Outflows per month in cents.
+        starting_balance (int): The balance before the first month in cents.
+
+    Returns:
+        int: The contribution in cents rounded up to a whole dollar.
+    """
+    if not len(outflows):
+        return 0
+    shortfalls = np.cumsum(outflows) - starting_balance
+    months = np.arange(1, len(outflows) + 1)
+    contribution = max(0, int(np.max(-(-shortfalls // months))))
+    return -(-contribution // 100) * 100
+
+
+def simulate_expense_fund(projection, strategy='flat', contribution=0, starting_balance=0):
+    """
+    Simulates an expense fund's balance over every month of a schedule projection.
+
+    Strategies:
+        flat - contribute the same amount every month.
+        minimum - contribute the smallest constant amount that never lets the balance go negative.
+        front_loaded - contribute the flat amount every month plus a first month deposit that covers the lowest
+            point the flat plan would reach.
+
+    Parameters:
+        projection (ScheduleProjection): The schedule items paid from the fund projected over the simulated months.
+        strategy (str): One of the strategies in EXPENSE_FUND_STRATEGIES.
+        contribution (int): The flat monthly contribution in cents. Not used by the minimum strategy.
+        starting_balance (int): The balance before the first month in cents.
+
+    Returns:
+        ExpenseFundSimulation: The per month contributions, outflows and balances along with the minimum balance
+            and the index of the month it is reached in, or None if there are no months.
+    """
+    outflows = np.asarray(projection.totals, dtype=np.int64)
+    month_count = len(outflows)
+
+    if strategy == 'minimum':
+        contribution = get_minimum_contribution(outflows, starting_balance)
+    elif strategy not in ('flat', 'front_loaded'):
+        raise ValueError(f'Unknown expense fund strategy: {strategy}')
+
+    contributions = np.full(month_count, contribution, dtype=np.int64)
+    balances = starting_balance + np.cumsum(contributions - outflows)
+
+    if strategy == 'front_loaded' and month_count:
+        deposit = max(0, -int(balances.min()))
+        contributions[0] += deposit
+        balances += deposit
+
+    if not month_count:
+        return ExpenseFundSimulation(strategy, projection.year_months, contributions, outflows, balances, None, None)
+
+    minimum_balance_month = int(np.argmin(balances))
+    return ExpenseFundSimulation(
+        strategy,
+        projection.year_months,
+        contributions,
+        outflows,
+        balances,
+        int(balances[minimum_balance_month]),
+        minimum_balance_month,
+    )
+
+
+def run_expense_fund_simulation(user, year_months, strategy='flat', contribution=None, starting_balance=0):
+    """
+    Projects a user's active schedule items and simulates an expense fund that pays for them.
+
+    Parameters:
+        user (CustomUser | int): The user to simulate for.
+        year_months (list[tuple]): Chronological year and month pairs to simulate.
+        strategy (str): One of the strategies in EXPENSE_FUND_STRATEGIES.
+        contribution (int | None): The flat monthly contribution in dollars. Uses the suggested contribution when
+            None.
+        starting_balance (int): The balance before the first month in dollars.
+
+    Returns:
+        tuple: The ScheduleProjection, the ExpenseFundSimulation, the non-monthly yearly total and the suggested
+            contribution in dollars.
+    """
+    non_monthly_total = get_non_monthly_total(user)
+    suggestion = get_suggested_contribution(non_monthly_total)
+    if contribution is None:
+        contribution = suggestion
+
+    projection = project_schedule(ScheduleItem.objects.filter(user=user).active(), year_months)
+    simulation = simulate_expense_fund(projection, strategy, int(contribution * 100), int(starting_balance * 100))
+    return projection, simulation, non_monthly_total, suggestion
@@ -0,0 +1,119 @@
+from django.db.models import Q
+
+from .models import ExpenseTransaction, IncomeTransaction
+from .net_worth import BALANCE_SOURCES
+
+# Rows are read from the database this many at a time
+EXPORT_CHUNK_SIZE = 2000
+
+TRANSACTION_EXPORT_HEADER = ('Date', 'Type', 'Budget Year', 'Budget Month', 'Category', 'Budget Item', 'Name',
+                             'Amount', 'Cash', 'Credit Purchase', 'Credit Payoff')
+BALANCE_EXPORT_HEADER = ('Date', 'Type', 'Account', 'Balance')
+
+# Text starting with one of these is run as a formula when the CSV is opened in a spreadsheet
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Names used in the Type column of the balance export, keyed by BALANCE_SOURCES key
+BALANCE_TYPES = {
+    'assets': 'Asset',
+    'installment_debts': 'Installment Debt',
+    'revolving_debts': 'Revolving Debt',
+}
+
+
+class Echo:
+    """ A file-like object that hands back whatever is written to it so csv.writer can build rows one at a time """
+
+    def write(self, value):
+        return value
+
+
+def escape_csv_row(row):
+    """
+    Prefixes text cells that a spreadsheet would run as a formula with a quote, so names like =HYPERLINK(...) are
+    shown as text. Numbers, including negative amounts, are left alone.
+
+    Parameters:
+        row (Iterable): The cells of one CSV row.
+
+    Returns:
+        list: The cells with any formula-like text escaped.
+    """
+    return [f"'{cell}" if isinstance(cell, str) and cell.startswith(CSV_FORMULA_PREFIXES) else cell for cell in row]
+
+
+def get_budget_period_range_filter(period_lookup, first_month=None, last_month=None):
+    """
+    Builds a filter for rows whose budget period falls between two months.
+
+    Parameters:
+        period_lookup (str): The path from the model to its budget period, e.g. 'budget_item__budget_period'.
+        first_month (date | None): Any day in the first month to include or None for no lower limit.
+        last_month (date | None): Any day in the last month to include or None for no upper limit.
+    """
+    period_filter = Q()
+    if first_month:
+        period_filter &= Q(**{f'{period_lookup}__year__gt': first_month.year}) | \
+            Q(**{f'{period_lookup}__year': first_month.year, f'{period_lookup}__month__gte': first_month.month})
+    if last_month:
+        period_filter &= Q(**{f'{period_lookup}__year__lt': last_month.year}) | \
+            Q(**{f'{period_lookup}__year': last_month.year, f'{period_lookup}__month__lte': last_month.month})
+    return period_filter
+
+
+def iter_transaction_rows(user_id, first_month=None, last_month=None):
+    """
+    Yields a user's income and expense transactions as CSV rows, starting with the header.
+
+    Rows are read with values_list() a chunk at a time, so memory use stays the same no matter how many transactions
+    are exported.
+
+    Parameters:
+        user_id (int): The user whose transactions are exported.
+        first_month (date | None): Only include budget periods from this month on.
+        last_month (date | None): Only include budget periods up to this month.
+
+    Yields:
+        tuple: The header and then one row per transaction, income first, each in date order.
+    """
+    yield TRANSACTION_EXPORT_HEADER
+
+    income = IncomeTransaction.objects\
+        .filter(get_budget_period_range_filter('budget_item__budget_period', first_month, last_month),
+                user_id=user_id)\
+        .order_by('date', 'id')\
+        .values_list('date', 'budget_item__budget_period__year', 'budget_item__budget_period__month',
+                     'budget_item__name', 'name', 'amount', 'cash')
+    for date, year, month, item_name, name, amount, cash in income.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield date, 'Income', year, month, '', item_name, name, amount, cash, False, False
+
+    period_lookup = 'expense_budget_item__expense_category__budget_period'
+    expenses = ExpenseTransaction.objects\
+        .filter(get_budget_period_range_filter(period_lookup, first_month, last_month), user_id=user_id)\
+        .order_by('date', 'id')\
+        .values_list('date', f'{period_lookup}__year', f'{period_lookup}__month',
+                     'expense_budget_item__expense_category__name', 'expense_budget_item__name', 'name', 'amount',
+                     'cash', 'credit_purchase', 'credit_payoff')
+    for row in expenses.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield (row[0], 'Expense') + row[1:]
+
+
+def iter_balance_rows(user_id):
+    """
+    Yields the balance history of a user's assets and debts as CSV rows, starting with the header.
+
+    Parameters:
+        user_id (int): The user whose balances are exported.
+
+    Yields:
+        tuple: The header and then one row per balance, grouped by account type and account.
+    """
+    yield BALANCE_EXPORT_HEADER
+
+    for key, account_model, balance_model, account_field in BALANCE_SOURCES:
+        balances = balance_model.objects\
+            .filter(user_id=user_id)\
+            .order_by(f'{account_field}__name', account_field, 'date', 'id')\
+            .values_list('date', f'{account_field}__name', 'balance')
+        for date, account_name, balance in balances.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield date, BALANCE_TYPES[key], account_name, balance
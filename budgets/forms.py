@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, PasswordResetForm, _unicode_ci_compare
 from captcha.fields import ReCaptchaField
 from captcha.widgets import ReCaptchaV2Checkbox
-from .models import BudgetPeriod, ExpenseTransaction
+from .models import BudgetPeriod, ExpenseBudgetItem, ExpenseCategory, ExpenseTransaction, IncomeBudgetItem
+from .models import IncomeTransaction
+from .search import SEARCH_KINDS
 
 User = get_user_model()
 
@@ -65,6 +67,117 @@ class BudgetPeriodForm(forms.Form):
         self.fields['template'] = forms.ModelChoiceField(required=False, queryset=BudgetPeriod.objects.filter(user_id=self.user).order_by('-month', '-year'))
 
 
+class RollForwardForm(forms.Form):
+    months = forms.IntegerField(min_value=1, max_value=24, initial=11, label='Number of months')
+    add_money_schedule_items = forms.BooleanField(required=False, initial=True)
+
+
+class ImportTransactionsForm(forms.Form):
+    statement = forms.FileField(help_text='A CSV, OFX or QFX file downloaded from your bank.')
+    expense_budget_item = forms.ModelChoiceField(queryset=ExpenseBudgetItem.objects.none(), label='Record money out in')
+    income_budget_item = forms.ModelChoiceField(queryset=IncomeBudgetItem.objects.none(), label='Record money in in')
+    auto_categorize = forms.BooleanField(required=False, initial=True,
+                                         label='Sort money out into budget items based on past transactions')
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(ImportTransactionsForm, self).__init__(*args, **kwargs)
+        self.fields['expense_budget_item'].queryset = ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=self.budget_period)\
+            .select_related('expense_category')\
+            .order_by('expense_category__name', 'name')
+        self.fields['income_budget_item'].queryset = IncomeBudgetItem.objects\
+            .filter(budget_period=self.budget_period)\
+            .order_by('name')
+
+    def clean_statement(self):
+        statement = self.cleaned_data['statement']
+        if statement.name.rsplit('.', 1)[-1].lower() not in ('csv', 'ofx', 'qfx'):
+            raise forms.ValidationError('Statements must be CSV, OFX or QFX files.')
+        return statement
+
+
+class MoveTransactionsForm(forms.Form):
+    # Filled in by the checkboxes of the transaction rows
+    expense = forms.ModelMultipleChoiceField(queryset=ExpenseTransaction.objects.none(), required=False,
+                                             label='Selected expenses')
+    income = forms.ModelMultipleChoiceField(queryset=IncomeTransaction.objects.none(), required=False,
+                                            label='Selected income')
+    expense_budget_item = forms.ModelChoiceField(queryset=ExpenseBudgetItem.objects.none(), required=False,
+                                                 label='Move selected expenses to')
+    income_budget_item = forms.ModelChoiceField(queryset=IncomeBudgetItem.objects.none(), required=False,
+                                                label='Move selected income to')
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(MoveTransactionsForm, self).__init__(*args, **kwargs)
+        self.fields['expense'].queryset = ExpenseTransaction.objects\
+            .filter(user_id=self.budget_period.user_id,
+                    expense_budget_item__expense_category__budget_period=self.budget_period)\
+            .only('id')
+        self.fields['income'].queryset = IncomeTransaction.objects\
+            .filter(user_id=self.budget_period.user_id, budget_item__budget_period=self.budget_period)\
+            .only('id')
+        self.fields['expense_budget_item'].queryset = ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=self.budget_period)\
+            .select_related('expense_category')\
+            .order_by('expense_category__name', 'name')
+        self.fields['income_budget_item'].queryset = IncomeBudgetItem.objects\
+            .filter(budget_period=self.budget_period)\
+            .order_by('name')
+
+
+class SplitPartForm(forms.Form):
+    expense_budget_item = forms.ModelChoiceField(queryset=ExpenseBudgetItem.objects.none(), label='Budget item')
+    amount = forms.DecimalField(max_digits=11, decimal_places=2)
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(SplitPartForm, self).__init__(*args, **kwargs)
+        self.fields['expense_budget_item'].queryset = ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=self.budget_period)\
+            .select_related('expense_category')\
+            .order_by('expense_category__name', 'name')
+
+
+class BaseSplitFormSet(forms.BaseFormSet):
+    """ The parts of a split transaction, which must have the transaction's sign and add up to its amount """
+
+    def __init__(self, *args, **kwargs):
+        self.total = kwargs.pop('total')
+        super(BaseSplitFormSet, self).__init__(*args, **kwargs)
+
+    def get_allocations(self):
+        """ Returns the (budget item, amount) of each filled in part """
+        return [(form.cleaned_data['expense_budget_item'], form.cleaned_data['amount'])
+                for form in self.forms if form.cleaned_data]
+
+    def clean(self):
+        if any(self.errors):
+            return
+        allocations = self.get_allocations()
+        if len(allocations) < 2:
+            raise forms.ValidationError('Split the transaction into at least two parts.')
+        if any(not amount or (amount > 0) != (self.total > 0) for item, amount in allocations):
+            sign = 'positive' if self.total > 0 else 'negative'
+            raise forms.ValidationError(f'Every part must be {sign} like the transaction.')
+        if sum(amount for item, amount in allocations) != self.total:
+            raise forms.ValidationError(f'The parts must add up to {self.total}.')
+
+
+SplitFormSet = forms.formset_factory(SplitPartForm, formset=BaseSplitFormSet, extra=2)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(max_length=100, label='Search')
+    kinds = forms.MultipleChoiceField(choices=SEARCH_KINDS, required=False, widget=forms.CheckboxSelectMultiple,
+                                      label='Only search')
+    start = forms.DateField(required=False, input_formats=['%Y-%m-%d'], label='From')
+    end = forms.DateField(required=False, input_formats=['%Y-%m-%d'], label='To')
+    min_amount = forms.DecimalField(required=False, max_digits=11, decimal_places=2)
+    max_amount = forms.DecimalField(required=False, max_digits=11, decimal_places=2)
+
+
 class DateForm(forms.Form):
     date = forms.DateTimeField(input_formats=['%Y-%m-%d'])
 
@@ -89,6 +202,50 @@ class ExpenseTransactionDebtPaymentForm(forms.ModelForm):
         super(ExpenseTransactionDebtPaymentForm, self).__init__(*args, **kwargs)
 
 
+class QuickIncomeBudgetItemForm(forms.ModelForm):
+    class Meta:
+        model = IncomeBudgetItem
+        fields = ['name', 'planned_amount', 'type']
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(QuickIncomeBudgetItemForm, self).__init__(*args, **kwargs)
+
+
+class QuickExpenseBudgetItemForm(forms.ModelForm):
+    class Meta:
+        model = ExpenseBudgetItem
+        fields = ['name', 'expense_category', 'planned_amount', 'type']
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(QuickExpenseBudgetItemForm, self).__init__(*args, **kwargs)
+        self.fields['expense_category'].queryset = ExpenseCategory.objects.filter(budget_period=self.budget_period)
+
+
+class QuickIncomeTransactionForm(forms.ModelForm):
+    class Meta:
+        model = IncomeTransaction
+        fields = ['name', 'budget_item', 'amount', 'cash', 'date']
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(QuickIncomeTransactionForm, self).__init__(*args, **kwargs)
+        self.fields['budget_item'].queryset = IncomeBudgetItem.objects.filter(budget_period=self.budget_period)
+
+
+class QuickExpenseTransactionForm(forms.ModelForm):
+    class Meta:
+        model = ExpenseTransaction
+        fields = ['name', 'expense_budget_item', 'amount', 'credit_purchase', 'cash', 'date']
+
+    def __init__(self, *args, **kwargs):
+        self.budget_period = kwargs.pop('budget_period')
+        super(QuickExpenseTransactionForm, self).__init__(*args, **kwargs)
+        self.fields['expense_budget_item'].queryset = ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=self.budget_period)
+
+
 class SettingsForm(forms.Form):
     first_name = forms.CharField()
     last_name = forms.CharField()
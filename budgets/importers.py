@@ -0,0 +1,311 @@
+import codecs
+import csv
+import hashlib
+import re
+from collections import Counter, namedtuple
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .budget_summary import refresh_budget_period_summaries
+from .categorization import categorize_names, forget_categorization_index, normalize_name
+from .models import CustomUser, ExpenseTransaction, IncomeTransaction
+from .reports import invalidate_reports
+
+IMPORT_BATCH_SIZE = 1000
+
+# Header names recognized in CSV statements, compared in lower case
+CSV_DATE_COLUMNS = ('date', 'transaction date', 'posted date', 'posting date', 'post date')
+CSV_NAME_COLUMNS = ('description', 'name', 'payee', 'memo', 'details', 'transaction')
+CSV_AMOUNT_COLUMNS = ('amount', 'transaction amount')
+CSV_DEBIT_COLUMNS = ('debit', 'withdrawal', 'withdrawals')
+CSV_CREDIT_COLUMNS = ('credit', 'deposit', 'deposits')
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%d-%b-%Y', '%b %d, %Y')
+
+# Matches an OFX/QFX tag and the value that follows it, e.g. <TRNAMT>-12.34
+OFX_TOKEN = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+# A statement row - amount is positive for money in and negative for money out
+StatementRow = namedtuple('StatementRow', ['date', 'amount', 'name'])
+
+ImportResult = namedtuple('ImportResult', ['income_created', 'expenses_created', 'duplicates', 'outside_period'])
+
+
+def parse_amount(value):
+    """
+    Parses a statement amount such as '1,234.56', '$-12.00' or '(12.00)'.
+
+    Raises:
+        ValueError: If the value is not an amount.
+    """
+    value = value.strip().replace(',', '').replace('$', '')
+    negative = value.startswith('(') and value.endswith(')')
+    try:
+        amount = Decimal(value.strip('()') or 0)
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value}')
+    return -amount if negative else amount
+
+
+def parse_date(value):
+    """ Parses a statement date in any of CSV_DATE_FORMATS """
+    value = value.strip()
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f'Invalid date: {value}')
+
+
+def find_column(header, names):
+    """ Returns the index of the first header cell matching one of the names or None """
+    for idx, cell in enumerate(header):
+        if cell.strip().lower() in names:
+            return idx
+    return None
+
+
+def iter_csv_rows(lines):
+    """
+    Parses a CSV statement one row at a time.
+
+    The first row must be a header naming the date, description and either an amount column or debit and credit
+    columns.
+
+    Parameters:
+        lines (Iterable[str]): The lines of the file.
+
+    Yields:
+        StatementRow: Each transaction in the file.
+
+    Raises:
+        ValueError: If the columns can't be found or a row can't be parsed.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    date_column = find_column(header, CSV_DATE_COLUMNS)
+    name_column = find_column(header, CSV_NAME_COLUMNS)
+    amount_column = find_column(header, CSV_AMOUNT_COLUMNS)
+    debit_column = find_column(header, CSV_DEBIT_COLUMNS)
+    credit_column = find_column(header, CSV_CREDIT_COLUMNS)
+    if date_column is None or name_column is None or \
+            (amount_column is None and (debit_column is None or credit_column is None)):
+        raise ValueError('Could not find the date, description and amount columns in the CSV header.')
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            if amount_column is not None:
+                amount = parse_amount(row[amount_column])
+            else:
+                amount = parse_amount(row[credit_column]) - abs(parse_amount(row[debit_column]))
+            yield StatementRow(parse_date(row[date_column]), amount, row[name_column].strip())
+        except IndexError:
+            raise ValueError(f'Row {reader.line_num} is missing columns.')
+        except ValueError as err:
+            raise ValueError(f'Row {reader.line_num}: {err}')
+
+
+def iter_ofx_rows(lines):
+    """
+    Parses an OFX or QFX statement one transaction at a time.
+
+    Works for both the SGML and XML flavors of OFX since only the tags inside each STMTTRN block are read.
+
+    Parameters:
+        lines (Iterable[str]): The lines of the file.
+
+    Yields:
+        StatementRow: Each transaction in the file.
+
+    Raises:
+        ValueError: If a transaction can't be parsed.
+    """
+    fields = None
+    for line in lines:
+        for closing, tag, value in OFX_TOKEN.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    fields = {}
+                elif fields is not None:
+                    yield get_ofx_row(fields)
+                    fields = None
+            elif fields is not None and not closing:
+                fields[tag] = value.strip()
+
+
+def get_ofx_row(fields):
+    """ Builds a StatementRow from the tags of an OFX STMTTRN block """
+    try:
+        posted = fields['DTPOSTED']
+        row_date = date(int(posted[:4]), int(posted[4:6]), int(posted[6:8]))
+        amount = parse_amount(fields['TRNAMT'])
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid OFX transaction: {fields}')
+    return StatementRow(row_date, amount, fields.get('NAME') or fields.get('MEMO') or '')
+
+
+def iter_statement_rows(statement_file):
+    """
+    Parses an uploaded CSV, OFX or QFX statement without reading the whole file into memory.
+
+    Parameters:
+        statement_file (django.core.files.File): The uploaded statement.
+
+    Yields:
+        StatementRow: Each transaction in the file.
+
+    Raises:
+        ValueError: If the file type is not supported or the file can't be parsed.
+    """
+    lines = codecs.iterdecode(statement_file, 'utf-8-sig', errors='replace')
+    extension = statement_file.name.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return iter_csv_rows(lines)
+    if extension in ('ofx', 'qfx'):
+        return iter_ofx_rows(lines)
+    raise ValueError('Statements must be CSV, OFX or QFX files.')
+
+
+def get_import_hash(row, occurrence):
+    """
+    Returns the content hash that identifies an imported row.
+
+    Parameters:
+        row (StatementRow): The statement row.
+        occurrence (int): How many identical rows came before this one in the same file, so that two identical
+            purchases on the same day are both kept.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    content = f'{row.date.isoformat()}|{row.amount:.2f}|{normalize_name(row.name)}|{occurrence}'
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def import_batch(bp, batch, expense_budget_item, income_budget_item, auto_categorize=False):
+    """
+    Inserts one batch of hashed statement rows in a single transaction, skipping rows that were already imported.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period the rows belong to.
+        batch (list[tuple[str, StatementRow]]): Import hashes and their rows.
+        expense_budget_item (ExpenseBudgetItem): Where money out is recorded.
+        income_budget_item (IncomeBudgetItem): Where money in is recorded.
+        auto_categorize (bool): Whether to record money out in the budget item suggested by past transactions,
+            falling back to expense_budget_item.
+
+    Returns:
+        tuple[int, int]: The number of income and expense transactions created.
+    """
+    hashes = [import_hash for import_hash, row in batch]
+    with transaction.atomic():
+        # Locking the user makes concurrent imports for them take turns, so no other import can store one of these
+        # hashes between the check below and the insert
+        list(CustomUser.objects.select_for_update().filter(pk=bp.user_id).values_list('pk', flat=True))
+        existing = set(
+            IncomeTransaction.objects
+            .filter(user_id=bp.user_id, import_hash__in=hashes)
+            .values_list('import_hash', flat=True)
+        )
+        existing.update(
+            ExpenseTransaction.objects
+            .filter(user_id=bp.user_id, import_hash__in=hashes)
+            .values_list('import_hash', flat=True)
+        )
+
+        batch = [(import_hash, row) for import_hash, row in batch if import_hash not in existing]
+        expense_budget_items = [expense_budget_item] * len(batch)
+        if auto_categorize:
+            expense_budget_items = [
+                item or expense_budget_item
+                for item in categorize_names(bp, [row.name if row.amount < 0 else '' for import_hash, row in batch])
+            ]
+
+        income = []
+        expenses = []
+        for (import_hash, row), row_expense_budget_item in zip(batch, expense_budget_items):
+            if row.amount > 0:
+                income.append(IncomeTransaction(user_id=bp.user_id,
+                                                budget_item=income_budget_item,
+                                                name=row.name[:50],
+                                                amount=row.amount,
+                                                date=row.date,
+                                                import_hash=import_hash))
+            else:
+                expenses.append(ExpenseTransaction(user_id=bp.user_id,
+                                                   expense_budget_item=row_expense_budget_item,
+                                                   name=row.name[:50],
+                                                   amount=-row.amount,
+                                                   date=row.date,
+                                                   import_hash=import_hash))
+
+        IncomeTransaction.objects.bulk_create(income)
+        ExpenseTransaction.objects.bulk_create(expenses)
+    return len(income), len(expenses)
+
+
+def import_statement(bp, rows, expense_budget_item, income_budget_item, auto_categorize=False,
+                     batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports statement rows into a budget period.
+
+    Rows are consumed lazily and written in batches, each batch in its own transaction. Money in becomes an income
+    transaction and money out an expense transaction. Rows dated outside the budget period's month and rows that
+    were imported before are skipped.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period to import into.
+        rows (Iterable[StatementRow]): The statement rows, e.g. from iter_statement_rows.
+        expense_budget_item (ExpenseBudgetItem): Where money out is recorded.
+        income_budget_item (IncomeBudgetItem): Where money in is recorded.
+        auto_categorize (bool): Whether to record money out in the budget item suggested by past transactions,
+            falling back to expense_budget_item.
+        batch_size (int): The number of rows written per transaction.
+
+    Returns:
+        ImportResult: How many rows were created, were duplicates or were outside the budget period.
+    """
+    income_created = expenses_created = in_period = outside_period = 0
+    occurrences = Counter()
+    batch = []
+
+    def write_batch():
+        nonlocal income_created, expenses_created
+        created = import_batch(bp, batch, expense_budget_item, income_budget_item, auto_categorize)
+        income_created += created[0]
+        expenses_created += created[1]
+        batch.clear()
+
+    try:
+        for row in rows:
+            if row.date.year != bp.year or row.date.month != bp.month:
+                outside_period += 1
+                continue
+            if not row.amount:
+                continue
+            in_period += 1
+            key = (row.date, row.amount, normalize_name(row.name))
+            batch.append((get_import_hash(row, occurrences[key]), row))
+            occurrences[key] += 1
+            if len(batch) >= batch_size:
+                write_batch()
+        if batch:
+            write_batch()
+    finally:
+        # bulk_create skips the model signals, so refresh what they would have. Batches written before a bad row
+        # stay committed, so this runs even when the import stops part way through.
+        if income_created or expenses_created:
+            refresh_budget_period_summaries([bp.id])
+            invalidate_reports(bp.user_id)
+            forget_categorization_index(bp.user_id)
+
+    duplicates = in_period - income_created - expenses_created
+    return ImportResult(income_created, expenses_created, duplicates, outside_period)
@@ -0,0 +1,108 @@
+import heapq
+from collections import namedtuple
+from datetime import date
+from itertools import islice
+
+from django.db.models import Q
+
+from .models import ExpenseTransaction, IncomeTransaction
+
+LEDGER_PAGE_SIZE = 50
+
+# Each entry is (kind, transaction model, budget period lookup, related fields to select). On the same date income
+# is listed before expenses.
+LEDGER_SOURCES = (
+    ('income', IncomeTransaction, 'budget_item__budget_period', ('budget_item',)),
+    ('expense', ExpenseTransaction, 'expense_budget_item__expense_category__budget_period',
+     ('expense_budget_item__expense_category',)),
+)
+LEDGER_KINDS = [kind for kind, model, period_lookup, related in LEDGER_SOURCES]
+
+# transactions is a list of IncomeTransaction and ExpenseTransaction objects, newest first
+LedgerPage = namedtuple('LedgerPage', ['transactions', 'next_cursor'])
+
+
+def encode_cursor(kind, transaction):
+    """ Returns the cursor that continues a ledger after the given transaction, e.g. '2023-07-14.expense.52' """
+    return f'{transaction.date.isoformat()}.{kind}.{transaction.id}'
+
+
+def decode_cursor(cursor):
+    """
+    Splits a ledger cursor into its parts.
+
+    Parameters:
+        cursor (str): A cursor made by encode_cursor.
+
+    Returns:
+        tuple[date, str, int]: The date, kind and id of the last transaction on the previous page.
+
+    Raises:
+        ValueError: If the cursor is not valid.
+    """
+    cursor_date, kind, cursor_id = cursor.split('.')
+    if kind not in LEDGER_KINDS:
+        raise ValueError(f'Unknown ledger kind: {kind}')
+    return date.fromisoformat(cursor_date), kind, int(cursor_id)
+
+
+def get_after_cursor_filter(kind, cursor):
+    """
+    Builds the filter for the transactions of one kind that come after a cursor in ledger order.
+
+    The ledger is ordered by date descending, then by kind in LEDGER_SOURCES order, then by id descending.
+    """
+    cursor_date, cursor_kind, cursor_id = cursor
+    kind_rank = LEDGER_KINDS.index(kind)
+    cursor_kind_rank = LEDGER_KINDS.index(cursor_kind)
+    if kind_rank < cursor_kind_rank:
+        return Q(date__lt=cursor_date)
+    if kind_rank > cursor_kind_rank:
+        return Q(date__lte=cursor_date)
+    return Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=cursor_id)
+
+
+def get_ledger_stream(kind_rank, kind, transactions):
+    """ Lazily yields (sort key, kind, transaction) for transactions that are already in ledger order """
+    for transaction in transactions.iterator():
+        yield (transaction.date, -kind_rank, transaction.id), kind, transaction
+
+
+def get_ledger_page(bp, cursor=None, page_size=LEDGER_PAGE_SIZE):
+    """
+    Gets one page of a budget period's income and expense transactions, newest first.
+
+    Both transaction types are read in ledger order by the database, at most one page each, and merged lazily. Pages
+    continue from a keyset cursor so later pages don't re-read earlier rows.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period.
+        cursor (str | None): The next_cursor of the previous page or None for the first page.
+        page_size (int): The number of transactions per page.
+
+    Returns:
+        LedgerPage: The transactions on the page and the cursor of the next page, or None if this is the last page.
+
+    Raises:
+        ValueError: If the cursor is not valid.
+    """
+    decoded_cursor = decode_cursor(cursor) if cursor else None
+
+    streams = []
+    for kind_rank, (kind, model, period_lookup, related) in enumerate(LEDGER_SOURCES):
+        transactions = model.objects\
+            .filter(**{period_lookup: bp})\
+            .select_related(*related)\
+            .order_by('-date', '-id')
+        if decoded_cursor:
+            transactions = transactions.filter(get_after_cursor_filter(kind, decoded_cursor))
+        # Read one extra row to know whether there is a next page
+        streams.append(get_ledger_stream(kind_rank, kind, transactions[:page_size + 1]))
+
+    merged = list(islice(heapq.merge(*streams, key=lambda entry: entry[0], reverse=True), page_size + 1))
+    page = merged[:page_size]
+    next_cursor = None
+    if len(merged) > page_size:
+        key, kind, transaction = page[-1]
+        next_cursor = encode_cursor(kind, transaction)
+    return LedgerPage([transaction for key, kind, transaction in page], next_cursor)
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budgets.backups import iter_backup_lines, iter_gzip
+from budgets.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Writes a user\'s whole account to a newline-delimited JSON backup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='The user to back up')
+        parser.add_argument('--output', help='File to write to, defaults to standard output')
+        parser.add_argument('--gzip', action='store_true', help='Compress the backup with gzip')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['email'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No user with the email {options["email"]}')
+
+        chunks = iter_backup_lines(user)
+        if options['gzip']:
+            chunks = iter_gzip(chunks)
+        else:
+            chunks = (line.encode() for line in chunks)
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
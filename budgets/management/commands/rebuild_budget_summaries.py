@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from budgets.budget_summary import refresh_budget_period_summaries
+from budgets.models import BudgetPeriod
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the budget period summaries from budget items and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only rebuild summaries for this user')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of budget periods per rebuild')
+
+    def handle(self, *args, **options):
+        budget_periods = BudgetPeriod.objects.order_by('id')
+        if options['email']:
+            budget_periods = budget_periods.filter(user__email=options['email'])
+
+        budget_period_ids = list(budget_periods.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(budget_period_ids), batch_size):
+            refresh_budget_period_summaries(budget_period_ids[start:start + batch_size])
+        self.stdout.write(f'Rebuilt summaries for {len(budget_period_ids)} budget periods')
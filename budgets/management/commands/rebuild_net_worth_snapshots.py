@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from budgets.models import CustomUser
+from budgets.net_worth import refresh_net_worth_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly net worth snapshots from balance history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only rebuild snapshots for this user')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('id')
+        if options['email']:
+            users = users.filter(email=options['email'])
+
+        for user in users:
+            refresh_net_worth_snapshots(user.id)
+            self.stdout.write(f'Rebuilt net worth snapshots for {user}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from budgets.search import create_search_indexes
+
+
+class Command(BaseCommand):
+    help = 'Creates any missing search indexes and, on SQLite, refills them from the searched tables'
+
+    def handle(self, *args, **options):
+        create_search_indexes()
+        self.stdout.write('Search indexes are up to date')
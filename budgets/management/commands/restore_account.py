@@ -0,0 +1,36 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budgets.backups import restore_backup
+from budgets.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Loads a backup made by backup_account into a user\'s account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='The user to restore into')
+        parser.add_argument('path', help='The backup file, optionally gzip compressed')
+        parser.add_argument('--replace', action='store_true', help='Delete the user\'s current data first')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['email'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No user with the email {options["email"]}')
+
+        with open(options['path'], 'rb') as backup_file:
+            is_gzip = backup_file.read(2) == b'\x1f\x8b'
+        backup_file = gzip.open(options['path'], 'rt', encoding='utf-8') if is_gzip \
+            else open(options['path'], encoding='utf-8')
+
+        try:
+            with backup_file:
+                restored = restore_backup(user, backup_file, options['replace'])
+        except (ValueError, OSError) as err:
+            raise CommandError(str(err))
+
+        for label, count in restored.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(f'Restored {sum(restored.values())} objects for {user.email}')
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budgets.expense_fund import EXPENSE_FUND_STRATEGIES, run_expense_fund_simulation
+from budgets.models import CustomUser
+from budgets.net_worth import get_year_months_between
+from budgets.projection import cents_to_decimal
+
+
+class Command(BaseCommand):
+    help = 'Simulates an expense fund that pays for a user\'s active schedule items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='The user to simulate for')
+        parser.add_argument('--months', type=int, default=12, help='Number of months to simulate')
+        parser.add_argument('--strategy', default='flat', choices=[key for key, name in EXPENSE_FUND_STRATEGIES])
+        parser.add_argument('--contribution', type=int, help='Monthly contribution in dollars, defaults to the '
+                                                             'suggested contribution')
+        parser.add_argument('--starting-balance', type=int, default=0, help='Balance before the first month in '
+                                                                             'dollars')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['email'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No user with the email {options["email"]}')
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+
+        first_month = date.today().replace(day=1)
+        last_index = first_month.year * 12 + first_month.month - 2 + options['months']
+        year_months = get_year_months_between(first_month, date(last_index // 12, last_index % 12 + 1, 1))
+
+        projection, simulation, non_monthly_total, suggestion = run_expense_fund_simulation(
+            user, year_months, options['strategy'], options['contribution'], options['starting_balance']
+        )
+
+        self.stdout.write(f'Suggested monthly contribution: ${suggestion}')
+        self.stdout.write(f'{"Month":<10}{"Fund In":>14}{"Fund Out":>14}{"Fund Balance":>16}')
+        for (year, month), fund_in, fund_out, balance in zip(
+                year_months, simulation.contributions, simulation.outflows, simulation.balances):
+            self.stdout.write(f'{year}-{month:02}'.ljust(10)
+                              + f'{cents_to_decimal(fund_in):>14.2f}'
+                              + f'{cents_to_decimal(fund_out):>14.2f}'
+                              + f'{cents_to_decimal(balance):>16.2f}')
+
+        year, month = year_months[simulation.minimum_balance_month]
+        self.stdout.write(f'Lowest balance: ${cents_to_decimal(simulation.minimum_balance):.2f} in {year}-{month:02}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from budgets.models import BudgetPeriod
+from budgets.new_debt import sync_new_debt
+
+
+class Command(BaseCommand):
+    help = 'Sets every budget period\'s New Debt to the total of its credit card purchases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only sync budget periods for this user')
+
+    def handle(self, *args, **options):
+        budget_periods = BudgetPeriod.objects.order_by('user_id', 'year', 'month')
+        if options['email']:
+            budget_periods = budget_periods.filter(user__email=options['email'])
+
+        for bp in budget_periods:
+            sync_new_debt(bp)
+        self.stdout.write(f'Synced New Debt for {len(budget_periods)} budget periods')
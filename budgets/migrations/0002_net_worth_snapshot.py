@@ -0,0 +1,108 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:30
+
+from collections import defaultdict
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Each entry maps a snapshot total to the balance model it adds up and the balance foreign key name
+BALANCE_SOURCES = (
+    ("asset_total", "AssetBalance", "asset"),
+    ("installment_debt_total", "InstallmentDebtBalance", "debt"),
+    ("revolving_debt_total", "RevolvingDebtBalance", "debt"),
+)
+
+
+def create_net_worth_snapshots(apps, schema_editor):
+    """
+    Builds every user's snapshots the way refresh_net_worth_snapshots does, from the month of their first balance
+    through the current month or the month of their latest balance, whichever is later.
+    """
+    snapshot_model = apps.get_model("budgets", "NetWorthSnapshot")
+
+    balances_by_user = defaultdict(list)
+    for total_field, model_name, account_field in BALANCE_SOURCES:
+        balance_model = apps.get_model("budgets", model_name)
+        rows = (
+            balance_model.objects.exclude(date=None)
+            .order_by("date")
+            .values_list(f"{account_field}__user_id", f"{account_field}_id", "date", "balance")
+        )
+        for user_id, account_id, balance_date, balance in rows:
+            balances_by_user[user_id].append((balance_date, (total_field, account_id), balance))
+
+    this_month = date.today().replace(day=1)
+    for user_id, balances in balances_by_user.items():
+        balances.sort(key=lambda row: row[0])
+        month_start = balances[0][0].replace(day=1)
+        last_month = max(this_month, balances[-1][0].replace(day=1))
+
+        # Carry each account's balance forward to the end of every month
+        current_balances = {}
+        snapshots = []
+        index = 0
+        while month_start <= last_month:
+            cutoff = month_start + relativedelta(months=+1)
+            while index < len(balances) and balances[index][0] < cutoff:
+                balance_date, account_key, balance = balances[index]
+                current_balances[account_key] = balance
+                index += 1
+            totals = {total_field: 0 for total_field, model_name, account_field in BALANCE_SOURCES}
+            for (total_field, account_id), balance in current_balances.items():
+                totals[total_field] += balance
+            snapshots.append(snapshot_model(user_id=user_id, date=month_start, **totals))
+            month_start = cutoff
+        snapshot_model.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NetWorthSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "asset_total",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "installment_debt_total",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "revolving_debt_total",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("date",),
+                "get_latest_by": "date",
+                "unique_together": {("user", "date")},
+            },
+        ),
+        migrations.RunPython(create_net_worth_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_latest_balances(apps, schema_editor):
+    for model_name in ("Asset", "InstallmentDebt", "RevolvingDebt"):
+        account_model = apps.get_model("budgets", model_name)
+        for account in account_model.objects.all():
+            latest = (
+                account.balances.order_by(F("date").desc(nulls_last=True))
+                .values_list("balance", "date")
+                .first()
+            )
+            if latest is not None:
+                account.latest_balance, account.latest_balance_date = latest
+                account.save(update_fields=["latest_balance", "latest_balance_date"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0002_net_worth_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="asset",
+            name="latest_balance",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=11, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="asset",
+            name="latest_balance_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="installmentdebt",
+            name="latest_balance",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=11, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="installmentdebt",
+            name="latest_balance_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="revolvingdebt",
+            name="latest_balance",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=11, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="revolvingdebt",
+            name="latest_balance_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_latest_balances, migrations.RunPython.noop),
+    ]
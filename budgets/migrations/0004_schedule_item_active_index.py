@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0003_latest_balance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="scheduleitem",
+            index=models.Index(
+                fields=["user", "frequency", "first_due_date"],
+                name="budgets_sch_user_id_fb192d_idx",
+            ),
+        ),
+    ]
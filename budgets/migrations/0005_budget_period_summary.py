@@ -0,0 +1,188 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:43
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+import django.db.models.deletion
+
+# Totals read for each budget period - (model name, budget period lookup, aggregates), as in budget_summary
+SUMMARY_AGGREGATES = (
+    ("IncomeBudgetItem", "budget_period", {
+        "total_planned_income": Sum("planned_amount"),
+        "reserved_income": Sum("planned_amount", filter=Q(type="Reserve")),
+    }),
+    ("IncomeTransaction", "budget_item__budget_period", {
+        "total_received": Sum("amount"),
+        "total_cash_income": Sum("amount", filter=Q(cash=True)),
+        "total_bank_income": Sum("amount", filter=Q(cash=False)),
+    }),
+    ("ExpenseBudgetItem", "expense_category__budget_period", {
+        "total_planned_expenses": Sum("planned_amount", filter=~Q(name="New Debt")),
+        "reserved_expenses": Sum("planned_amount", filter=Q(type="Reserve")),
+    }),
+    ("ExpenseTransaction", "expense_budget_item__expense_category__budget_period", {
+        "total_new_debt": Sum("amount", filter=Q(credit_purchase=True)),
+        "total_paid_debt": Sum("amount", filter=Q(credit_payoff=True)),
+        "total_cash_expenses": Sum("amount", filter=Q(credit_purchase=False, cash=True)),
+        "total_bank_expenses": Sum("amount", filter=Q(credit_purchase=False, cash=False)),
+    }),
+)
+
+
+def create_budget_period_summaries(apps, schema_editor):
+    """
+    Stores a summary for every existing budget period the way refresh_budget_period_summaries does, so pages that
+    read the summaries never have to create them.
+    """
+    budget_period_model = apps.get_model("budgets", "BudgetPeriod")
+    summary_model = apps.get_model("budgets", "BudgetPeriodSummary")
+
+    raw_totals = {
+        bp_id: {}
+        for bp_id in budget_period_model.objects.values_list("id", flat=True)
+    }
+    for model_name, period_lookup, aggregates in SUMMARY_AGGREGATES:
+        rows = (
+            apps.get_model("budgets", model_name)
+            .objects.values(period_lookup)
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for row in rows:
+            raw_totals[row.pop(period_lookup)].update(row)
+
+    summaries = []
+    for bp_id, user_id, month, year in budget_period_model.objects.values_list("id", "user_id", "month", "year"):
+        totals = {
+            key: raw_totals[bp_id].get(key) or Decimal(0.00)
+            for model_name, period_lookup, aggregates in SUMMARY_AGGREGATES
+            for key in aggregates
+        }
+        summaries.append(summary_model(
+            budget_period_id=bp_id,
+            user_id=user_id,
+            month=month,
+            year=year,
+            total_planned_income=totals["total_planned_income"],
+            total_planned_expenses=totals["total_planned_expenses"],
+            total_actual_income=totals["total_received"] + totals["reserved_income"],
+            total_actual_expenses=totals["total_cash_expenses"] + totals["total_bank_expenses"]
+            + totals["reserved_expenses"],
+            total_bank_income=totals["total_bank_income"],
+            total_bank_expenses=totals["total_bank_expenses"],
+            total_cash_income=totals["total_cash_income"],
+            total_cash_expenses=totals["total_cash_expenses"],
+            total_new_debt=totals["total_new_debt"],
+            total_paid_debt=totals["total_paid_debt"],
+            reserved_funds=totals["reserved_income"] - totals["reserved_expenses"],
+        ))
+    summary_model.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0004_schedule_item_active_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BudgetPeriodSummary",
+            fields=[
+                (
+                    "budget_period",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="budgets.budgetperiod",
+                    ),
+                ),
+                (
+                    "month",
+                    models.IntegerField(
+                        choices=[
+                            (1, "Jan"),
+                            (2, "Feb"),
+                            (3, "Mar"),
+                            (4, "Apr"),
+                            (5, "May"),
+                            (6, "Jun"),
+                            (7, "Jul"),
+                            (8, "Aug"),
+                            (9, "Sep"),
+                            (10, "Oct"),
+                            (11, "Nov"),
+                            (12, "Dec"),
+                        ]
+                    ),
+                ),
+                ("year", models.PositiveIntegerField()),
+                (
+                    "total_planned_income",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_planned_expenses",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_actual_income",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_actual_expenses",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_bank_income",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_bank_expenses",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_cash_income",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_cash_expenses",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_new_debt",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "total_paid_debt",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "reserved_funds",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=13),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Budget period summaries",
+                "ordering": ("year", "month"),
+                "indexes": [
+                    models.Index(
+                        fields=["user", "year", "month"],
+                        name="budgets_bud_user_id_2726e2_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_budget_period_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0005_budget_period_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expensetransaction",
+            name="import_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="incometransaction",
+            name="import_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="expensetransaction",
+            constraint=models.UniqueConstraint(
+                fields=("user", "import_hash"),
+                name="unique_expense_transaction_import_hash",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="incometransaction",
+            constraint=models.UniqueConstraint(
+                fields=("user", "import_hash"),
+                name="unique_income_transaction_import_hash",
+            ),
+        ),
+    ]
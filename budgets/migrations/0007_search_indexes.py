@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# The statements are frozen here rather than imported from budgets.search so this migration keeps doing the same
+# thing however the app code changes later.
+#
+# On SQLite every searched table gets an FTS5 trigram table kept in sync by triggers. A later migration that makes
+# SQLite remake one of these tables (e.g. AlterField or RemoveField) drops its triggers along with the old table, so
+# it has to recreate them afterwards with a RunPython that calls budgets.search.create_search_indexes, or
+# `manage.py rebuild_search_index` has to be run after migrating. Adding a column with AddField keeps them.
+SEARCH_TABLES = (
+    "budgets_incometransaction",
+    "budgets_expensetransaction",
+    "budgets_incomebudgetitem",
+    "budgets_expensebudgetitem",
+    "budgets_scheduleitem",
+)
+
+POSTGRESQL_CREATE = (
+    "CREATE INDEX IF NOT EXISTS {table}_name_trgm ON {table} USING gin (name gin_trgm_ops)",
+)
+POSTGRESQL_DROP = (
+    "DROP INDEX IF EXISTS {table}_name_trgm",
+)
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search "
+    "USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF name ON {table} BEGIN "
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO {table}_search({table}_search) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS {table}_search_insert",
+    "DROP TRIGGER IF EXISTS {table}_search_delete",
+    "DROP TRIGGER IF EXISTS {table}_search_update",
+    "DROP TABLE IF EXISTS {table}_search",
+)
+
+
+def get_statements(connection, postgresql, sqlite):
+    """ Picks the statements for the database, nothing for databases without a search index """
+    if connection.vendor == "postgresql":
+        return [statement.format(table=table) for table in SEARCH_TABLES for statement in postgresql]
+    # FTS5's trigram tokenizer was added in SQLite 3.34
+    if connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 34, 0):
+        return [statement.format(table=table) for table in SEARCH_TABLES for statement in sqlite]
+    return []
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for statement in get_statements(schema_editor.connection, POSTGRESQL_CREATE, SQLITE_CREATE):
+        schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    for statement in get_statements(schema_editor.connection, POSTGRESQL_DROP, SQLITE_DROP):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0006_transaction_import_hash"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0007_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expensetransaction",
+            name="split_group",
+            field=models.UUIDField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+    ]
@@ -5,8 +5,10 @@ from dateutil.relativedelta import relativedelta
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+
+from .occurrences import count_due_dates_in_month, get_next_due_date
 
 # Schedule item choices
 FREQUENCY_CHOICES = (
@@ -112,6 +114,9 @@ class AssetOrDebt(models.Model):
     name = models.CharField(max_length=50)
     type = models.CharField(max_length=50, blank=True)
     hidden = models.BooleanField(default=False)
+    # Copy of the newest balance entry - kept up to date whenever balances change
+    latest_balance = models.DecimalField(max_digits=11, decimal_places=2, blank=True, null=True, editable=False)
+    latest_balance_date = models.DateField(blank=True, null=True, editable=False)
 
     def __str__(self):
         if self.type == '':
@@ -119,6 +124,19 @@ class AssetOrDebt(models.Model):
         else:
             return self.name + ' - ' + self.type
 
+    def refresh_latest_balance(self):
+        """ Points latest_balance and latest_balance_date at the newest balance entry """
+        account = type(self).objects.filter(pk=self.pk)
+        with transaction.atomic():
+            # Lock the account so concurrent balance changes are applied one at a time
+            list(account.select_for_update().values_list('pk', flat=True))
+            latest = self.balances\
+                .order_by(F('date').desc(nulls_last=True))\
+                .values_list('balance', 'date')\
+                .first()
+            self.latest_balance, self.latest_balance_date = latest or (None, None)
+            account.update(latest_balance=self.latest_balance, latest_balance_date=self.latest_balance_date)
+
     class Meta:
         ordering = ('name',)
         unique_together = ('user', 'name',)
@@ -155,6 +173,11 @@ class Balance(models.Model):
     def __str__(self):
         return str(self.balance)
 
+    def save(self, *args, **kwargs):
+        # The latest balance signal handler runs inside the save so both are committed together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __float__(self):
         if self.balance is None:
             return 0.00
@@ -190,7 +213,36 @@ class RevolvingDebtBalance(Balance):
         ordering = ('-date', 'debt')
 
 
+class NetWorthSnapshot(models.Model):
+    """ Month end asset and debt totals for a user - maintained whenever a balance changes """
+    user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
+    date = models.DateField()  # First day of the month
+    asset_total = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    installment_debt_total = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    revolving_debt_total = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f'{self.user} - {self.date:%b %Y}'
+
+    def get_debt_total(self):
+        return self.installment_debt_total + self.revolving_debt_total
+
+    def get_net_worth(self):
+        return self.asset_total - self.get_debt_total()
+
+    class Meta:
+        get_latest_by = 'date'
+        unique_together = ('user', 'date',)
+        ordering = ('date',)
+
+
 # Money Schedule Models
+class ScheduleItemQuerySet(models.QuerySet):
+    def active(self):
+        """ Same rule as ScheduleItem.is_active - excludes one time only items whose due date has passed """
+        return self.exclude(frequency='One time only', first_due_date__lt=date.today())
+
+
 class ScheduleItem(models.Model):
     user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
@@ -200,6 +252,8 @@ class ScheduleItem(models.Model):
     first_due_date = models.DateField()
     frequency = models.CharField(max_length=50, choices=FREQUENCY_CHOICES)
 
+    objects = ScheduleItemQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.name} - {self.amount} - {self.first_due_date} - {self.frequency}'
 
@@ -234,24 +288,7 @@ class ScheduleItem(models.Model):
         Returns:
             date | None: The next payment date or none if object is one time only and the due date has passed.
         """
-        current_date = date.today()
-
-        # If the first due date hasn't happened yet, that will be the next payment
-        if self.first_due_date >= current_date:
-            return self.first_due_date
-
-        # If item is one time only and is already past due it will return None
-        if self.frequency == 'One time only':
-            return None
-
-        # Assign time delta based on frequency
-        time_delta = self.get_time_delta()
-        date_to_check = self.first_due_date
-
-        # Increment the date until it is past the current date and then return that date
-        while current_date > date_to_check:
-            date_to_check += time_delta
-        return date_to_check
+        return get_next_due_date(self.first_due_date, self.frequency, date.today())
 
     def get_monthly_total(self, year, month):
         """
@@ -263,32 +300,7 @@ class ScheduleItem(models.Model):
         Returns:
             Decimal: The total amount for this item in this year/month pair.
         """
-        year = int(year)
-        month = int(month)
-        # Check if item is one time only
-        if self.frequency == 'One time only':
-            # Check if item is happening this month/year
-            if self.first_due_date.month == month and self.first_due_date.year == year:
-                return self.amount
-            else:
-                return Decimal(0.00)
-
-        # Get the time delta to find due dates
-        time_delta = self.get_time_delta()
-
-        # Set the date cutoff - 1st day of the following month
-        date_cutoff = date(year, month, 1) + relativedelta(months=+1)
-
-        total_amount = Decimal(0.0)
-        date_to_check = self.first_due_date
-
-        # Check for recurring due dates
-        while date_cutoff > date_to_check:
-            if date_to_check.month == month and date_to_check.year == year:
-                total_amount += self.amount
-            date_to_check += time_delta
-
-        return total_amount
+        return self.amount * count_due_dates_in_month(self.first_due_date, self.frequency, int(year), int(month))
 
     def monthly_occurrences(self, year, month):
         """
@@ -301,30 +313,9 @@ class ScheduleItem(models.Model):
         Returns:
             list[ScheduleItem, Decimal] or None: A list containing object and total for the year/month pair or None.
         """
-        # Check if item is one time only
-        if self.frequency == 'One time only':
-            # Check if item is happening this month/year
-            if self.first_due_date.month == month and self.first_due_date.year == year: # Happening this month
-                return [self, self.amount]
-            else: # Not happening this month
-                return None
-
-        # Get the time delta to find due dates
-        time_delta = self.get_time_delta()
-
-        # Set the initial due date and date cutoff (1st day of the month)
-        date_to_check = self.first_due_date
-        date_cutoff = date(year, month, 1) + relativedelta(months=+1)
-
-        # Check for recurring due dates for this month/year and total the payments
-        occurrences = [self, Decimal(0.00)]
-        while date_cutoff > date_to_check:
-            if date_to_check.month == month and date_to_check.year == year:
-                occurrences[1] += self.amount
-            date_to_check += time_delta
-
-        if occurrences[1]: # If balanced is not 0
-            return occurrences
+        total = self.get_monthly_total(year, month)
+        if total:  # If balance is not 0
+            return [self, total]
         else:
             return None
 
@@ -344,6 +335,11 @@ class ScheduleItem(models.Model):
             else:
                 return False
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'frequency', 'first_due_date']),
+        ]
+
 
 # Budget Models
 class BudgetPeriod(models.Model):
@@ -361,6 +357,58 @@ class BudgetPeriod(models.Model):
         return str(self.year) + ' - ' + str(MONTH_CHOICES[self.month - 1][1])
 
 
+class BudgetPeriodSummary(models.Model):
+    """ Planned and actual totals of a budget period - maintained whenever its items or transactions change """
+    budget_period = models.OneToOneField('BudgetPeriod', on_delete=models.CASCADE, primary_key=True,
+                                         related_name='summary')
+    user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
+    month = models.IntegerField(choices=MONTH_CHOICES)
+    year = models.PositiveIntegerField()
+    total_planned_income = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_planned_expenses = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_actual_income = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_actual_expenses = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_bank_income = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_bank_expenses = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_cash_income = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_cash_expenses = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_new_debt = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    total_paid_debt = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+    reserved_funds = models.DecimalField(max_digits=13, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f'{self.user} - {self.year} - {MONTH_CHOICES[self.month - 1][1]}'
+
+    def get_left_to_plan(self):
+        return self.total_planned_income - self.total_planned_expenses
+
+    def get_left_to_spend(self):
+        return self.total_actual_income - self.total_actual_expenses
+
+    def get_bank_balance_change(self):
+        return self.total_bank_income - self.total_bank_expenses
+
+    def get_cash_balance_change(self):
+        return self.total_cash_income - self.total_cash_expenses
+
+    def get_remaining_debt(self):
+        return self.total_new_debt - self.total_paid_debt
+
+    class Meta:
+        verbose_name_plural = 'Budget period summaries'
+        indexes = [
+            models.Index(fields=['user', 'year', 'month']),
+        ]
+        ordering = ('year', 'month',)
+
+
+class IncomeBudgetItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """ Annotates each item with the sum and count of its transactions """
+        return self.annotate(received_total=Sum('income_transactions__amount'),
+                             transaction_count=Count('income_transactions'))
+
+
 class IncomeBudgetItem(models.Model):
     user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
     budget_period = models.ForeignKey('BudgetPeriod', on_delete=models.CASCADE, related_name='income_budget_items')
@@ -368,13 +416,20 @@ class IncomeBudgetItem(models.Model):
     planned_amount = models.DecimalField(max_digits=11, decimal_places=2)
     type = models.CharField(max_length=50, choices=INCOME_CHOICES, default='Income')
 
+    objects = IncomeBudgetItemQuerySet.as_manager()
+
     def __str__(self):
         return self.name + ' - ' + str(self.budget_period)
 
     def get_total_transactions(self):
+        # Use the values from IncomeBudgetItemQuerySet.with_totals when they were loaded
+        if hasattr(self, 'transaction_count'):
+            return self.transaction_count
         return self.income_transactions.count()
 
     def get_total_received(self):
+        if hasattr(self, 'received_total'):
+            return self.received_total or 0
         return self.income_transactions.aggregate(Sum('amount'))['amount__sum'] or 0
 
     class Meta:
@@ -392,6 +447,7 @@ class IncomeTransaction(models.Model):
     amount = models.DecimalField(max_digits=11, decimal_places=2)
     cash = models.BooleanField(default=False)
     date = models.DateField()
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)  # Set for imported rows
 
     def get_signed_value(self):
         return f'+{self.amount}'
@@ -410,6 +466,9 @@ class IncomeTransaction(models.Model):
 
     class Meta:
         ordering = ('-amount', 'name',)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'import_hash'], name='unique_income_transaction_import_hash'),
+        ]
 
 
 class ExpenseCategory(models.Model):
@@ -431,6 +490,13 @@ class ExpenseCategory(models.Model):
         unique_together = ('user', 'name', 'budget_period')
 
 
+class ExpenseBudgetItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        """ Annotates each item with the sum and count of its transactions """
+        return self.annotate(spent_total=Sum('expense_transactions__amount'),
+                             transaction_count=Count('expense_transactions'))
+
+
 class ExpenseBudgetItem(models.Model):
     user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
     expense_category = models.ForeignKey('ExpenseCategory', on_delete=models.CASCADE, related_name='expense_budget_items')
@@ -438,6 +504,8 @@ class ExpenseBudgetItem(models.Model):
     planned_amount = models.DecimalField(max_digits=11, decimal_places=2)
     type = models.CharField(max_length=50, choices=EXPENSE_CHOICES, default='Expense')
 
+    objects = ExpenseBudgetItemQuerySet.as_manager()
+
     def __str__(self):
         return self.name + ' - ' + str(self.expense_category)
 
@@ -448,9 +516,14 @@ class ExpenseBudgetItem(models.Model):
             return float(self.planned_amount)
 
     def get_total_transactions(self):
+        # Use the values from ExpenseBudgetItemQuerySet.with_totals when they were loaded
+        if hasattr(self, 'transaction_count'):
+            return self.transaction_count
         return self.expense_transactions.count()
 
     def get_total_spent(self):
+        if hasattr(self, 'spent_total'):
+            return self.spent_total or 0
         return self.expense_transactions.aggregate(Sum('amount'))['amount__sum'] or 0
 
     class Meta:
@@ -466,10 +539,22 @@ class ExpenseTransaction(models.Model):
     credit_payoff = models.BooleanField(default=False)
     cash = models.BooleanField(default=False)
     date = models.DateField()
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)  # Set for imported rows
+    # Shared by the parts of one bank transaction split across several budget items
+    split_group = models.UUIDField(null=True, blank=True, editable=False, db_index=True)
 
     def __str__(self):
         return f'{self.date} - {self.name}'
 
+    def save(self, *args, **kwargs):
+        # The New Debt signal handlers run inside the save so both are committed together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def get_signed_value(self):
         if self.amount < 0:  # For negative expenses (refunds)
             return f'+{abs(self.amount)}'
@@ -485,6 +570,11 @@ class ExpenseTransaction(models.Model):
     def is_refund(self):
         return self.is_positive()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'import_hash'], name='unique_expense_transaction_import_hash'),
+        ]
+
 
 class ContactEntry(models.Model):
     user = models.ForeignKey('budgets.CustomUser', on_delete=models.CASCADE)
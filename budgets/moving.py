@@ -0,0 +1,83 @@
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+
+from .budget_summary import refresh_budget_period_summaries
+from .categorization import forget_categorization_index
+from .models import ExpenseTransaction, IncomeTransaction
+from .new_debt import adjust_new_debt
+from .reports import invalidate_reports
+
+
+def move_transactions(user_id, expense_transaction_ids=(), income_transaction_ids=(), expense_budget_item=None,
+                      income_budget_item=None):
+    """
+    Moves expense and income transactions to other budget items.
+
+    Each kind of transaction is moved with a single UPDATE. Credit card purchases that move to another budget period
+    take their New Debt with them, and the summaries of every budget period moved from or to are refreshed, all in
+    the same transaction as the move.
+
+    Parameters:
+        user_id (int): The owner of the transactions. Ids belonging to other users are ignored.
+        expense_transaction_ids (Iterable[int]): The expense transactions to move.
+        income_transaction_ids (Iterable[int]): The income transactions to move.
+        expense_budget_item (ExpenseBudgetItem | None): Where the expense transactions go. Required to move any.
+        income_budget_item (IncomeBudgetItem | None): Where the income transactions go. Required to move any.
+
+    Returns:
+        tuple[int, int]: The number of expense and income transactions moved.
+    """
+    affected_budget_period_ids = set()
+    new_debt_changes = defaultdict(int)
+    expenses_moved = income_moved = 0
+
+    with transaction.atomic():
+        if expense_budget_item is not None and expense_transaction_ids:
+            target_budget_period_id = expense_budget_item.expense_category.budget_period_id
+            # Lock the rows so their New Debt can't change between reading and moving them
+            expenses = list(
+                ExpenseTransaction.objects
+                .select_for_update(of=('self',))
+                .filter(user_id=user_id, id__in=expense_transaction_ids)
+                .exclude(expense_budget_item=expense_budget_item)
+                .values_list('id', 'amount', 'credit_purchase', 'expense_budget_item__expense_category__budget_period_id')
+            )
+            for transaction_id, amount, credit_purchase, budget_period_id in expenses:
+                affected_budget_period_ids.add(budget_period_id)
+                if credit_purchase and amount and budget_period_id != target_budget_period_id:
+                    new_debt_changes[budget_period_id] -= amount
+                    new_debt_changes[target_budget_period_id] += amount
+            if expenses:
+                affected_budget_period_ids.add(target_budget_period_id)
+                expenses_moved = ExpenseTransaction.objects\
+                    .filter(id__in=[expense[0] for expense in expenses])\
+                    .update(expense_budget_item=expense_budget_item)
+
+        if income_budget_item is not None and income_transaction_ids:
+            income = list(
+                IncomeTransaction.objects
+                .select_for_update(of=('self',))
+                .filter(user_id=user_id, id__in=income_transaction_ids)
+                .exclude(budget_item=income_budget_item)
+                .values_list('id', 'budget_item__budget_period_id')
+            )
+            affected_budget_period_ids.update(budget_period_id for transaction_id, budget_period_id in income)
+            if income:
+                affected_budget_period_ids.add(income_budget_item.budget_period_id)
+                income_moved = IncomeTransaction.objects\
+                    .filter(id__in=[row[0] for row in income])\
+                    .update(budget_item=income_budget_item)
+
+        for budget_period_id, amount in new_debt_changes.items():
+            if amount:
+                adjust_new_debt(user_id, budget_period_id, amount)
+
+        # update() skips the model signals, so refresh what they would have
+        if affected_budget_period_ids:
+            refresh_budget_period_summaries(list(affected_budget_period_ids))
+        if expenses_moved:
+            transaction.on_commit(partial(invalidate_reports, user_id))
+            transaction.on_commit(partial(forget_categorization_index, user_id))
+    return expenses_moved, income_moved
@@ -0,0 +1,218 @@
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from .models import Asset, AssetBalance, InstallmentDebt, InstallmentDebtBalance, RevolvingDebt, RevolvingDebtBalance
+from .models import CustomUser, NetWorthSnapshot
+
+# Each entry maps a series key to the account model, its balance model and the balance foreign key name
+BALANCE_SOURCES = (
+    ('assets', Asset, AssetBalance, 'asset'),
+    ('installment_debts', InstallmentDebt, InstallmentDebtBalance, 'debt'),
+    ('revolving_debts', RevolvingDebt, RevolvingDebtBalance, 'debt'),
+)
+
+
+def get_month_starts(year_months):
+    """
+    Converts year/month pairs into the first day of each month.
+
+    Parameters:
+        year_months (list[tuple]): Year and month pairs as ints or strings, e.g. ('2020', '3').
+
+    Returns:
+        list[date]: The first day of each month in the same order.
+    """
+    return [date(int(year), int(month), 1) for year, month in year_months]
+
+
+def get_year_months_between(first_month, last_month):
+    """
+    Gets every year/month pair from first_month through last_month.
+
+    Parameters:
+        first_month (date): Any day in the first month.
+        last_month (date): Any day in the last month.
+
+    Returns:
+        list[tuple[int, int]]: Chronological year and month pairs.
+    """
+    first_index = first_month.year * 12 + first_month.month - 1
+    last_index = last_month.year * 12 + last_month.month - 1
+    return [(index // 12, index % 12 + 1) for index in range(first_index, last_index + 1)]
+
+
+def get_account_balances_by_month(user, account_model, balance_model, account_field, month_starts):
+    """
+    Carries each account's balance forward to the end of every requested month.
+
+    An account's balance for a month is its latest balance dated on or before the last day of that month. This runs
+    two queries no matter how many accounts or months are requested.
+
+    Parameters:
+        user (CustomUser | int): The owner of the accounts.
+        account_model (type): Asset, InstallmentDebt or RevolvingDebt.
+        balance_model (type): The balance model that belongs to account_model.
+        account_field (str): The name of the foreign key from balance_model to account_model.
+        month_starts (list[date]): The first day of each month in chronological order.
+
+    Returns:
+        list[Decimal]: The total balance of all accounts at the end of each month.
+    """
+    window_start = month_starts[0]
+    cutoffs = [month_start + relativedelta(months=+1) for month_start in month_starts]
+
+    # Opening balance of every account - the latest balance before the window starts
+    opening_balance = balance_model.objects\
+        .filter(**{account_field: OuterRef('pk')}, date__lt=window_start)\
+        .order_by('-date')\
+        .values('balance')[:1]
+    current_balances = {
+        account_id: balance
+        for account_id, balance in account_model.objects
+        .filter(user=user)
+        .annotate(opening_balance=Subquery(opening_balance))
+        .values_list('id', 'opening_balance')
+        if balance is not None
+    }
+
+    # Balances entered inside the window in date order
+    window_balances = balance_model.objects\
+        .filter(**{f'{account_field}__user': user}, date__gte=window_start, date__lt=cutoffs[-1])\
+        .order_by('date')\
+        .values_list(f'{account_field}_id', 'date', 'balance')
+
+    # Sweep through the balances once, closing out each month as its cutoff is reached
+    totals = []
+    balances = iter(window_balances)
+    pending = next(balances, None)
+    for cutoff in cutoffs:
+        while pending is not None and pending[1] < cutoff:
+            current_balances[pending[0]] = pending[2]
+            pending = next(balances, None)
+        totals.append(sum(current_balances.values(), Decimal(0.00)))
+
+    return totals
+
+
+def get_net_worth_series(user, year_months):
+    """
+    Gets the month end totals for assets, installment debts and revolving debts.
+
+    Parameters:
+        user (CustomUser | int): The user the series is for.
+        year_months (list[tuple]): Chronological year and month pairs, e.g. [('2020', '3'), ('2020', '4')].
+
+    Returns:
+        dict: Contains a list of Decimal totals per month for 'assets', 'installment_debts' and 'revolving_debts'.
+    """
+    month_starts = get_month_starts(year_months)
+    return {
+        key: get_account_balances_by_month(user, account_model, balance_model, account_field, month_starts)
+        for key, account_model, balance_model, account_field in BALANCE_SOURCES
+    }
+
+
+def get_balance_date_range(user):
+    """
+    Gets the earliest and latest balance dates across all of a user's assets and debts.
+
+    Returns:
+        tuple[date | None, date | None]: The earliest and latest dates or (None, None) if there are no balances.
+    """
+    first_dates = []
+    last_dates = []
+    for key, account_model, balance_model, account_field in BALANCE_SOURCES:
+        date_range = balance_model.objects\
+            .filter(**{f'{account_field}__user': user})\
+            .aggregate(first=Min('date'), last=Max('date'))
+        if date_range['first'] is not None:
+            first_dates.append(date_range['first'])
+            last_dates.append(date_range['last'])
+    if not first_dates:
+        return None, None
+    return min(first_dates), max(last_dates)
+
+
+def refresh_net_worth_snapshots(user, from_date=None):
+    """
+    Rebuilds a user's NetWorthSnapshot rows from the month of from_date onward.
+
+    Months before from_date are left untouched. Snapshots run through the current month or the month of the latest
+    balance, whichever is later.
+
+    Parameters:
+        user (CustomUser | int): The user whose snapshots are refreshed.
+        from_date (date | None): Any day in the first month to rebuild. Rebuilds all history when None.
+    """
+    # The refresh runs on commit, by which time the user may have been deleted
+    if not CustomUser.objects.filter(pk=getattr(user, 'id', user)).exists():
+        return
+
+    first_date, last_date = get_balance_date_range(user)
+    if from_date is None:
+        from_date = first_date
+
+    with transaction.atomic():
+        if from_date is None:  # No balances at all
+            NetWorthSnapshot.objects.filter(user=user).delete()
+            return
+
+        first_month = from_date.replace(day=1)
+        last_month = max(date.today().replace(day=1), last_date or first_month)
+        NetWorthSnapshot.objects.filter(user=user, date__gte=first_month).delete()
+
+        # Nothing left to rebuild when the only balances from first_month onward were removed
+        year_months = get_year_months_between(first_month, last_month)
+        if not year_months:
+            return
+
+        series = get_net_worth_series(user, year_months)
+        NetWorthSnapshot.objects.bulk_create([
+            NetWorthSnapshot(user_id=getattr(user, 'id', user),
+                             date=month_start,
+                             asset_total=asset_total,
+                             installment_debt_total=installment_debt_total,
+                             revolving_debt_total=revolving_debt_total)
+            for month_start, asset_total, installment_debt_total, revolving_debt_total in zip(
+                get_month_starts(year_months),
+                series['assets'],
+                series['installment_debts'],
+                series['revolving_debts'],
+            )
+        ])
+
+
+def get_net_worth_snapshot_series(user, year_months):
+    """
+    Reads month end totals from a user's NetWorthSnapshot rows.
+
+    Returns the same structure as get_net_worth_series. A month without a snapshot carries the previous snapshot
+    forward, which happens when no balance has changed since the snapshots were last refreshed.
+
+    Parameters:
+        user (CustomUser | int): The user the series is for.
+        year_months (list[tuple]): Chronological year and month pairs, e.g. [('2020', '3'), ('2020', '4')].
+
+    Returns:
+        dict: Contains a list of Decimal totals per month for 'assets', 'installment_debts' and 'revolving_debts'.
+    """
+    month_starts = get_month_starts(year_months)
+    snapshots = NetWorthSnapshot.objects.filter(user=user)
+    opening = snapshots.filter(date__lt=month_starts[0]).order_by('-date').first()
+    in_window = {
+        snapshot.date: snapshot
+        for snapshot in snapshots.filter(date__gte=month_starts[0], date__lte=month_starts[-1])
+    }
+
+    series = {'assets': [], 'installment_debts': [], 'revolving_debts': []}
+    current = opening
+    for month_start in month_starts:
+        current = in_window.get(month_start, current)
+        series['assets'].append(current.asset_total if current else Decimal(0.00))
+        series['installment_debts'].append(current.installment_debt_total if current else Decimal(0.00))
+        series['revolving_debts'].append(current.revolving_debt_total if current else Decimal(0.00))
+    return series
@@ -0,0 +1,109 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import ExpenseBudgetItem, ExpenseCategory, ExpenseTransaction
+
+NEW_DEBT = 'New Debt'
+
+
+def get_new_debt_share(user_id, expense_budget_item_id, amount, credit_purchase):
+    """
+    Gets how much a credit card purchase adds to its budget period's New Debt.
+
+    Parameters:
+        user_id (int): The owner of the transaction.
+        expense_budget_item_id (int): The transaction's budget item.
+        amount (Decimal): The transaction amount.
+        credit_purchase (bool): Whether the transaction is a credit card purchase.
+
+    Returns:
+        tuple | None: (user id, budget period id, amount) or None when the transaction adds no new debt.
+    """
+    if not credit_purchase or not amount:
+        return None
+    budget_period_id = ExpenseBudgetItem.objects\
+        .filter(pk=expense_budget_item_id)\
+        .values_list('expense_category__budget_period_id', flat=True)\
+        .first()
+    if budget_period_id is None:
+        return None
+    return user_id, budget_period_id, amount
+
+
+def get_stored_new_debt_share(pk):
+    """ Gets the New Debt share of a saved expense transaction as it is currently stored """
+    stored = ExpenseTransaction.objects\
+        .filter(pk=pk)\
+        .values_list('user_id', 'amount', 'credit_purchase', 'expense_budget_item__expense_category__budget_period_id')\
+        .first()
+    if stored is None:
+        return None
+    user_id, amount, credit_purchase, budget_period_id = stored
+    if not credit_purchase or not amount:
+        return None
+    return user_id, budget_period_id, amount
+
+
+def adjust_new_debt(user_id, budget_period_id, amount):
+    """
+    Adds an amount to the planned amount of a budget period's New Debt budget item.
+
+    The New Debt category and budget item are created the first time new debt is added. The planned amount is changed
+    with an F() expression so concurrent purchases can't overwrite each other. Once the planned amount is back to
+    zero the category is removed, unless debt payments have already been recorded against it.
+
+    Parameters:
+        user_id (int): The owner of the budget period.
+        budget_period_id (int): The budget period to adjust.
+        amount (Decimal): The amount to add. Negative to remove debt.
+    """
+    with transaction.atomic():
+        new_debt_items = ExpenseBudgetItem.objects.filter(
+            expense_category__budget_period_id=budget_period_id,
+            expense_category__name=NEW_DEBT,
+            name=NEW_DEBT,
+        )
+        if not new_debt_items.update(planned_amount=F('planned_amount') + amount):
+            category, created = ExpenseCategory.objects.get_or_create(
+                user_id=user_id,
+                budget_period_id=budget_period_id,
+                name=NEW_DEBT,
+            )
+            item, created = ExpenseBudgetItem.objects.get_or_create(
+                user_id=user_id,
+                expense_category=category,
+                name=NEW_DEBT,
+                defaults={'planned_amount': amount},
+            )
+            if not created:
+                new_debt_items.update(planned_amount=F('planned_amount') + amount)
+
+        ExpenseCategory.objects.filter(
+            pk__in=new_debt_items
+            .filter(planned_amount=0, expense_transactions__isnull=True)
+            .values('expense_category_id'),
+        ).delete()
+
+
+def sync_new_debt(bp):
+    """
+    Sets a budget period's New Debt to the total of its credit card purchases.
+
+    Used to repair New Debt after data has been changed without going through the model signals.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period to sync.
+    """
+    with transaction.atomic():
+        total = ExpenseTransaction.objects\
+            .filter(expense_budget_item__expense_category__budget_period=bp, credit_purchase=True)\
+            .aggregate(total=Sum('amount'))['total'] or Decimal(0.00)
+        current = ExpenseBudgetItem.objects\
+            .select_for_update()\
+            .filter(expense_category__budget_period=bp, expense_category__name=NEW_DEBT, name=NEW_DEBT)\
+            .values_list('planned_amount', flat=True)\
+            .first() or Decimal(0.00)
+        if total != current:
+            adjust_new_debt(bp.user_id, bp.id, total - current)
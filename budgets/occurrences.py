@@ -0,0 +1,137 @@
+import calendar
+from datetime import date, timedelta
+
+# Distance between due dates for each schedule item frequency - (days, months)
+FREQUENCY_STEPS = {
+    'Weekly': (7, 0),
+    'Every two weeks': (14, 0),
+    'Monthly': (0, 1),
+    'Every two months': (0, 2),
+    'Quarterly': (0, 4),
+    'Every six months': (0, 6),
+    'Yearly': (0, 12),
+}
+
+# Number of due dates in a year for each schedule item frequency
+DUE_DATES_PER_YEAR = {
+    'Weekly': 52,
+    'Every two weeks': 26,
+    'Monthly': 12,
+    'Every two months': 6,
+    'Quarterly': 4,
+    'Every six months': 2,
+    'Yearly': 1,
+    'One time only': 1,
+}
+
+
+def get_month_index(d):
+    """ Returns the number of months between year 0 and the month of a date """
+    return d.year * 12 + d.month - 1
+
+
+def get_clamped_day(first_due_date, months_per_step, step):
+    """
+    Returns the day of the month of a month based due date.
+
+    Adding a month to the 31st lands on the last day of a shorter month and every later due date keeps that earlier
+    day, so the day is the smallest month length seen on the way. Every month the schedule visits, including a
+    February in a non-leap year, is reached within four years, so at most 48 months are checked.
+
+    Parameters:
+        first_due_date (date): The first due date.
+        months_per_step (int): Number of months between due dates.
+        step (int): Which due date to return the day for. The first due date is step 0.
+
+    Returns:
+        int: The day of the month.
+    """
+    day = first_due_date.day
+    if day <= 28:
+        return day
+
+    first_month_index = get_month_index(first_due_date)
+    for i in range(1, min(step, 48 // months_per_step) + 1):
+        year, month = divmod(first_month_index + i * months_per_step, 12)
+        day = min(day, calendar.monthrange(year, month + 1)[1])
+    return day
+
+
+def get_due_date(first_due_date, frequency, step):
+    """
+    Returns a due date without stepping through the due dates before it.
+
+    Parameters:
+        first_due_date (date): The first due date.
+        frequency (str): A schedule item frequency other than 'One time only'.
+        step (int): Which due date to return. The first due date is step 0.
+
+    Returns:
+        date: The due date.
+    """
+    days, months = FREQUENCY_STEPS[frequency]
+    if days:
+        return first_due_date + timedelta(days=days * step)
+
+    year, month = divmod(get_month_index(first_due_date) + months * step, 12)
+    return date(year, month + 1, get_clamped_day(first_due_date, months, step))
+
+
+def get_next_due_date(first_due_date, frequency, current_date):
+    """
+    Returns the first due date on or after current_date.
+
+    Parameters:
+        first_due_date (date): The first due date.
+        frequency (str): The schedule item frequency.
+        current_date (date): The date to search from.
+
+    Returns:
+        date | None: The next due date or None if a one time only item has already passed.
+    """
+    if first_due_date >= current_date:
+        return first_due_date
+    if frequency == 'One time only':
+        return None
+
+    days, months = FREQUENCY_STEPS[frequency]
+    if days:
+        step = -(-(current_date - first_due_date).days // days)
+        return get_due_date(first_due_date, frequency, step)
+
+    # The first due date in the current month, which may still be earlier than current_date
+    step = -(-(get_month_index(current_date) - get_month_index(first_due_date)) // months)
+    due_date = get_due_date(first_due_date, frequency, step)
+    if due_date < current_date:
+        due_date = get_due_date(first_due_date, frequency, step + 1)
+    return due_date
+
+
+def count_due_dates_in_month(first_due_date, frequency, year, month):
+    """
+    Returns how many times an item is due in a year/month pair.
+
+    Parameters:
+        first_due_date (date): The first due date.
+        frequency (str): The schedule item frequency.
+        year (int): The year to count in.
+        month (int): The month to count in. Jan is 1 and Dec is 12.
+
+    Returns:
+        int: The number of due dates in that month.
+    """
+    if frequency == 'One time only':
+        return int(first_due_date.year == year and first_due_date.month == month)
+
+    days, months = FREQUENCY_STEPS[frequency]
+    if days:
+        month_start = date(year, month, 1)
+        next_month_start = date(year + month // 12, month % 12 + 1, 1)
+        # Due dates fall on first_due_date + days * step, so count the steps that land inside the month
+        first_step = max(0, -(-(month_start - first_due_date).days // days))
+        end_step = max(0, -(-(next_month_start - first_due_date).days // days))
+        return max(0, end_step - first_step)
+
+    # Month based due dates land in every months-th month starting with the first due date's month
+    months_after_first = year * 12 + month - 1 - get_month_index(first_due_date)
+    return int(months_after_first >= 0 and months_after_first % months == 0)
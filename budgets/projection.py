@@ -0,0 +1,90 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from .occurrences import FREQUENCY_STEPS
+
+# amounts is an items x months array of integer cents and totals holds the per month column totals in cents
+ScheduleProjection = namedtuple('ScheduleProjection', ['items', 'year_months', 'amounts', 'totals'])
+
+
+def cents_to_decimal(cents):
+    """ Converts an integer number of cents into a Decimal dollar amount """
+    return Decimal(int(cents)) / 100
+
+
+def get_due_date_counts(items, year_months):
+    """
+    Counts the due dates of every schedule item in every month in one batched calculation.
+
+    Uses the same rules as budgets.occurrences.count_due_dates_in_month.
+
+    Parameters:
+        items (list[ScheduleItem]): The schedule items to count.
+        year_months (list[tuple]): Chronological year and month pairs as ints or strings.
+
+    Returns:
+        numpy.ndarray: An items x months array of due date counts.
+    """
+    # Month columns - month index, first day and first day of the following month as day numbers
+    month_indexes = np.array([int(year) * 12 + int(month) - 1 for year, month in year_months], dtype=np.int64)
+    month_starts = np.array(
+        [date(index // 12, index % 12 + 1, 1) for index in month_indexes], dtype='datetime64[D]'
+    ).astype(np.int64)
+    next_month_starts = np.array(
+        [date((index + 1) // 12, (index + 1) % 12 + 1, 1) for index in month_indexes], dtype='datetime64[D]'
+    ).astype(np.int64)
+
+    # Item rows - first due date, its month index and the distance between due dates
+    first_due_dates = np.array([item.first_due_date for item in items], dtype='datetime64[D]').astype(np.int64)
+    first_month_indexes = np.array(
+        [item.first_due_date.year * 12 + item.first_due_date.month - 1 for item in items], dtype=np.int64
+    )
+    step_days = np.array([FREQUENCY_STEPS.get(item.frequency, (0, 0))[0] for item in items], dtype=np.int64)
+    step_months = np.array([FREQUENCY_STEPS.get(item.frequency, (0, 0))[1] for item in items], dtype=np.int64)
+    one_time = np.array([item.frequency == 'One time only' for item in items], dtype=bool)
+
+    first_due_dates = first_due_dates.reshape(-1, 1)
+    first_month_indexes = first_month_indexes.reshape(-1, 1)
+    step_days = step_days.reshape(-1, 1)
+    step_months = step_months.reshape(-1, 1)
+    one_time = one_time.reshape(-1, 1)
+
+    # Day based items - count the steps that land inside each month
+    day_divisor = np.maximum(step_days, 1)
+    first_step = np.maximum(0, -((first_due_dates - month_starts) // day_divisor))
+    end_step = np.maximum(0, -((first_due_dates - next_month_starts) // day_divisor))
+    day_counts = np.maximum(0, end_step - first_step)
+
+    # Month based items - every step_months-th month starting with the first due date's month
+    months_after_first = month_indexes - first_month_indexes
+    month_counts = (months_after_first >= 0) & (months_after_first % np.maximum(step_months, 1) == 0)
+
+    return np.select(
+        [one_time, step_days > 0, step_months > 0],
+        [months_after_first == 0, day_counts, month_counts],
+        default=0,
+    ).astype(np.int64)
+
+
+def project_schedule(items, year_months):
+    """
+    Projects the amount due for each schedule item in each month.
+
+    Parameters:
+        items (Iterable[ScheduleItem]): The schedule items to project.
+        year_months (list[tuple]): Chronological year and month pairs as ints or strings.
+
+    Returns:
+        ScheduleProjection: The items, the months, an items x months array of cents and the per month totals.
+    """
+    items = list(items)
+    if not items:
+        amounts = np.zeros((0, len(year_months)), dtype=np.int64)
+        return ScheduleProjection(items, year_months, amounts, amounts.sum(axis=0))
+
+    cents = np.array([int(item.amount * 100) for item in items], dtype=np.int64).reshape(-1, 1)
+    amounts = get_due_date_counts(items, year_months) * cents
+    return ScheduleProjection(items, year_months, amounts, amounts.sum(axis=0))
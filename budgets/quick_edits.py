@@ -0,0 +1,214 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from .budget_summary import STORED_SUMMARY_FIELDS, get_derived_summary_delta, get_stored_summary_totals
+from .budget_summary import refresh_budget_period_summary
+from .forms import QuickExpenseBudgetItemForm, QuickExpenseTransactionForm, QuickIncomeBudgetItemForm
+from .forms import QuickIncomeTransactionForm
+from .models import BudgetPeriodSummary, ExpenseBudgetItem, ExpenseTransaction, IncomeBudgetItem, IncomeTransaction
+from .new_debt import NEW_DEBT
+
+# Each entry is (model, form, path to its budget period, fields returned for each row)
+QUICK_EDIT_KINDS = {
+    'income-budget-items': (IncomeBudgetItem, QuickIncomeBudgetItemForm, 'budget_period',
+                            ('name', 'planned_amount', 'type')),
+    'expense-budget-items': (ExpenseBudgetItem, QuickExpenseBudgetItemForm, 'expense_category__budget_period',
+                             ('name', 'expense_category_id', 'planned_amount', 'type')),
+    'income-transactions': (IncomeTransaction, QuickIncomeTransactionForm, 'budget_item__budget_period',
+                            ('name', 'budget_item_id', 'amount', 'cash', 'date')),
+    'expense-transactions': (ExpenseTransaction, QuickExpenseTransactionForm,
+                             'expense_budget_item__expense_category__budget_period',
+                             ('name', 'expense_budget_item_id', 'amount', 'credit_purchase', 'credit_payoff', 'cash',
+                              'date')),
+}
+
+# Changes to these kinds can move credit card purchases in or out of New Debt
+NEW_DEBT_KINDS = ('expense-transactions', 'expense-budget-items')
+
+
+def get_quick_edit_queryset(kind, bp):
+    """ Gets the rows of a kind that belong to a budget period, so ids from other periods or users aren't found """
+    model, form_class, period_lookup, fields = QUICK_EDIT_KINDS[kind]
+    return model.objects.filter(user_id=bp.user_id, **{period_lookup: bp})
+
+
+def get_quick_edit_form(kind, bp, data=None, instance=None):
+    """ Builds the form that validates a quick edit, with its choices limited to the budget period """
+    model, form_class, period_lookup, fields = QUICK_EDIT_KINDS[kind]
+    return form_class(data, instance=instance, budget_period=bp)
+
+
+def serialize_row(kind, obj):
+    """ Turns a quick edit row into a dict for a JSON response """
+    model, form_class, period_lookup, fields = QUICK_EDIT_KINDS[kind]
+    row = {'kind': kind, 'id': obj.pk}
+    row.update((field, getattr(obj, field)) for field in fields)
+    if hasattr(obj, 'transaction_count'):
+        row['total'] = getattr(obj, 'received_total' if model is IncomeBudgetItem else 'spent_total') or Decimal(0.00)
+        row['transaction_count'] = obj.transaction_count
+    return row
+
+
+def get_item_rows(income_item_ids=(), expense_item_ids=()):
+    """ Gets budget items as rows with the totals of their transactions """
+    rows = []
+    if income_item_ids:
+        items = IncomeBudgetItem.objects.with_totals().filter(id__in=set(income_item_ids)).order_by('id')
+        rows += [serialize_row('income-budget-items', item) for item in items]
+    if expense_item_ids:
+        items = ExpenseBudgetItem.objects.with_totals().filter(id__in=set(expense_item_ids)).order_by('id')
+        rows += [serialize_row('expense-budget-items', item) for item in items]
+    return rows
+
+
+def read_stored_summary(bp):
+    """ Reads and locks a budget period's stored totals, summarizing the period first if it has none yet """
+    summary = BudgetPeriodSummary.objects.select_for_update().filter(budget_period=bp).first()
+    if summary is None:
+        refresh_budget_period_summary(bp.id)
+        summary = BudgetPeriodSummary.objects.select_for_update().get(budget_period=bp)
+    return summary
+
+
+def get_quick_edit_summary(bp, before, after):
+    """
+    Describes how a quick edit changed a budget period's totals.
+
+    Parameters:
+        bp (BudgetPeriod): The budget period edited.
+        before (BudgetPeriodSummary): The stored totals read before the edit.
+        after (BudgetPeriodSummary): The stored totals read after the edit.
+
+    Returns:
+        tuple[dict, dict]: The changes to the stored and derived totals, and the totals after the edit.
+    """
+    delta = {field: getattr(after, field) - getattr(before, field) for field in STORED_SUMMARY_FIELDS}
+    delta.update(get_derived_summary_delta(delta))
+    totals = get_stored_summary_totals(bp, after)
+    return delta, totals
+
+
+def get_related_item_ids(kind, obj):
+    """ Gets the budget items whose totals change along with a row, as (income item ids, expense item ids) """
+    if kind == 'income-transactions':
+        return [obj.budget_item_id], []
+    if kind == 'expense-transactions':
+        return [], [obj.expense_budget_item_id]
+    if kind == 'income-budget-items':
+        return [obj.pk], []
+    return [], [obj.pk]
+
+
+def get_new_debt_item_ids(bp):
+    """ Gets the id of a budget period's New Debt budget item, which changes with its credit card purchases """
+    return list(ExpenseBudgetItem.objects
+                .filter(expense_category__budget_period=bp, expense_category__name=NEW_DEBT, name=NEW_DEBT)
+                .values_list('id', flat=True))
+
+
+def run_quick_edit(kind, bp, change, income_item_ids, expense_item_ids, deleted):
+    """
+    Runs a change to a budget period and reports what it changed.
+
+    The budget period's totals are kept up to date by the model signals one row at a time, so the changes are found
+    by reading its stored summary before and after the change rather than summarizing the period again.
+
+    Parameters:
+        kind (str): One of QUICK_EDIT_KINDS.
+        bp (BudgetPeriod): The budget period being edited.
+        change (Callable): Makes the change and returns the saved row, or None when it deletes it.
+        income_item_ids (list[int]): Income budget items whose totals change, other than the row's own.
+        expense_item_ids (list[int]): Expense budget items whose totals change, other than the row's own.
+        deleted (list[dict]): The rows the change deletes, as {'kind': kind, 'id': id}.
+
+    Returns:
+        dict: The changed and deleted rows, the changes to the budget period's totals and the totals after the
+            change.
+    """
+    with transaction.atomic():
+        before = read_stored_summary(bp)
+        new_debt_item_ids = get_new_debt_item_ids(bp) if kind in NEW_DEBT_KINDS else []
+        obj = change()
+        after = read_stored_summary(bp)
+
+    rows = []
+    if obj is not None:
+        income_ids, expense_ids = get_related_item_ids(kind, obj)
+        income_item_ids = income_item_ids + income_ids
+        expense_item_ids = expense_item_ids + expense_ids
+        if kind.endswith('-transactions'):
+            rows.append(serialize_row(kind, obj))
+    if kind in NEW_DEBT_KINDS:
+        # Credit card purchases can create, change or remove New Debt
+        current_new_debt_item_ids = get_new_debt_item_ids(bp)
+        expense_item_ids = expense_item_ids + current_new_debt_item_ids
+        deleted = deleted + [{'kind': 'expense-budget-items', 'id': pk}
+                             for pk in new_debt_item_ids
+                             if pk not in current_new_debt_item_ids
+                             and {'kind': 'expense-budget-items', 'id': pk} not in deleted]
+    rows += get_item_rows(income_item_ids, expense_item_ids)
+    delta, totals = get_quick_edit_summary(bp, before, after)
+    return {'changed': rows, 'deleted': deleted, 'summary_delta': delta, 'summary': totals}
+
+
+def save_quick_edit(kind, bp, form):
+    """
+    Saves a valid quick edit form and reports what changed.
+
+    Parameters:
+        kind (str): One of QUICK_EDIT_KINDS.
+        bp (BudgetPeriod): The budget period being edited.
+        form (ModelForm): A valid form from get_quick_edit_form.
+
+    Returns:
+        dict: See run_quick_edit.
+
+    Raises:
+        IntegrityError: If the row clashes with an existing one, e.g. a budget item with the same name.
+    """
+    income_item_ids, expense_item_ids = [], []
+    if form.instance.pk and kind.endswith('-transactions'):
+        # The form has already put the new values on the instance, so read where the row was from the database
+        previous = type(form.instance).objects.get(pk=form.instance.pk)
+        income_item_ids, expense_item_ids = get_related_item_ids(kind, previous)
+
+    def change():
+        form.instance.user_id = bp.user_id
+        if kind == 'income-budget-items':
+            form.instance.budget_period = bp
+        return form.save()
+
+    return run_quick_edit(kind, bp, change, income_item_ids, expense_item_ids, [])
+
+
+def delete_quick_edit(kind, bp, obj):
+    """
+    Deletes a row found with get_quick_edit_queryset and reports what changed.
+
+    Deleting a budget item deletes its transactions too, and they are listed with it.
+
+    Parameters:
+        kind (str): One of QUICK_EDIT_KINDS.
+        bp (BudgetPeriod): The budget period being edited.
+        obj (Model): The row to delete.
+
+    Returns:
+        dict: See run_quick_edit.
+    """
+    deleted = [{'kind': kind, 'id': obj.pk}]
+    if kind == 'income-budget-items':
+        deleted += [{'kind': 'income-transactions', 'id': pk}
+                    for pk in obj.income_transactions.values_list('id', flat=True)]
+    elif kind == 'expense-budget-items':
+        deleted += [{'kind': 'expense-transactions', 'id': pk}
+                    for pk in obj.expense_transactions.values_list('id', flat=True)]
+
+    income_item_ids, expense_item_ids = [], []
+    if kind.endswith('-transactions'):
+        income_item_ids, expense_item_ids = get_related_item_ids(kind, obj)
+
+    def change():
+        obj.delete()
+
+    return run_quick_edit(kind, bp, change, income_item_ids, expense_item_ids, deleted)
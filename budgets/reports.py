@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .cache_versions import bump_cache_version, get_cache_version
+from .models import ExpenseTransaction
+from .net_worth import get_month_starts, get_year_months_between
+
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_report_cache_version(user_id):
+    """ Returns the current cache version of a user's reports, which changes whenever their reports go stale """
+    return get_cache_version(f'reports-version:{user_id}')
+
+
+def invalidate_reports(user_id):
+    """ Moves a user's reports to a new cache version so the next request recalculates them """
+    bump_cache_version(f'reports-version:{user_id}')
+
+
+def get_category_spending(user_id, first_month, last_month):
+    """
+    Gets the amount spent in each expense category in each month of a date range.
+
+    Spending is totalled by transaction date in a single grouped query. Credit card payments are left out since the
+    purchases they pay for are already counted. Results are cached per user until one of their expenses changes.
+
+    Parameters:
+        user_id (int): The user the report is for.
+        first_month (date): Any day in the first month of the report.
+        last_month (date): Any day in the last month of the report.
+
+    Returns:
+        tuple: The year/month pairs of the report and a list of (category name, list of Decimal monthly totals)
+            ordered from the largest total to the smallest.
+    """
+    year_months = get_year_months_between(first_month, last_month)
+    if not year_months:
+        return year_months, []
+
+    (first_year, first_month_number), (last_year, last_month_number) = year_months[0], year_months[-1]
+    cache_key = f'category-spending:{user_id}:{first_year}-{first_month_number}:{last_year}-{last_month_number}'
+    version = get_report_cache_version(user_id)
+    spending = cache.get(cache_key, version=version)
+    if spending is None:
+        spending = calculate_category_spending(user_id, year_months)
+        cache.set(cache_key, spending, REPORT_CACHE_TIMEOUT, version=version)
+    return year_months, spending
+
+
+def calculate_category_spending(user_id, year_months):
+    """ Does the work for get_category_spending without the cache """
+    month_starts = get_month_starts(year_months)
+    month_indexes = {month_start: idx for idx, month_start in enumerate(month_starts)}
+    end = month_starts[-1] + relativedelta(months=+1)
+
+    rows = ExpenseTransaction.objects\
+        .filter(user_id=user_id, date__gte=month_starts[0], date__lt=end, credit_payoff=False)\
+        .annotate(month=TruncMonth('date'))\
+        .values_list('expense_budget_item__expense_category__name', 'month')\
+        .annotate(total=Sum('amount'))\
+        .order_by()
+
+    spending = {}
+    for category, month, total in rows:
+        totals = spending.setdefault(category, [Decimal(0.00)] * len(month_starts))
+        totals[month_indexes[month]] += total
+    return sorted(spending.items(), key=lambda category_totals: sum(category_totals[1]), reverse=True)
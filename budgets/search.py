@@ -0,0 +1,216 @@
+import heapq
+from collections import namedtuple
+from datetime import date
+from itertools import islice
+
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+
+from .exports import get_budget_period_range_filter
+from .models import ExpenseBudgetItem, ExpenseTransaction, IncomeBudgetItem, IncomeTransaction, ScheduleItem
+
+SEARCH_PAGE_SIZE = 25
+
+# Each entry is (kind, label, model, date field, budget period lookup, amount field). Budget items have no date of
+# their own so they are dated by their budget period's month.
+SEARCH_SOURCES = (
+    ('income', 'Income', IncomeTransaction, 'date', 'budget_item__budget_period', 'amount'),
+    ('expense', 'Expense', ExpenseTransaction, 'date', 'expense_budget_item__expense_category__budget_period',
+     'amount'),
+    ('income_item', 'Income Budget Item', IncomeBudgetItem, None, 'budget_period', 'planned_amount'),
+    ('expense_item', 'Expense Budget Item', ExpenseBudgetItem, None, 'expense_category__budget_period',
+     'planned_amount'),
+    ('schedule', 'Schedule Item', ScheduleItem, 'first_due_date', None, 'amount'),
+)
+SEARCH_KINDS = [(kind, label) for kind, label, model, date_field, period_lookup, amount_field in SEARCH_SOURCES]
+SEARCH_TABLES = [
+    model._meta.db_table for kind, label, model, date_field, period_lookup, amount_field in SEARCH_SOURCES
+]
+
+# SQLite's trigram tokenizer can only match terms of at least this many characters
+SQLITE_TRIGRAM_LENGTH = 3
+
+# obj is the matching model instance and rank is higher for better matches
+SearchResult = namedtuple('SearchResult', ['kind', 'label', 'obj', 'rank', 'date', 'amount', 'budget_period'])
+SearchPage = namedtuple('SearchPage', ['results', 'has_next'])
+
+
+def has_sqlite_search_index(db_connection):
+    """ Returns whether the database is SQLite with FTS5 trigram support, added in SQLite 3.34 """
+    return db_connection.vendor == 'sqlite' and db_connection.Database.sqlite_version_info >= (3, 34, 0)
+
+
+def get_search_index_sql(db_connection):
+    """
+    Gets the statements that create and drop the name indexes searched by search_names.
+
+    On PostgreSQL each name column gets a pg_trgm GIN index, which serves both substring and misspelled searches. On
+    SQLite each table gets an FTS5 trigram table kept in sync by triggers. Other databases get nothing and are
+    searched with plain LIKE queries.
+
+    Returns:
+        tuple[list[str], list[str]]: The create statements and the drop statements.
+    """
+    create = []
+    drop = []
+    if db_connection.vendor == 'postgresql':
+        create.append('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in SEARCH_TABLES:
+            create.append(f'CREATE INDEX IF NOT EXISTS {table}_name_trgm ON {table} USING gin (name gin_trgm_ops)')
+            drop.append(f'DROP INDEX IF EXISTS {table}_name_trgm')
+    elif has_sqlite_search_index(db_connection):
+        for table in SEARCH_TABLES:
+            search_table = f'{table}_search'
+            create += [
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} "
+                f"USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+                f"CREATE TRIGGER IF NOT EXISTS {search_table}_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {search_table}(rowid, name) VALUES (new.id, new.name); END",
+                f"CREATE TRIGGER IF NOT EXISTS {search_table}_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {search_table}({search_table}, rowid, name) VALUES ('delete', old.id, old.name); END",
+                f"CREATE TRIGGER IF NOT EXISTS {search_table}_update AFTER UPDATE OF name ON {table} BEGIN "
+                f"INSERT INTO {search_table}({search_table}, rowid, name) VALUES ('delete', old.id, old.name); "
+                f"INSERT INTO {search_table}(rowid, name) VALUES (new.id, new.name); END",
+                f"INSERT INTO {search_table}({search_table}) VALUES ('rebuild')",
+            ]
+            drop += [
+                f'DROP TRIGGER IF EXISTS {search_table}_insert',
+                f'DROP TRIGGER IF EXISTS {search_table}_delete',
+                f'DROP TRIGGER IF EXISTS {search_table}_update',
+                f'DROP TABLE IF EXISTS {search_table}',
+            ]
+    return create, drop
+
+
+def create_search_indexes(db_connection=connection):
+    """
+    Creates the search indexes, or repairs them on SQLite after a migration has rebuilt one of the tables.
+
+    SQLite drops a table's triggers when a migration remakes the table, e.g. for AlterField or RemoveField. Any later
+    migration that does that to one of SEARCH_TABLES has to call this from a RunPython after the change.
+    """
+    create, drop = get_search_index_sql(db_connection)
+    with db_connection.cursor() as cursor:
+        for statement in create:
+            cursor.execute(statement)
+
+
+def drop_search_indexes(db_connection=connection):
+    """ Removes the search indexes """
+    create, drop = get_search_index_sql(db_connection)
+    with db_connection.cursor() as cursor:
+        for statement in drop:
+            cursor.execute(statement)
+
+
+def search_names(queryset, query):
+    """
+    Filters a queryset to rows whose name matches a search and annotates each row with a search_rank.
+
+    Parameters:
+        queryset (QuerySet): A queryset of one of the models in SEARCH_SOURCES.
+        query (str): The words to search for.
+
+    Returns:
+        QuerySet: The matching rows with a search_rank where higher is a better match.
+    """
+    terms = query.split()
+    if connection.vendor == 'postgresql':
+        # Imported here since psycopg2 is only needed on PostgreSQL
+        from django.contrib.postgres.lookups import TrigramWordSimilar
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # Uses the trigram index and also finds misspellings, e.g. 'amazn' finds 'AMAZON MKTPLACE'
+        return queryset\
+            .filter(TrigramWordSimilar(F('name'), query))\
+            .annotate(search_rank=TrigramWordSimilarity(query, 'name'))
+
+    if has_sqlite_search_index(connection):
+        table = queryset.model._meta.db_table
+        indexed_terms = [term for term in terms if len(term) >= SQLITE_TRIGRAM_LENGTH]
+        terms = [term for term in terms if len(term) < SQLITE_TRIGRAM_LENGTH]
+        if indexed_terms:
+            match = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in indexed_terms)
+            queryset = queryset\
+                .filter(id__in=RawSQL(f'SELECT rowid FROM {table}_search WHERE {table}_search MATCH %s', [match]))
+    for term in terms:
+        queryset = queryset.filter(name__icontains=term)
+
+    # Every term is in the name, so rank by how much of the name the terms cover like trigram similarity does. bm25
+    # isn't used since reading it for each row repeats the whole match.
+    matched_length = sum(len(term) for term in query.split())
+    return queryset.annotate(search_rank=ExpressionWrapper(Value(float(matched_length)) / Length('name'),
+                                                           output_field=FloatField()))
+
+
+def get_search_stream(kind, label, queryset, date_field, period_lookup, amount_field):
+    """ Lazily yields (sort key, SearchResult) for search matches that are already in ranked order """
+    for obj in queryset:
+        budget_period = None
+        if period_lookup:
+            budget_period = obj
+            for part in period_lookup.split('__'):
+                budget_period = getattr(budget_period, part)
+        result_date = getattr(obj, date_field) if date_field else date(budget_period.year, budget_period.month, 1)
+        result = SearchResult(kind, label, obj, obj.search_rank, result_date, getattr(obj, amount_field),
+                              budget_period)
+        yield (-result.rank, -result_date.toordinal()), result
+
+
+def search(user_id, query, kinds=None, first_date=None, last_date=None, min_amount=None, max_amount=None, page=1,
+           page_size=SEARCH_PAGE_SIZE):
+    """
+    Searches the names of a user's transactions, budget items and schedule items across all budget periods.
+
+    Each kind of object is searched through its name index, best matches first, and the results are merged. Budget
+    items are matched to the date range by their budget period's month.
+
+    Parameters:
+        user_id (int): The user whose data is searched.
+        query (str): The words to search for.
+        kinds (list[str] | None): Only search these SEARCH_KINDS, or all of them when None.
+        first_date (date | None): Leave out anything dated before this.
+        last_date (date | None): Leave out anything dated after this.
+        min_amount (Decimal | None): Leave out anything with a smaller amount.
+        max_amount (Decimal | None): Leave out anything with a larger amount.
+        page (int): The page to return, starting at 1.
+        page_size (int): The number of results per page.
+
+    Returns:
+        SearchPage: The results on the page, best match first, and whether there is a next page.
+    """
+    if not query.strip():
+        return SearchPage([], False)
+
+    offset = (page - 1) * page_size
+    streams = []
+    for kind, label, model, date_field, period_lookup, amount_field in SEARCH_SOURCES:
+        if kinds and kind not in kinds:
+            continue
+
+        queryset = model.objects.filter(user_id=user_id)
+        if date_field:
+            if first_date:
+                queryset = queryset.filter(**{f'{date_field}__gte': first_date})
+            if last_date:
+                queryset = queryset.filter(**{f'{date_field}__lte': last_date})
+            ordering = [f'-{date_field}']
+        else:
+            queryset = queryset.filter(get_budget_period_range_filter(period_lookup, first_date, last_date))
+            ordering = [f'-{period_lookup}__year', f'-{period_lookup}__month']
+        if min_amount is not None:
+            queryset = queryset.filter(**{f'{amount_field}__gte': min_amount})
+        if max_amount is not None:
+            queryset = queryset.filter(**{f'{amount_field}__lte': max_amount})
+        if period_lookup:
+            queryset = queryset.select_related(period_lookup)
+
+        queryset = search_names(queryset, query).order_by('-search_rank', *ordering, '-id')
+        # Read one extra row to know whether there is a next page
+        streams.append(get_search_stream(kind, label, queryset[:offset + page_size + 1], date_field, period_lookup,
+                                         amount_field))
+
+    merged = list(islice(heapq.merge(*streams, key=lambda entry: entry[0]), offset, offset + page_size + 1))
+    return SearchPage([result for key, result in merged[:page_size]], len(merged) > page_size)
@@ -0,0 +1,205 @@
+import threading
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .amortization import invalidate_amortization_schedule
+from .budget_summary import SUMMARY_SOURCES, apply_summary_delta, get_summary_delta, get_summary_share
+from .categorization import add_to_categorization_index, forget_categorization_index
+from .models import BudgetPeriod, CustomUser, ExpenseBudgetItem, ExpenseCategory, ExpenseTransaction, InstallmentDebt
+from .models import InstallmentDebtBalance
+from .net_worth import BALANCE_SOURCES, refresh_net_worth_snapshots
+from .new_debt import adjust_new_debt, get_new_debt_share, get_stored_new_debt_share
+from .reports import invalidate_reports
+
+# Refreshes waiting for the current transaction to commit, keyed by refresh function and then by key
+_pending = threading.local()
+
+
+def refresh_on_commit(refresh, key, from_value=None):
+    """
+    Schedules refresh(key, from_value) to run once the current transaction commits, or refresh(key) when from_value
+    is None.
+
+    Several changes to the same key inside one transaction (e.g. cascading deletes) are merged into a single refresh
+    that starts from the smallest from_value. None counts as smaller than any value.
+    """
+    pending = _get_pending(refresh)
+    if key in pending and pending[key] is not None and from_value is not None:
+        from_value = min(pending[key], from_value)
+    elif key in pending:
+        from_value = None
+    pending[key] = from_value
+    transaction.on_commit(partial(_run_pending_refresh, refresh, key))
+
+
+def _get_pending(refresh):
+    if not hasattr(_pending, 'refreshes'):
+        _pending.refreshes = {}
+    return _pending.refreshes.setdefault(refresh, {})
+
+
+def _run_pending_refresh(refresh, key):
+    pending = _get_pending(refresh)
+    if key in pending:  # Already handled by an earlier callback in the same commit
+        from_value = pending.pop(key)
+        if from_value is None:
+            refresh(key)
+        else:
+            refresh(key, from_value)
+
+
+# Balance Signals
+def remember_previous_balance_date(sender, instance, **kwargs):
+    """ Keeps the stored date of a balance that is being updated so the month it moved from is refreshed too """
+    instance._previous_date = None
+    if instance.pk:
+        instance._previous_date = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+def is_account_deletion(origin, account_model):
+    """ Returns whether a delete started from an account or user, which takes the account's balances with it """
+    return getattr(origin, 'model', type(origin)) in (account_model, CustomUser)
+
+
+def balance_changed(sender, instance, origin=None, **kwargs):
+    """ Refreshes the account's latest balance and the net worth snapshots from the earliest month touched """
+    # The user's snapshots are deleted along with the user
+    if getattr(origin, 'model', type(origin)) is CustomUser:
+        return
+
+    for key, account_model, balance_model, account_field in BALANCE_SOURCES:
+        if balance_model is sender and not is_account_deletion(origin, account_model):
+            account_model(pk=getattr(instance, f'{account_field}_id')).refresh_latest_balance()
+
+    changed_dates = [d for d in (instance.date, getattr(instance, '_previous_date', None)) if d is not None]
+    if changed_dates:
+        refresh_on_commit(refresh_net_worth_snapshots, instance.user_id, min(changed_dates))
+
+
+for key, account_model, balance_model, account_field in BALANCE_SOURCES:
+    pre_save.connect(remember_previous_balance_date, sender=balance_model)
+    post_save.connect(balance_changed, sender=balance_model)
+    post_delete.connect(balance_changed, sender=balance_model)
+
+
+# Amortization Signals
+def installment_debt_changed(sender, instance, **kwargs):
+    """ Clears a debt's cached amortization schedule once the change to it or one of its balances is committed """
+    debt_id = instance.pk if sender is InstallmentDebt else instance.debt_id
+    refresh_on_commit(invalidate_amortization_schedule, debt_id)
+
+
+for model in (InstallmentDebt, InstallmentDebtBalance):
+    post_save.connect(installment_debt_changed, sender=model)
+    post_delete.connect(installment_debt_changed, sender=model)
+
+
+# Expense Transaction Signals
+def is_budget_period_deletion(origin):
+    """ Returns whether a delete started from a budget period or user, which takes the period's totals with it """
+    return getattr(origin, 'model', type(origin)) in (BudgetPeriod, CustomUser)
+
+
+def remember_previous_new_debt_share(sender, instance, origin=None, **kwargs):
+    """ Keeps the New Debt share the transaction had before it is updated or deleted so it can be taken back out """
+    instance._previous_new_debt_share = None
+    # The budget period's New Debt is being deleted along with the transaction
+    if instance.pk and not is_budget_period_deletion(origin):
+        instance._previous_new_debt_share = get_stored_new_debt_share(instance.pk)
+
+
+def expense_transaction_saved(sender, instance, **kwargs):
+    """ Moves the transaction's credit card purchase amount into the New Debt of its budget period """
+    adjustments = {}
+    previous = getattr(instance, '_previous_new_debt_share', None)
+    if previous:
+        user_id, budget_period_id, amount = previous
+        adjustments[(user_id, budget_period_id)] = -amount
+    current = get_new_debt_share(instance.user_id, instance.expense_budget_item_id, instance.amount,
+                                 instance.credit_purchase)
+    if current:
+        user_id, budget_period_id, amount = current
+        adjustments[(user_id, budget_period_id)] = adjustments.get((user_id, budget_period_id), 0) + amount
+
+    for (user_id, budget_period_id), amount in adjustments.items():
+        if amount:
+            adjust_new_debt(user_id, budget_period_id, amount)
+
+
+def expense_transaction_deleted(sender, instance, origin=None, **kwargs):
+    """ Takes a deleted credit card purchase back out of New Debt """
+    # The budget period's New Debt is being deleted along with the transaction
+    if is_budget_period_deletion(origin):
+        return
+
+    previous = getattr(instance, '_previous_new_debt_share', None)
+    if previous:
+        user_id, budget_period_id, amount = previous
+        adjust_new_debt(user_id, budget_period_id, -amount)
+
+
+pre_save.connect(remember_previous_new_debt_share, sender=ExpenseTransaction)
+pre_delete.connect(remember_previous_new_debt_share, sender=ExpenseTransaction)
+post_save.connect(expense_transaction_saved, sender=ExpenseTransaction)
+post_delete.connect(expense_transaction_deleted, sender=ExpenseTransaction)
+
+
+# Budget Period Summary Signals
+def remember_previous_summary_share(sender, instance, origin=None, **kwargs):
+    """ Keeps what the row added to its budget period's totals before it is updated or deleted """
+    instance._previous_summary_share = None
+    if instance.pk and not is_budget_period_deletion(origin):
+        instance._previous_summary_share = get_summary_share(instance, stored=True)
+
+
+def summary_share_changed(sender, instance, signal, origin=None, **kwargs):
+    """ Applies the change in what an item or transaction adds to its budget period's totals, without a rescan """
+    if is_budget_period_deletion(origin):
+        return
+
+    current = get_summary_share(instance) if signal is post_save else None
+    deltas = get_summary_delta(getattr(instance, '_previous_summary_share', None), current)
+    for budget_period_id, delta in deltas.items():
+        apply_summary_delta(budget_period_id, delta)
+
+
+for model, period_path, fields in SUMMARY_SOURCES:
+    pre_save.connect(remember_previous_summary_share, sender=model)
+    pre_delete.connect(remember_previous_summary_share, sender=model)
+    post_save.connect(summary_share_changed, sender=model)
+    post_delete.connect(summary_share_changed, sender=model)
+
+
+# Report Signals
+def expenses_changed(sender, instance, **kwargs):
+    """ Clears the owner's cached reports once the change is committed """
+    refresh_on_commit(invalidate_reports, instance.user_id)
+
+
+for model in (ExpenseCategory, ExpenseBudgetItem, ExpenseTransaction):
+    post_save.connect(expenses_changed, sender=model)
+    post_delete.connect(expenses_changed, sender=model)
+
+
+# Categorization Index Signals
+def expense_transaction_added(sender, instance, created, **kwargs):
+    """ Adds a new transaction to the owner's categorization index once it is committed """
+    if created:
+        transaction.on_commit(partial(add_to_categorization_index, instance))
+    else:
+        refresh_on_commit(forget_categorization_index, instance.user_id)
+
+
+def categorization_changed(sender, instance, created=False, **kwargs):
+    """ Drops the owner's categorization index when names it was built from are changed or removed """
+    if not created:
+        refresh_on_commit(forget_categorization_index, instance.user_id)
+
+
+post_save.connect(expense_transaction_added, sender=ExpenseTransaction)
+post_delete.connect(categorization_changed, sender=ExpenseTransaction)
+for model in (ExpenseCategory, ExpenseBudgetItem):
+    post_save.connect(categorization_changed, sender=model)
+    post_delete.connect(categorization_changed, sender=model)
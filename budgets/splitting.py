@@ -0,0 +1,92 @@
+import uuid
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+
+from .budget_summary import apply_summary_delta, get_summary_contribution
+from .categorization import forget_categorization_index
+from .models import ExpenseBudgetItem, ExpenseTransaction
+from .new_debt import adjust_new_debt
+from .reports import invalidate_reports
+
+# The fields each part of a split copies from the transaction being split
+SPLIT_COPIED_FIELDS = ('name', 'credit_purchase', 'credit_payoff', 'cash', 'date')
+
+
+def split_expense_transaction(expense_transaction, allocations):
+    """
+    Splits an expense transaction across several expense budget items.
+
+    Each part is an ordinary expense transaction in its budget item, so item totals and budget period summaries
+    still add everything up with one GROUP BY. The parts share a split_group. The original transaction becomes the
+    first part and keeps its import hash so a re-import still sees it. The other parts are inserted with a single
+    bulk_create. That skips the model signals, so their New Debt, summary totals, cached reports and categorization
+    index are updated here in the same transaction.
+
+    Parameters:
+        expense_transaction (ExpenseTransaction): The transaction to split. It can already be part of a split.
+        allocations (list[tuple[ExpenseBudgetItem, Decimal]]): The budget item and amount of each part. Each amount
+            must be non-zero with the same sign as the transaction's amount, and together they must add up to it.
+
+    Returns:
+        list[ExpenseTransaction]: The parts, starting with the original transaction.
+
+    Raises:
+        ValueError: If there are fewer than two parts, an amount is zero or has the wrong sign, the amounts don't add
+            up or an item belongs to someone else.
+    """
+    if len(allocations) < 2:
+        raise ValueError('A split needs at least two parts.')
+    if any(item.user_id != expense_transaction.user_id for item, amount in allocations):
+        raise ValueError('Transactions can only be split across your own budget items.')
+
+    with transaction.atomic():
+        original = ExpenseTransaction.objects.select_for_update().get(pk=expense_transaction.pk)
+        # Checked against the locked row, as the amount may have changed since expense_transaction was read
+        if any(not amount or (amount > 0) != (original.amount > 0) for item, amount in allocations):
+            raise ValueError('Every part must be non-zero and have the same sign as the transaction.')
+        if sum(amount for item, amount in allocations) != original.amount:
+            raise ValueError(f'The parts must add up to {original.amount}.')
+
+        split_group = original.split_group or uuid.uuid4()
+
+        # The original goes through save() so its signals handle the change to it
+        first_item, first_amount = allocations[0]
+        original.expense_budget_item = first_item
+        original.amount = first_amount
+        original.split_group = split_group
+        original.save()
+
+        parts = ExpenseTransaction.objects.bulk_create([
+            ExpenseTransaction(
+                user_id=original.user_id,
+                expense_budget_item=item,
+                amount=amount,
+                split_group=split_group,
+                **{field: getattr(original, field) for field in SPLIT_COPIED_FIELDS},
+            )
+            for item, amount in allocations[1:]
+        ])
+
+        # bulk_create skips the model signals, so apply what they would have
+        budget_period_ids = dict(
+            ExpenseBudgetItem.objects
+            .filter(id__in={part.expense_budget_item_id for part in parts})
+            .values_list('id', 'expense_category__budget_period_id')
+        )
+        deltas = defaultdict(dict)
+        new_debt = defaultdict(int)
+        for part in parts:
+            budget_period_id = budget_period_ids[part.expense_budget_item_id]
+            for field, amount in get_summary_contribution(ExpenseTransaction, vars(part)).items():
+                deltas[budget_period_id][field] = deltas[budget_period_id].get(field, 0) + amount
+            if part.credit_purchase and part.amount:
+                new_debt[budget_period_id] += part.amount
+        for budget_period_id, delta in deltas.items():
+            apply_summary_delta(budget_period_id, delta)
+        for budget_period_id, amount in new_debt.items():
+            adjust_new_debt(original.user_id, budget_period_id, amount)
+        transaction.on_commit(partial(invalidate_reports, original.user_id))
+        transaction.on_commit(partial(forget_categorization_index, original.user_id))
+    return [original] + parts
@@ -1,3 +1,630 @@
-from django.test import TestCase
+import random
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.test import SimpleTestCase, TestCase
+
+from .amortization import calculate_amortization
+from .budget_summary import STORED_SUMMARY_FIELDS, read_budget_period_summaries, summarize_budget_period
+from .exports import escape_csv_row
+from .importers import import_statement, iter_csv_rows
+from .ledger import get_ledger_page
+from .moving import move_transactions
+from .new_debt import NEW_DEBT, sync_new_debt
+from .models import Asset, AssetBalance, BudgetPeriod, BudgetPeriodSummary, CustomUser, ExpenseBudgetItem
+from .models import ExpenseCategory
+from .models import ExpenseTransaction, IncomeBudgetItem, IncomeTransaction, NetWorthSnapshot, ScheduleItem
+from .occurrences import FREQUENCY_STEPS, count_due_dates_in_month, get_due_date, get_next_due_date
+from .projection import project_schedule
+from .quick_edits import delete_quick_edit, get_quick_edit_form, save_quick_edit
+from .splitting import split_expense_transaction
+
+RECURRING_FREQUENCIES = list(FREQUENCY_STEPS)
+FREQUENCIES = RECURRING_FREQUENCIES + ['One time only']
+
+
+# Reference versions of the loops the closed form calculations replaced
+def step_through_next_due_date(first_due_date, frequency, current_date):
+    """ Steps from the first due date until it reaches current_date, like ScheduleItem.get_next_payment used to """
+    if first_due_date >= current_date:
+        return first_due_date
+    if frequency == 'One time only':
+        return None
+    time_delta = ScheduleItem(frequency=frequency).get_time_delta()
+    date_to_check = first_due_date
+    while current_date > date_to_check:
+        date_to_check += time_delta
+    return date_to_check
+
+
+def step_through_due_date_count(first_due_date, frequency, year, month):
+    """ Counts the due dates in a month by stepping from the first due date, like get_monthly_total used to """
+    if frequency == 'One time only':
+        return int(first_due_date.year == year and first_due_date.month == month)
+    time_delta = ScheduleItem(frequency=frequency).get_time_delta()
+    date_cutoff = date(year, month, 1) + relativedelta(months=+1)
+    count = 0
+    date_to_check = first_due_date
+    while date_cutoff > date_to_check:
+        if date_to_check.month == month and date_to_check.year == year:
+            count += 1
+        date_to_check += time_delta
+    return count
+
+
+def step_through_amortization(balance, monthly_rate, payment, max_months):
+    """ Pays a loan off one month at a time, returning the balance after each payment and the total interest """
+    balances = []
+    total_interest = 0.0
+    while balance > 1e-9 and len(balances) < max_months:
+        interest = balance * monthly_rate
+        total_interest += interest
+        balance = balance + interest - min(payment, balance + interest)
+        balances.append(balance)
+    return balances, total_interest, balance <= 1e-9
+
+
+def get_summary_mismatches(bp):
+    """ Compares a budget period's stored summary with its totals summarized from scratch """
+    stored = BudgetPeriodSummary.objects.get(budget_period=bp)
+    totals = summarize_budget_period(bp)
+    return {
+        field: (getattr(stored, field), totals[field])
+        for field in STORED_SUMMARY_FIELDS
+        if getattr(stored, field) != totals[field]
+    }
+
+
+class DueDateTests(SimpleTestCase):
+    def test_month_end_due_dates_stay_clamped(self):
+        # Adding a month to Jan 31 gives Feb 28 and every later due date keeps the 28th
+        first_due_date = date(2023, 1, 31)
+        self.assertEqual([get_due_date(first_due_date, 'Monthly', step) for step in range(4)],
+                         [date(2023, 1, 31), date(2023, 2, 28), date(2023, 3, 28), date(2023, 4, 28)])
+        self.assertEqual(get_due_date(date(2024, 1, 31), 'Monthly', 1), date(2024, 2, 29))
+        self.assertEqual(get_due_date(date(2024, 1, 31), 'Every two months', 2), date(2024, 5, 31))
+        self.assertEqual(get_next_due_date(first_due_date, 'Monthly', date(2023, 3, 29)), date(2023, 4, 28))
+
+    def test_clamped_due_dates_match_stepping(self):
+        for first_due_date in (date(2023, 1, 29), date(2023, 1, 30), date(2023, 1, 31), date(2023, 8, 31),
+                               date(2024, 2, 29)):
+            for frequency in ('Monthly', 'Every two months', 'Quarterly', 'Every six months', 'Yearly'):
+                for current_date in (date(2023, 3, 1), date(2025, 2, 27), date(2028, 3, 1), date(2031, 12, 31)):
+                    self.assertEqual(get_next_due_date(first_due_date, frequency, current_date),
+                                     step_through_next_due_date(first_due_date, frequency, current_date),
+                                     (first_due_date, frequency, current_date))
+
+    def test_quarterly_is_every_four_months(self):
+        first_due_date = date(2024, 1, 15)
+        self.assertEqual(get_due_date(first_due_date, 'Quarterly', 1), date(2024, 5, 15))
+        self.assertEqual([count_due_dates_in_month(first_due_date, 'Quarterly', 2024, month) for month in range(1, 13)],
+                         [1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0])
+
+    def test_random_schedules_match_stepping(self):
+        rng = random.Random(4)
+        for _ in range(500):
+            first_due_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))
+            current_date = date(2020, 1, 1) + timedelta(days=rng.randint(0, 3000))
+            frequency = rng.choice(FREQUENCIES)
+            self.assertEqual(get_next_due_date(first_due_date, frequency, current_date),
+                             step_through_next_due_date(first_due_date, frequency, current_date),
+                             (first_due_date, frequency, current_date))
+            self.assertEqual(count_due_dates_in_month(first_due_date, frequency, current_date.year, current_date.month),
+                             step_through_due_date_count(first_due_date, frequency, current_date.year,
+                                                         current_date.month),
+                             (first_due_date, frequency, current_date))
+
+
+class ProjectionTests(SimpleTestCase):
+    def test_projection_matches_stepping(self):
+        rng = random.Random(5)
+        items = [
+            ScheduleItem(first_due_date=date(2023, 1, 1) + timedelta(days=rng.randint(0, 900)),
+                         frequency=rng.choice(FREQUENCIES),
+                         amount=Decimal(rng.randint(1, 500000)) / 100)
+            for _ in range(200)
+        ]
+        # Include a month end item so clamping is covered too
+        items.append(ScheduleItem(first_due_date=date(2023, 1, 31), frequency='Monthly', amount=Decimal('10.00')))
+        year_months = [(2023 + index // 12, index % 12 + 1) for index in range(36)]
+
+        projection = project_schedule(items, year_months)
+
+        for row, item in enumerate(items):
+            expected = [
+                int(item.amount * 100) * step_through_due_date_count(item.first_due_date, item.frequency, year, month)
+                for year, month in year_months
+            ]
+            self.assertEqual(projection.amounts[row].tolist(), expected, (item.first_due_date, item.frequency))
+        self.assertEqual(projection.totals.tolist(), projection.amounts.sum(axis=0).tolist())
+
+    def test_no_items(self):
+        projection = project_schedule([], [(2024, 1), (2024, 2)])
+        self.assertEqual(projection.amounts.shape, (0, 2))
+        self.assertEqual(projection.totals.tolist(), [0, 0])
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user('ledger@example.com', 'password')
+        cls.bp = BudgetPeriod.objects.create(user=user, month=3, year=2024)
+        income_item = IncomeBudgetItem.objects.create(user=user, budget_period=cls.bp, name='Job', planned_amount=0)
+        category = ExpenseCategory.objects.create(user=user, budget_period=cls.bp, name='Food')
+        expense_item = ExpenseBudgetItem.objects.create(user=user, expense_category=category, name='Groceries',
+                                                        planned_amount=0)
+        # Several transactions of both kinds share each date so pages end in the middle of a date
+        for day in (1, 1, 2, 2, 2, 5):
+            IncomeTransaction.objects.create(user=user, budget_item=income_item, name=f'Income {day}', amount=1,
+                                             date=date(2024, 3, day))
+            ExpenseTransaction.objects.create(user=user, expense_budget_item=expense_item, name=f'Expense {day}',
+                                              amount=1, date=date(2024, 3, day))
+
+    def get_expected_order(self):
+        """ Sorts every transaction into ledger order, newest date first, income before expenses, then newest id """
+        transactions = [(0, t) for t in IncomeTransaction.objects.all()] + \
+            [(1, t) for t in ExpenseTransaction.objects.all()]
+        transactions.sort(key=lambda entry: (entry[1].date, -entry[0], entry[1].id), reverse=True)
+        return [(type(t), t.id) for kind_rank, t in transactions]
+
+    def read_pages(self, page_size):
+        pages = []
+        cursor = None
+        while True:
+            page = get_ledger_page(self.bp, cursor, page_size=page_size)
+            pages.append([(type(t), t.id) for t in page.transactions])
+            cursor = page.next_cursor
+            if cursor is None:
+                return pages
+
+    def test_pages_continue_where_the_last_one_ended(self):
+        expected = self.get_expected_order()
+        for page_size in range(1, len(expected) + 2):
+            pages = self.read_pages(page_size)
+            self.assertEqual([t for page in pages for t in page], expected, page_size)
+            self.assertTrue(all(len(page) == page_size for page in pages[:-1]), page_size)
+
+    def test_last_page_that_is_exactly_full_has_no_next_cursor(self):
+        pages = self.read_pages(4)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4])
+
+    def test_invalid_cursor(self):
+        for cursor in ('nonsense', '2024-03-01.transfer.1', '2024-13-01.income.1', '2024-03-01.income.x'):
+            with self.assertRaises(ValueError):
+                get_ledger_page(self.bp, cursor)
+
+
+class AmortizationTests(SimpleTestCase):
+    def test_closed_form_matches_stepping(self):
+        cases = [
+            (20000, 0.065 / 12, 400),
+            (250000, 0.04 / 12, 1193.54),
+            (1000, 0, 100),  # No interest, paid off in exactly 10 payments
+            (1050, 0, 100),  # No interest with a smaller last payment
+            (5000, 0.2 / 12, 50),  # The payment doesn't cover the interest
+            (0, 0.01, 10),  # Nothing left to pay
+        ]
+        max_months = 600
+        month_counts, payments, interest, principal, balances = calculate_amortization(
+            *zip(*cases), max_months=max_months
+        )
+
+        for row, (balance, monthly_rate, payment) in enumerate(cases):
+            expected_balances, expected_interest, paid_off = step_through_amortization(balance, monthly_rate,
+                                                                                      payment, max_months)
+            if not paid_off:
+                self.assertEqual(month_counts[row], -1, cases[row])
+                continue
+            month_count = len(expected_balances)
+            self.assertEqual(month_counts[row], month_count, cases[row])
+            for actual, expected in zip(balances[row, :month_count], expected_balances):
+                self.assertAlmostEqual(actual, expected, places=4, msg=cases[row])
+            self.assertAlmostEqual(interest[row, :month_count].sum(), expected_interest, places=4, msg=cases[row])
+            self.assertAlmostEqual(payments[row, :month_count].sum(), balance + expected_interest, places=4,
+                                   msg=cases[row])
+
+
+class NetWorthSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('snapshots@example.com', 'password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.asset = Asset.objects.create(user=self.user, name='Savings')
+            AssetBalance.objects.create(user=self.user, asset=self.asset, balance=100, date=date(2024, 1, 15))
+
+    def test_balance_creates_snapshots(self):
+        snapshot = NetWorthSnapshot.objects.get(user=self.user, date=date(2024, 1, 1))
+        self.assertEqual(snapshot.asset_total, 100)
+
+    def test_deleting_an_account_refreshes_snapshots(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.asset.delete()
+        self.assertEqual(NetWorthSnapshot.objects.get(user=self.user, date=date(2024, 1, 1)).asset_total, 0)
+
+    def test_deleting_a_user_with_balances(self):
+        user_id = self.user.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(CustomUser.objects.filter(pk=user_id).exists())
+        self.assertFalse(NetWorthSnapshot.objects.filter(user_id=user_id).exists())
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user('import@example.com', 'password')
+        self.bp = BudgetPeriod.objects.create(user=user, month=3, year=2024)
+        self.income_item = IncomeBudgetItem.objects.create(user=user, budget_period=self.bp, name='Job',
+                                                           planned_amount=0)
+        category = ExpenseCategory.objects.create(user=user, budget_period=self.bp, name='Food')
+        self.expense_item = ExpenseBudgetItem.objects.create(user=user, expense_category=category, name='Groceries',
+                                                             planned_amount=0)
+
+    def import_csv(self, lines, batch_size=2):
+        return import_statement(self.bp, iter_csv_rows(lines), self.expense_item, self.income_item,
+                                batch_size=batch_size)
+
+    def test_reimport_counts_duplicates(self):
+        lines = ['Date,Description,Amount', '2024-03-01,Pay,100', '2024-03-02,Store,-20', '2024-03-02,Store,-20',
+                 '2024-04-01,Pay,100']
+        self.assertEqual(tuple(self.import_csv(lines)), (1, 2, 0, 1))
+        self.assertEqual(tuple(self.import_csv(lines)), (0, 0, 3, 1))
+        self.assertEqual(get_summary_mismatches(self.bp), {})
+
+    def test_rows_before_a_bad_row_are_summarized(self):
+        lines = ['Date,Description,Amount', '2024-03-01,Pay,100', '2024-03-02,Store,-20', '2024-03-03,Bad,abc']
+        with self.assertRaises(ValueError):
+            self.import_csv(lines)
+        self.assertEqual(ExpenseTransaction.objects.filter(expense_budget_item=self.expense_item).count(), 1)
+        self.assertEqual(get_summary_mismatches(self.bp), {})
+
+
+class BudgetPeriodSummaryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('summary@example.com', 'password')
+        self.march = BudgetPeriod.objects.create(user=self.user, month=3, year=2024)
+        self.april = BudgetPeriod.objects.create(user=self.user, month=4, year=2024)
+        self.income_item = IncomeBudgetItem.objects.create(user=self.user, budget_period=self.march, name='Job',
+                                                           planned_amount=1000)
+        IncomeBudgetItem.objects.create(user=self.user, budget_period=self.march, name='Savings',
+                                        planned_amount=200, type='Reserve')
+        self.category = ExpenseCategory.objects.create(user=self.user, budget_period=self.march, name='Food')
+        self.expense_item = ExpenseBudgetItem.objects.create(user=self.user, expense_category=self.category,
+                                                             name='Groceries', planned_amount=300)
+        april_category = ExpenseCategory.objects.create(user=self.user, budget_period=self.april, name='Food')
+        self.april_item = ExpenseBudgetItem.objects.create(user=self.user, expense_category=april_category,
+                                                           name='Groceries', planned_amount=250)
+        IncomeTransaction.objects.create(user=self.user, budget_item=self.income_item, name='Pay', amount=1000,
+                                         date=date(2024, 3, 1))
+        self.expense = ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.expense_item,
+                                                         name='Store', amount=40, date=date(2024, 3, 2))
+        ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.expense_item, name='Card',
+                                          amount=25, credit_purchase=True, date=date(2024, 3, 3))
+
+    def assertSummariesMatch(self):
+        for bp in BudgetPeriod.objects.filter(user=self.user):
+            self.assertEqual(get_summary_mismatches(bp), {}, bp)
+
+    def test_save(self):
+        self.assertSummariesMatch()
+        summary = BudgetPeriodSummary.objects.get(budget_period=self.march)
+        # The credit card purchase is counted as new debt rather than an actual expense
+        self.assertEqual((summary.total_actual_expenses, summary.total_new_debt), (40, 25))
+
+    def test_amount_change(self):
+        self.expense.amount = 55
+        self.expense.cash = True
+        self.expense.save()
+        self.income_item.planned_amount = 1100
+        self.income_item.save()
+        self.assertSummariesMatch()
+
+    def test_item_change(self):
+        self.expense.expense_budget_item = self.april_item
+        self.expense.save()
+        self.assertSummariesMatch()
+        self.assertEqual(BudgetPeriodSummary.objects.get(budget_period=self.april).total_actual_expenses, 40)
+
+    def test_delete(self):
+        self.expense.delete()
+        self.assertSummariesMatch()
+        # Deleting a budget item takes its transactions with it
+        self.expense_item.delete()
+        self.assertSummariesMatch()
+
+    def test_budget_period_cascade(self):
+        self.category.delete()
+        self.assertSummariesMatch()
+        self.march.delete()
+        self.assertFalse(BudgetPeriodSummary.objects.filter(budget_period_id=self.march.id).exists())
+        self.assertSummariesMatch()
+
+    def test_reading_summaries_writes_nothing(self):
+        empty = BudgetPeriod.objects.create(user=self.user, month=5, year=2024)
+        totals = read_budget_period_summaries([self.march, empty])
+        self.assertFalse(BudgetPeriodSummary.objects.filter(budget_period=empty).exists())
+        self.assertEqual(totals[empty.id], summarize_budget_period(empty))
+        self.assertEqual(totals[self.march.id], summarize_budget_period(self.march))
+
+
+class NewDebtTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('newdebt@example.com', 'password')
+        self.march = BudgetPeriod.objects.create(user=self.user, month=3, year=2024)
+        self.april = BudgetPeriod.objects.create(user=self.user, month=4, year=2024)
+        self.march_item = ExpenseBudgetItem.objects.create(
+            user=self.user, name='Groceries', planned_amount=300,
+            expense_category=ExpenseCategory.objects.create(user=self.user, budget_period=self.march, name='Food'),
+        )
+        self.april_item = ExpenseBudgetItem.objects.create(
+            user=self.user, name='Groceries', planned_amount=300,
+            expense_category=ExpenseCategory.objects.create(user=self.user, budget_period=self.april, name='Food'),
+        )
+        self.purchase = ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.march_item,
+                                                          name='Card', amount=25, credit_purchase=True,
+                                                          date=date(2024, 3, 3))
+
+    def get_new_debt(self, bp):
+        """ Gets the planned amount of a budget period's New Debt, None when it has no New Debt category """
+        return ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=bp, expense_category__name=NEW_DEBT, name=NEW_DEBT)\
+            .values_list('planned_amount', flat=True)\
+            .first()
+
+    def test_purchases_add_new_debt(self):
+        ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.march_item, name='Card',
+                                          amount=15, credit_purchase=True, date=date(2024, 3, 4))
+        ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.march_item, name='Store',
+                                          amount=50, date=date(2024, 3, 4))
+        self.assertEqual(self.get_new_debt(self.march), 40)
+        self.assertIsNone(self.get_new_debt(self.april))
+
+    def test_changing_a_purchase(self):
+        self.purchase.amount = 30
+        self.purchase.save()
+        self.assertEqual(self.get_new_debt(self.march), 30)
+
+        self.purchase.credit_purchase = False
+        self.purchase.save()
+        self.assertIsNone(self.get_new_debt(self.march))
+
+    def test_moving_a_purchase_to_another_period(self):
+        self.purchase.expense_budget_item = self.april_item
+        self.purchase.save()
+        self.assertIsNone(self.get_new_debt(self.march))
+        self.assertEqual(self.get_new_debt(self.april), 25)
+
+    def test_deleting_a_purchase(self):
+        self.purchase.delete()
+        self.assertIsNone(self.get_new_debt(self.march))
+
+    def test_deleting_a_budget_period_with_purchases(self):
+        self.march.delete()
+        self.assertFalse(ExpenseCategory.objects.filter(budget_period_id=self.march.id).exists())
+        self.assertIsNone(self.get_new_debt(self.april))
+
+    def test_sync_repairs_bulk_updates(self):
+        ExpenseTransaction.objects.filter(pk=self.purchase.pk).update(amount=60)
+        sync_new_debt(self.march)
+        self.assertEqual(self.get_new_debt(self.march), 60)
+
+
+class MoveTransactionsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('move@example.com', 'password')
+        self.march = BudgetPeriod.objects.create(user=self.user, month=3, year=2024)
+        self.april = BudgetPeriod.objects.create(user=self.user, month=4, year=2024)
+        self.march_expense_item = ExpenseBudgetItem.objects.create(
+            user=self.user, name='Groceries', planned_amount=300,
+            expense_category=ExpenseCategory.objects.create(user=self.user, budget_period=self.march, name='Food'),
+        )
+        self.april_expense_item = ExpenseBudgetItem.objects.create(
+            user=self.user, name='Groceries', planned_amount=300,
+            expense_category=ExpenseCategory.objects.create(user=self.user, budget_period=self.april, name='Food'),
+        )
+        self.march_income_item = IncomeBudgetItem.objects.create(user=self.user, budget_period=self.march,
+                                                                 name='Job', planned_amount=1000)
+        self.april_income_item = IncomeBudgetItem.objects.create(user=self.user, budget_period=self.april,
+                                                                 name='Job', planned_amount=1000)
+        self.expenses = [
+            ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.march_expense_item,
+                                              name='Store', amount=40, cash=True, date=date(2024, 3, 2)),
+            ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.march_expense_item,
+                                              name='Card', amount=25, credit_purchase=True, date=date(2024, 3, 3)),
+        ]
+        self.income = IncomeTransaction.objects.create(user=self.user, budget_item=self.march_income_item,
+                                                       name='Pay', amount=1000, date=date(2024, 3, 1))
+
+    def test_move_to_another_period(self):
+        moved = move_transactions(self.user.id, [t.id for t in self.expenses], [self.income.id],
+                                  self.april_expense_item, self.april_income_item)
+        self.assertEqual(moved, (2, 1))
+        self.assertEqual(ExpenseTransaction.objects.filter(expense_budget_item=self.april_expense_item).count(), 2)
+        self.assertEqual(IncomeTransaction.objects.get(pk=self.income.id).budget_item, self.april_income_item)
+
+        # The purchase's New Debt moves with it
+        new_debt = ExpenseBudgetItem.objects.filter(expense_category__name=NEW_DEBT, name=NEW_DEBT)
+        self.assertFalse(new_debt.filter(expense_category__budget_period=self.march).exists())
+        self.assertEqual(new_debt.get(expense_category__budget_period=self.april).planned_amount, 25)
+        for bp in (self.march, self.april):
+            self.assertEqual(get_summary_mismatches(bp), {}, bp)
+
+    def test_transactions_already_in_the_target_or_of_other_users_are_skipped(self):
+        other_user = CustomUser.objects.create_user('other@example.com', 'password')
+        other_bp = BudgetPeriod.objects.create(user=other_user, month=3, year=2024)
+        other_expense = ExpenseTransaction.objects.create(
+            user=other_user, name='Store', amount=10, date=date(2024, 3, 2),
+            expense_budget_item=ExpenseBudgetItem.objects.create(
+                user=other_user, name='Groceries', planned_amount=0,
+                expense_category=ExpenseCategory.objects.create(user=other_user, budget_period=other_bp, name='Food'),
+            ),
+        )
+        moved = move_transactions(self.user.id, [self.expenses[0].id, other_expense.id], [self.income.id],
+                                  self.march_expense_item, self.april_income_item)
+        self.assertEqual(moved, (0, 1))
+        self.assertEqual(ExpenseTransaction.objects.get(pk=other_expense.id).user, other_user)
+        self.assertEqual(get_summary_mismatches(other_bp), {})
+
+
+class QuickEditTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('quickedit@example.com', 'password')
+        self.bp = BudgetPeriod.objects.create(user=self.user, month=3, year=2024)
+        self.income_item = IncomeBudgetItem.objects.create(user=self.user, budget_period=self.bp, name='Job',
+                                                           planned_amount=1000)
+        self.income = IncomeTransaction.objects.create(user=self.user, budget_item=self.income_item, name='Pay',
+                                                       amount=1000, date=date(2024, 3, 1))
+        self.category = ExpenseCategory.objects.create(user=self.user, budget_period=self.bp, name='Food')
+        self.expense_item = ExpenseBudgetItem.objects.create(user=self.user, expense_category=self.category,
+                                                             name='Groceries', planned_amount=300)
+
+    def save(self, kind, data, instance=None):
+        form = get_quick_edit_form(kind, self.bp, data, instance)
+        self.assertTrue(form.is_valid(), form.errors)
+        return save_quick_edit(kind, self.bp, form)
+
+    def assertSummaryMatches(self, result):
+        totals = summarize_budget_period(self.bp)
+        self.assertEqual({field: result['summary'][field] for field in STORED_SUMMARY_FIELDS},
+                         {field: totals[field] for field in STORED_SUMMARY_FIELDS})
+
+    def get_changed(self, result, kind):
+        return {row['id']: row for row in result['changed'] if row['kind'] == kind}
+
+    def test_changing_a_planned_amount(self):
+        result = self.save('expense-budget-items', {'name': 'Groceries', 'expense_category': self.category.id,
+                                                    'planned_amount': '350', 'type': 'Expense'},
+                           self.expense_item)
+        self.assertEqual(result['summary_delta']['total_planned_expenses'], 50)
+        self.assertEqual(result['summary_delta']['left_to_plan'], -50)
+        self.assertEqual(self.get_changed(result, 'expense-budget-items')[self.expense_item.id]['planned_amount'],
+                         350)
+        self.assertSummaryMatches(result)
+
+    def test_adding_and_deleting_a_credit_card_purchase(self):
+        result = self.save('expense-transactions', {'name': 'Card', 'expense_budget_item': self.expense_item.id,
+                                                    'amount': '25', 'credit_purchase': True,
+                                                    'date': '2024-03-03'})
+        self.assertEqual(result['summary_delta']['total_new_debt'], 25)
+        self.assertEqual(result['summary_delta']['total_remaining_debt'], 25)
+        self.assertEqual(result['summary_delta']['total_actual_expenses'], 0)
+        new_debt_item = ExpenseBudgetItem.objects.get(expense_category__budget_period=self.bp, name=NEW_DEBT)
+        self.assertIn(new_debt_item.id, self.get_changed(result, 'expense-budget-items'))
+        self.assertSummaryMatches(result)
+
+        purchase = ExpenseTransaction.objects.get(credit_purchase=True)
+        result = delete_quick_edit('expense-transactions', self.bp, purchase)
+        self.assertEqual(result['summary_delta']['total_new_debt'], -25)
+        self.assertIn({'kind': 'expense-budget-items', 'id': new_debt_item.id}, result['deleted'])
+        self.assertSummaryMatches(result)
+
+    def test_moving_a_transaction_updates_both_items(self):
+        other_item = ExpenseBudgetItem.objects.create(user=self.user, expense_category=self.category, name='Dining',
+                                                      planned_amount=100)
+        expense = ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.expense_item,
+                                                    name='Store', amount=40, date=date(2024, 3, 2))
+        result = self.save('expense-transactions', {'name': 'Store', 'expense_budget_item': other_item.id,
+                                                    'amount': '45', 'date': '2024-03-02'}, expense)
+        changed = self.get_changed(result, 'expense-budget-items')
+        self.assertEqual((changed[self.expense_item.id]['total'], changed[other_item.id]['total']), (0, 45))
+        self.assertEqual(result['summary_delta']['total_actual_expenses'], 5)
+        self.assertSummaryMatches(result)
+
+    def test_deleting_a_budget_item_lists_its_transactions(self):
+        income_item_id = self.income_item.id
+        result = delete_quick_edit('income-budget-items', self.bp, self.income_item)
+        self.assertEqual(result['deleted'], [{'kind': 'income-budget-items', 'id': income_item_id},
+                                             {'kind': 'income-transactions', 'id': self.income.id}])
+        self.assertEqual(result['summary_delta']['total_actual_income'], -1000)
+        self.assertEqual(result['summary_delta']['total_planned_income'], -1000)
+        self.assertSummaryMatches(result)
+
+
+class SplitTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('split@example.com', 'password')
+        self.march = BudgetPeriod.objects.create(user=self.user, month=3, year=2024)
+        self.april = BudgetPeriod.objects.create(user=self.user, month=4, year=2024)
+        category = ExpenseCategory.objects.create(user=self.user, budget_period=self.march, name='Shopping')
+        self.groceries = ExpenseBudgetItem.objects.create(user=self.user, expense_category=category, name='Groceries',
+                                                          planned_amount=300)
+        self.household = ExpenseBudgetItem.objects.create(user=self.user, expense_category=category, name='Household',
+                                                          planned_amount=100)
+        self.april_item = ExpenseBudgetItem.objects.create(
+            user=self.user, name='Groceries', planned_amount=300,
+            expense_category=ExpenseCategory.objects.create(user=self.user, budget_period=self.april, name='Food'),
+        )
+        self.purchase = ExpenseTransaction.objects.create(user=self.user, expense_budget_item=self.groceries,
+                                                          name='Card', amount=100, credit_purchase=True,
+                                                          date=date(2024, 3, 3), import_hash='abc')
+
+    def get_new_debt(self, bp):
+        return ExpenseBudgetItem.objects\
+            .filter(expense_category__budget_period=bp, expense_category__name=NEW_DEBT, name=NEW_DEBT)\
+            .values_list('planned_amount', flat=True)\
+            .first()
+
+    def test_split_across_items_and_periods(self):
+        parts = split_expense_transaction(self.purchase, [(self.groceries, Decimal('60')),
+                                                          (self.household, Decimal('30')),
+                                                          (self.april_item, Decimal('10'))])
+        self.assertEqual(parts[0].id, self.purchase.id)
+        self.assertEqual(ExpenseTransaction.objects.filter(split_group=parts[0].split_group).count(), 3)
+        self.assertEqual(ExpenseTransaction.objects.get(pk=self.purchase.id).import_hash, 'abc')
+        self.assertEqual((self.get_new_debt(self.march), self.get_new_debt(self.april)), (90, 10))
+        for bp in (self.march, self.april):
+            self.assertEqual(get_summary_mismatches(bp), {}, bp)
+
+    def test_invalid_splits(self):
+        other_user = CustomUser.objects.create_user('other@example.com', 'password')
+        other_bp = BudgetPeriod.objects.create(user=other_user, month=3, year=2024)
+        other_item = ExpenseBudgetItem.objects.create(
+            user=other_user, name='Groceries', planned_amount=0,
+            expense_category=ExpenseCategory.objects.create(user=other_user, budget_period=other_bp, name='Food'),
+        )
+        for allocations in ([(self.household, Decimal('100'))],
+                            [(self.groceries, Decimal('60')), (self.household, Decimal('30'))],
+                            [(self.groceries, Decimal('110')), (self.household, Decimal('-10'))],
+                            [(self.groceries, Decimal('60')), (other_item, Decimal('40'))]):
+            with self.assertRaises(ValueError):
+                split_expense_transaction(self.purchase, allocations)
+        self.assertFalse(ExpenseTransaction.objects.exclude(pk=self.purchase.id).exists())
+
+    def test_amounts_are_checked_against_the_stored_transaction(self):
+        # The transaction changed after it was read, so parts adding up to the old amount are rejected
+        ExpenseTransaction.objects.filter(pk=self.purchase.id).update(amount=120)
+        with self.assertRaises(ValueError):
+            split_expense_transaction(self.purchase, [(self.groceries, Decimal('60')),
+                                                      (self.household, Decimal('40'))])
+        self.assertEqual(ExpenseTransaction.objects.get(pk=self.purchase.id).amount, 120)
+
+
+class ExportTests(TestCase):
+    def test_formula_cells_are_escaped(self):
+        row = (date(2024, 3, 1), '=HYPERLINK("http://example.com")', '+1', '-1', '@SUM(A1)', 'Store - Main St',
+               Decimal('-12.50'))
+        self.assertEqual(escape_csv_row(row), [date(2024, 3, 1), '\'=HYPERLINK("http://example.com")', "'+1", "'-1",
+                                               "'@SUM(A1)", 'Store - Main St', Decimal('-12.50')])
+
+    def test_transaction_export_escapes_names(self):
+        user = CustomUser.objects.create_user('export@example.com', 'password')
+        bp = BudgetPeriod.objects.create(user=user, month=3, year=2024)
+        item = IncomeBudgetItem.objects.create(user=user, budget_period=bp, name='=Job', planned_amount=0)
+        IncomeTransaction.objects.create(user=user, budget_item=item, name='@Pay', amount=100, date=date(2024, 3, 1))
+        self.client.force_login(user)
+        response = self.client.get('/reports/export/transactions.csv')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn("'=Job,'@Pay,100.00", content)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(CustomUser.objects.create_user('reports@example.com', 'password'))
+
+    def test_month_range_is_limited(self):
+        response = self.client.get('/reports/', {'start': '1900-01', 'end': '2024-03'})
+        self.assertEqual((response.context['start'], response.context['end']), ('2014-04', '2024-03'))
+        self.assertEqual(len(response.context['month_labels']), 120)
+
+    def test_reversed_months_are_swapped(self):
+        response = self.client.get('/reports/', {'start': '2024-03', 'end': '2024-01'})
+        self.assertEqual(response.context['month_labels'], ['Jan 2024', 'Feb 2024', 'Mar 2024'])
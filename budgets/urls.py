@@ -17,6 +17,7 @@ urlpatterns = [
     re_path(r'^register/$', views.register, name='register'),
     re_path(r'^activate/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,35})/$', views.activate, name='activate'),
     path('settings', EditSettings.as_view(), name='settings'),
+    path('settings/backup', views.backup_account, name='backup-account'),
     # Session URLs
     path('session/<key>/get', views.get_session_var, name='get-session-var'),
     path('session/<key>/toggle', views.toggle_session_var, name='toggle-session-var'),
@@ -53,10 +54,18 @@ urlpatterns = [
     path('money-schedule/schedule-item/<siid>/delete', DeleteScheduleItem.as_view()),
     # General Budget URLs
     path('budget/', views.budget, name='budget'),
+    path('budget/<int:year>/overview/', views.view_year_overview),
     path('budget/<month>/<int:year>/', views.specific_budget),
     path('budget/<month>/<int:year>/add-budget/', AddBudgetPeriod.as_view()),
     path('budget/<month>/<int:year>/pay-debt/', AddDebtPayment.as_view()),
     path('budget/<month>/<int:year>/delete-budget/<int:id>', DeleteBudget.as_view()),
+    path('budget/<month>/<int:year>/roll-forward/', RollForwardBudget.as_view()),
+    path('budget/<month>/<int:year>/ledger', views.view_ledger),
+    path('budget/<month>/<int:year>/import-transactions', ImportTransactions.as_view()),
+    path('budget/<month>/<int:year>/suggest-expense-budget-items', views.suggest_expense_budget_items),
+    path('budget/<month>/<int:year>/quick-edit/<kind>', views.quick_edit),
+    path('budget/<month>/<int:year>/quick-edit/<kind>/<int:id>', views.quick_edit),
+    path('budget/<month>/<int:year>/quick-edit/<kind>/<int:id>/delete', views.quick_delete),
     path('budget/<month>/<int:year>/next', views.change_budget),
     path('budget/<month>/<int:year>/previous', views.change_budget),
     # Budget Income URLS
@@ -79,8 +88,13 @@ urlpatterns = [
     path('budget/<month>/<int:year>/expense-category/<int:ecid>/expense-budget-item/<int:etiid>/add-expense-transaction', AddExpenseTransaction.as_view()),
     path('budget/<month>/<int:year>/expense-category/<int:ecid>/expense-budget-item/<int:etiid>/expense-transaction/<int:etid>/update', UpdateExpenseTransaction.as_view()),
     path('budget/<month>/<int:year>/expense-category/<int:ecid>/expense-budget-item/<int:etiid>/expense-transaction/<int:etid>/delete', DeleteExpenseTransaction.as_view()),
+    path('budget/<month>/<int:year>/expense-category/<int:ecid>/expense-budget-item/<int:etiid>/expense-transaction/<int:etid>/split', SplitExpenseTransaction.as_view()),
+    # Search URLs
+    path('search/', views.view_search, name='search'),
     # Reports URLs
     path('reports/', views.view_reports, name='reports'),
+    path('reports/export/transactions.csv', views.export_transactions, name='export-transactions'),
+    path('reports/export/balances.csv', views.export_balances, name='export-balances'),
     # Offers URLS
     path('offers/', views.view_offers, name='offers'),
     # Support URLS
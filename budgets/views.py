@@ -1,6 +1,6 @@
+import calendar
+import csv
 import datetime
-import math
-from functools import partial
 
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
@@ -11,18 +11,38 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.mail import EmailMessage
 from django.db import IntegrityError
-from django.http import Http404, JsonResponse
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.http import HttpResponseRedirect, HttpResponseNotFound
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render, redirect
 from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.views.decorators.http import require_POST
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 from django.contrib.auth.forms import AuthenticationForm
 
 from budgets.forms import *
+from .amortization import get_amortization_schedule, get_amortization_schedules
+from .backups import iter_backup_lines, iter_gzip
+from .budget_summary import read_budget_period_summaries, summarize_budget_period
+from .categorization import suggest_budget_items
+from .cloning import create_budget_period, roll_forward
+from .exports import Echo, escape_csv_row, iter_balance_rows, iter_transaction_rows
+from .expense_fund import EXPENSE_FUND_STRATEGIES, run_expense_fund_simulation
+from .importers import import_statement, iter_statement_rows
+from .ledger import get_ledger_page
+from .moving import move_transactions
 from .models import *
+from .net_worth import get_net_worth_snapshot_series
+from .occurrences import DUE_DATES_PER_YEAR
+from .projection import cents_to_decimal, project_schedule
+from .quick_edits import QUICK_EDIT_KINDS, delete_quick_edit, get_quick_edit_form, get_quick_edit_queryset
+from .quick_edits import save_quick_edit
+from .reports import get_category_spending
+from .search import search
+from .splitting import split_expense_transaction
 from .tokens import account_activation_token
 
 from django.contrib.auth import get_user_model
@@ -153,6 +173,10 @@ class EditSettings(LoginRequiredMixin, FormView, SuccessMessageMixin):
 
 
 # Helper Functions
+# Number of months the money schedule and expense fund can be projected for
+SCHEDULE_HORIZONS = (12, 36, 60)
+
+
 def format_numbers(**kwargs):
     """
     Formats strings to the correct amount of spaces based on longest number
@@ -197,16 +221,25 @@ def subtract_lists(x, y):
     return float('{:.2f}'.format(x-y))
 
 
-def get_last_12_months_labels(get_next_12=False):
-    """Get a list of abbreviated month names and a list of tuples containing year and month as strings"""
+def get_month_labels(count, get_next=False):
+    """
+    Get a list of abbreviated month names and a list of tuples containing year and month as strings
+
+    Parameters:
+        count (int): The number of months to label.
+        get_next (bool): Label the current month and the months after it instead of the months before it.
+
+    Returns:
+        tuple[list[str], list[tuple[str, str]]]: The month labels and the year/month pairs.
+    """
     month_labels = []
     year_month_labels = []
 
     current_date = datetime.today()
 
-    # If get_next_12 is set to True it will set the current_date value 11 months ahead
-    if get_next_12:
-        current_date = current_date + relativedelta(months=11)
+    # If get_next is set to True it will set the current_date value to the last month requested
+    if get_next:
+        current_date = current_date + relativedelta(months=count - 1)
 
     month = (current_date.strftime('%b %Y'))
     month_labels.append(month)
@@ -214,9 +247,9 @@ def get_last_12_months_labels(get_next_12=False):
     year_month = (current_date.strftime('%Y'), current_date.strftime('%m').lstrip('0'))
     year_month_labels.append(year_month)
 
-    for m in range(1, 12):
+    for m in range(1, count):
         adjusted_date = current_date+relativedelta(months=-m)
-        if m == 11:  # Makes last month include the year as well
+        if m == count - 1:  # Makes last month include the year as well
             month = adjusted_date.strftime('%b %Y')
         else:
             month = adjusted_date.strftime('%b')
@@ -227,42 +260,18 @@ def get_last_12_months_labels(get_next_12=False):
     return month_labels, year_month_labels
 
 
-def get_last_12_months_data(year, month, obj, obj_bal, user):
-    """Add up the balances for an object based on year and month"""
-    total_for_month = Decimal(0.00)
-
-    # Loop through all of the objects
-    for a in obj.objects.filter(user=user):
-
-        filter_args = {}
-        if issubclass(obj, Asset):
-            filter_args['asset__id'] = a.id
-        elif issubclass(obj, RevolvingDebt) or issubclass(obj, InstallmentDebt):
-            filter_args['debt__id'] = a.id
-
-        filter_args['date__year'] = year
-        filter_args['date__month'] = month
-
-        bal = obj_bal.objects.filter(**filter_args).first()
-
-        if bal is not None:
-            total_for_month += bal.balance
-
-        elif bal is None:  # Check for last balance entry
-            # kwargs
-            kwargs = {"date__lt": date(int(year), int(month), 1)}
-            if issubclass(obj, Asset):
-                kwargs['asset_id'] = a.id
-            elif issubclass(obj, RevolvingDebt):
-                kwargs['debt_id'] = a.id
-            elif issubclass(obj, InstallmentDebt):
-                kwargs['debt_id'] = a.id
+def get_last_12_months_labels(get_next_12=False):
+    """Get a list of abbreviated month names and a list of tuples containing year and month as strings"""
+    return get_month_labels(12, get_next_12)
 
-            remaining_balance = obj_bal.objects.filter(**kwargs).first()
-            if remaining_balance is not None:
-                total_for_month += remaining_balance.balance
 
-    return float(total_for_month)
+def get_schedule_horizon(request):
+    """ Returns the number of months to project the money schedule for based on the 'months' query parameter """
+    try:
+        months = int(request.GET.get('months', SCHEDULE_HORIZONS[0]))
+    except ValueError:
+        return SCHEDULE_HORIZONS[0]
+    return months if months in SCHEDULE_HORIZONS else SCHEDULE_HORIZONS[0]
 
 
 # Session Views
@@ -297,50 +306,25 @@ def toggle_session_var(request, key):
 # User Based Views
 # TODO: Add content from your money schedule
 # TODO: Add content from your budget
-# TODO: Prevent future month assets and debt balances from showing up in current month
 # TODO: Provide more options for viewing net worth (e.g. week, month, year, all time)
 @login_required
 def dashboard(request):
     """ Shows an overview of the user's account """
     print('SESSION', request.session.get('nav_collapsed'))
     # TODO: Fix rounding issues for the net worth line - I see it has a rounding issue with too many decimals
-    # Sum Assets
-    asset_total = Decimal(0.00)
-    for a in Asset.objects.filter(user=request.user.id):
-        if a.balances.first() is not None:
-            asset_total += a.balances.first().balance
-
-    # Sum Debts
-    debt_total = Decimal(0.00)
-    for d in InstallmentDebt.objects.filter(user=request.user.id):
-        if d.balances.first() is not None:
-            debt_total += d.balances.first().balance
-
-    for d in RevolvingDebt.objects.filter(user=request.user.id):
-        if d.balances.first() is not None:
-            debt_total += d.balances.first().balance
-
-    # Calculate Net Worth
-    net_worth_total = asset_total - debt_total
-
     # Get a list of abbreviated month names and a list of tuples containing year and month as strings ex: ('2020', '3')
     month_labels, year_month_labels = get_last_12_months_labels()
 
-    # Convert year_month_labels into years and months list
-    years = [year[0] for year in year_month_labels]
-    months = [year[1] for year in year_month_labels]
-
     # Get a list of balances for assets, revolving debts, and installment debts for the last 12 months
-    asset_partial = partial(get_last_12_months_data, obj=Asset, obj_bal=AssetBalance, user=request.user.id)
-    asset_data = list(map(asset_partial, years, months))
-    rev_debts_partial = partial(
-        get_last_12_months_data, obj=RevolvingDebt, obj_bal=RevolvingDebtBalance, user=request.user.id
-    )
-    rev_debts_data = list(map(rev_debts_partial, years, months))
-    inst_debts_partial = partial(
-        get_last_12_months_data, obj=InstallmentDebt, obj_bal=InstallmentDebtBalance, user=request.user.id
-    )
-    inst_debts_data = list(map(inst_debts_partial, years, months))
+    series = get_net_worth_snapshot_series(request.user.id, year_month_labels)
+    asset_data = [float(total) for total in series['assets']]
+    rev_debts_data = [float(total) for total in series['revolving_debts']]
+    inst_debts_data = [float(total) for total in series['installment_debts']]
+
+    # The current totals are the totals for this month
+    asset_total = series['assets'][-1]
+    debt_total = series['installment_debts'][-1] + series['revolving_debts'][-1]
+    net_worth_total = asset_total - debt_total
 
     debt_data = list(map(add_lists, rev_debts_data, inst_debts_data))
     net_worth_data = list(map(subtract_lists, asset_data, debt_data))
@@ -388,17 +372,23 @@ def assets_debts(request, show_all):
     # Net Worth Stats
     asset_total = 0
     for a in assets:
-        if a.balances.first() is not None:
-            asset_total += float(a.balances.first())
+        if a.latest_balance is not None:
+            asset_total += float(a.latest_balance)
+
+    # Projected payoff dates, calculated for every debt at once
+    installment_debts = list(installment_debts)
+    schedules = get_amortization_schedules(installment_debts)
+    for d in installment_debts:
+        d.amortization = schedules.get(d.id)
 
     debt_total = 0
     for d in installment_debts:
-        if d.balances.first() is not None:
-            debt_total += float(d.balances.first())
+        if d.latest_balance is not None:
+            debt_total += float(d.latest_balance)
 
     for d in revolving_debts:
-        if d.balances.first() is not None:
-            debt_total += float(d.balances.first())
+        if d.latest_balance is not None:
+            debt_total += float(d.latest_balance)
 
     net_worth_total = asset_total - debt_total
 
@@ -1038,6 +1028,7 @@ def view_installment_debt_details(request, id):
         context['debt'] = InstallmentDebt.objects.get(id=id, user_id=request.user.id)
     except InstallmentDebt.DoesNotExist:
         raise Http404
+    context['amortization'] = get_amortization_schedule(context['debt'])
     return render(request, 'assets-debts/view_installment_debt.html', context)
 
 
@@ -1063,21 +1054,24 @@ def get_month_and_year_from_request(request):
 # Add Budget Views
 # Do not use @login_required as it will cause an error
 def get_budget_period(user, month, year):
+    """
+    Gets a user's budget period from the month and year in a URL.
+
+    Raises:
+        Http404: If the month isn't a month name or number.
+        BudgetPeriod.DoesNotExist: If the user has no budget for that month.
+    """
     month = str(month)  # Convert for testing
-    bp = None
 
     try:
-        if month.isalpha:  # Convert from alpha (e.g. july) to int (e.g. 7)
+        if month.isalpha():  # Convert from alpha (e.g. july) to int (e.g. 7)
             datetime_object = datetime.strptime(month, '%B')
             month_by_num = datetime_object.month
         else:
             month_by_num = int(month)
-        bp = BudgetPeriod.objects.get(user=user, month=month_by_num, year=year)
-    except BudgetPeriod.DoesNotExist:
-        raise BudgetPeriod.DoesNotExist
-    except Exception as err:
-        return HttpResponseNotFound(f"Page not found! Here is the error: {err} {type(err)}")
-    return bp
+    except ValueError:
+        raise Http404(f'{month} is not a month')
+    return BudgetPeriod.objects.get(user=user, month=month_by_num, year=year)
 
 
 @login_required
@@ -1143,99 +1137,18 @@ class AddBudgetPeriod(LoginRequiredMixin, FormView, SuccessMessageMixin):
         month = datetime.strptime(split_url[-4], '%B').month
         year = split_url[-3]
 
-        form_sbb = form.cleaned_data['starting_bank_balance']
-        form_scb = form.cleaned_data['starting_cash_balance']
-
         try:
-            # Create a new budget period
-            BudgetPeriod(year=year,
-                         month=month,
-                         starting_bank_balance=form_sbb,
-                         starting_cash_balance=form_scb,
-                         user_id=current_user)\
-                .save()
-
-            # Retrieve the new budget period
-            new_bp = BudgetPeriod.objects.get(year=year, month=month, user_id=current_user)
-
-            # Check to see if there is a template budget period - if there is add those items to current budget
-            template_bp = form.cleaned_data['template']
-            if template_bp:
-                # Add income budget items to the new budget period
-                ibi = IncomeBudgetItem.objects.filter(budget_period_id=template_bp)
-                for item in ibi:
-                    item.pk = None
-                    item.budget_period_id = new_bp.id
-                    # TODO: Figure out how to delete this print statement - expense budget items won't transfer without
-                    # Possibly a sync issue
-                    print('item')
-                    print(item)
-                    item.save()
-                # Add expense categories and expense budget items to the new budget period
-                ec = ExpenseCategory.objects.filter(budget_period_id=template_bp).exclude(name='New Debt')
-                for category in ec:
-                    budget_items = category.expense_budget_items.all()
-                    print('Budget Items')
-                    print(budget_items)
-                    category.id = None
-                    category.budget_period_id = new_bp.id
-                    category.save()
-                    print(category)
-                    new_id = category.id
-
-                    for i in budget_items:
-                        i.id = None
-                        i.expense_category_id = new_id
-                        i.save()
-
-            usable_bank_balance = form.cleaned_data['usable_bank_balance']
-            if usable_bank_balance > 0:
-                reserve_bi = IncomeBudgetItem(
-                    name='Bank Reserve',
-                    planned_amount=usable_bank_balance,
-                    budget_period_id=new_bp.id,
-                    user_id=current_user,
-                    type='Reserve'
-                )
-                reserve_bi.save()
-
-            usable_cash_balance = form.cleaned_data['usable_cash_balance']
-            if usable_cash_balance > 0:
-                reserve_bi = IncomeBudgetItem(
-                    name='Cash Reserve',
-                    planned_amount=usable_cash_balance,
-                    budget_period_id=new_bp.id,
-                    user_id=current_user,
-                    type='Reserve'
-                )
-                reserve_bi.save()
-
-            add_money_schedule_items = form.cleaned_data['add_money_schedule_items']
-
-            # Check for current month's budget items
-            items_for_month = []
-            if add_money_schedule_items:
-                # for item in ScheduleItem.objects.filter(user=self.request.user.id).exclude(frequency="Monthly"):
-                for item in ScheduleItem.objects.filter(user=self.request.user.id):
-                    match = item.monthly_occurrences(int(year), int(month))
-                    if match:
-                        items_for_month.append(item.monthly_occurrences(int(year), int(month)))
-
-                # Add money schedule items to budget
-                for item in items_for_month:
-                    # Check if expense category already exists
-                    expense_cat, cat_created = ExpenseCategory.objects.get_or_create(
-                        user_id=current_user,
-                        budget_period=new_bp,
-                        name=item[0].category)
-
-                    expense_item, item_created = ExpenseBudgetItem.objects.get_or_create(
-                        expense_category=expense_cat,
-                        name=item[0].name,
-                        planned_amount=item[0].amount,
-                        user_id=item[0].user_id,
-                    )
-
+            create_budget_period(
+                current_user,
+                int(year),
+                month,
+                starting_bank_balance=form.cleaned_data['starting_bank_balance'],
+                starting_cash_balance=form.cleaned_data['starting_cash_balance'],
+                usable_bank_balance=form.cleaned_data['usable_bank_balance'],
+                usable_cash_balance=form.cleaned_data['usable_cash_balance'],
+                template=form.cleaned_data['template'],
+                include_schedule_items=form.cleaned_data['add_money_schedule_items'],
+            )
         except IntegrityError:
             messages.error(self.request, f"Budget already exists for {month}, {year}.")
             return HttpResponseRedirect(self.request.get_full_path())
@@ -1244,6 +1157,125 @@ class AddBudgetPeriod(LoginRequiredMixin, FormView, SuccessMessageMixin):
         return super(AddBudgetPeriod, self).form_valid(form)
 
 
+class RollForwardBudget(LoginRequiredMixin, FormView):
+    template_name = 'budget/roll_forward_budget.html'
+    form_class = RollForwardForm
+    success_url = '../'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        month, year = get_month_and_year_from_request(self.request)
+        context['month'] = month.capitalize()
+        context['year'] = year
+        return context
+
+    def form_valid(self, form):
+        month, year = get_month_and_year_from_request(self.request)
+        try:
+            bp = get_budget_period(self.request.user.id, month, year)
+        except BudgetPeriod.DoesNotExist:
+            raise Http404('Budget does not exist')
+
+        new_bps = roll_forward(bp, form.cleaned_data['months'], form.cleaned_data['add_money_schedule_items'])
+        if new_bps:
+            messages.success(self.request, f'{len(new_bps)} budgets successfully added!')
+        else:
+            messages.error(self.request, 'Budgets already exist for all of those months.')
+        return super(RollForwardBudget, self).form_valid(form)
+
+
+class ImportTransactions(LoginRequiredMixin, FormView):
+    template_name = 'budget/import_transactions.html'
+    form_class = ImportTransactionsForm
+    success_url = './'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            month, year = get_month_and_year_from_request(request)
+            try:
+                self.bp = get_budget_period(request.user.id, month, year)
+            except BudgetPeriod.DoesNotExist:
+                raise Http404('Budget does not exist')
+        return super(ImportTransactions, self).dispatch(request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super(ImportTransactions, self).get_form_kwargs()
+        kwargs['budget_period'] = self.bp
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        month, year = get_month_and_year_from_request(self.request)
+        context['month'] = month.capitalize()
+        context['year'] = year
+        return context
+
+    def form_valid(self, form):
+        try:
+            result = import_statement(self.bp,
+                                      iter_statement_rows(form.cleaned_data['statement']),
+                                      form.cleaned_data['expense_budget_item'],
+                                      form.cleaned_data['income_budget_item'],
+                                      form.cleaned_data['auto_categorize'])
+        except ValueError as err:
+            # Batches written before the bad row are kept and skipped as duplicates on the next import
+            form.add_error('statement', str(err))
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'Imported {result.expenses_created} expense and {result.income_created} '
+                                       f'income transactions. Skipped {result.duplicates} already imported and '
+                                       f'{result.outside_period} from other months.')
+        return super(ImportTransactions, self).form_valid(form)
+
+
+class SplitExpenseTransaction(LoginRequiredMixin, FormView):
+    template_name = 'budget/split_expense_transaction.html'
+    form_class = SplitFormSet
+    success_url = '../../view'
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            month, year = get_month_and_year_from_request(request)
+            try:
+                self.bp = get_budget_period(request.user.id, month, year)
+            except BudgetPeriod.DoesNotExist:
+                raise Http404('Budget does not exist')
+            self.expense_transaction = get_object_or_404(
+                ExpenseTransaction,
+                id=self.kwargs['etid'],
+                user_id=request.user.id,
+                expense_budget_item__expense_category__budget_period=self.bp,
+            )
+        return super(SplitExpenseTransaction, self).dispatch(request, *args, **kwargs)
+
+    def get_initial(self):
+        return [{
+            'expense_budget_item': self.expense_transaction.expense_budget_item_id,
+            'amount': self.expense_transaction.amount,
+        }]
+
+    def get_form_kwargs(self):
+        kwargs = super(SplitExpenseTransaction, self).get_form_kwargs()
+        kwargs['form_kwargs'] = {'budget_period': self.bp}
+        kwargs['total'] = self.expense_transaction.amount
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['expense_transaction'] = self.expense_transaction
+        return context
+
+    def form_valid(self, form):
+        try:
+            parts = split_expense_transaction(self.expense_transaction, form.get_allocations())
+        except ValueError as err:
+            form.non_form_errors().append(str(err))
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'Expense transaction successfully split into {len(parts)} parts!')
+        return super(SplitExpenseTransaction, self).form_valid(form)
+
+
 class UpdateBudgetPeriod(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     model = BudgetPeriod
     fields = ['starting_bank_balance', 'starting_cash_balance']
@@ -1257,14 +1289,12 @@ class UpdateBudgetPeriod(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
 
 
 # TODO: Fix auto reserve - only shows cash reserves
-# TODO: Add transaction splitting
 # TODO: Add an add transaction button
 # TODO: Add autofill
 # TODO: Allow users to move categories and budget items
 # TODO: Prevent users from being able to add reserve transactions - it should be automatically
 # TODO: Prevent negative incomes
 # TODO: Add the ability to move transactions to other budget items
-# TODO: Add quick edits with Ajax
 # TODO: Add expense fund calculator
 # TODO: Add a notification of outstanding CC balances from previous month
 # TODO: Fix forms when duplicate data is added (e.g. adding a budget template and adding money schedule items
@@ -1279,147 +1309,25 @@ def specific_budget(request, month, year):
     try:
         bp = get_budget_period(user=request.user.id, month=month, year=year)
 
-        total_planned_income = Decimal(0.00)
-        total_planned_expenses = Decimal(0.00)
-        total_actual_income = Decimal(0.00)
-        total_actual_expenses = Decimal(0.00)
-        total_bank_income = Decimal(0.00)
-        total_bank_expenses = Decimal(0.00)
-        total_cash_income = Decimal(0.00)
-        total_cash_expenses = Decimal(0.00)
-        total_new_debt = Decimal(0.00)
-        total_paid_debt = Decimal(0.00)
-        reserved_funds = Decimal(0.00)
-
-        income_budget_items = bp.income_budget_items.all()
-
-        all_transactions = []
-
-        for item in income_budget_items:
-            total_planned_income += item.planned_amount
-
-            # Check if reserved funds
-            if item.type == 'Reserve':
-                total_actual_income += item.planned_amount
-                reserved_funds += item.planned_amount
-
-            # Total income transactions
-            for t in item.income_transactions.all():
-                total_actual_income += t.amount
-                all_transactions.append(t)
-                if t.cash:
-                    total_cash_income += t.amount
-                elif not t.cash:
-                    total_bank_income += t.amount
-
-        # Check the transactions for new debt and adjust if needed
-        print('Transactions Filter Method')
-
-        credit_expense_transactions = ExpenseTransaction.objects.filter(
-            expense_budget_item__expense_category__budget_period=bp,
-            credit_purchase=True
-        )
-        print(f'Sum {credit_expense_transactions.aggregate(Sum("amount"))}')
-        cc_purchase_total = credit_expense_transactions.aggregate(Sum('amount'))['amount__sum'] or Decimal(0.00)
-
-        new_debt_category = bp.expense_categories.filter(name='New Debt')
-        print(f'New debt {new_debt_category}')
-
-        if new_debt_category:
-            print('New Debt Exists')
-            new_debt_budget_item = new_debt_category[0].expense_budget_items.all()[0]
-
-            if new_debt_budget_item.planned_amount == cc_purchase_total:
-                print('Do nothing w/ new debt!')
-            else:
-                print('Modifying new debt!')
-                new_debt_budget_item.planned_amount = cc_purchase_total
-                if new_debt_budget_item.planned_amount == 0:
-                    print('Planned amount is 0, remove New Debt')
-                    new_debt_budget_item.expense_category.delete()
-                else:
-                    print('Planned amount is not 0, modify New Debt')
-                    new_debt_budget_item.save()
-        if not new_debt_category and cc_purchase_total:
-            try:
-                user = request.user
-                expense_cat, cat_created = ExpenseCategory.objects.get_or_create(
-                    user=user,
-                    budget_period=bp,
-                    name='New Debt')
-                expense_bi, created = ExpenseBudgetItem.objects.get_or_create(
-                    user=user,
-                    expense_category=expense_cat,
-                    name='New Debt',
-                    planned_amount=cc_purchase_total,
-                )
-                expense_bi.planned_amount = cc_purchase_total
-                expense_bi.save()
-            except IntegrityError:
-                print(f'Your data has not been saved.')
-
-        # Sum the planned expenses
-        old_debt_paid = Decimal(0.00)
-
-        expense_categories = bp.expense_categories.all()
-
-        for category in expense_categories:
-            for expense_budget_item in category.expense_budget_items.all():
-                if expense_budget_item.name != 'New Debt':
-                    total_planned_expenses += expense_budget_item.planned_amount
-
-                # Check if reserved funds
-                if expense_budget_item.type == 'Reserve':
-                    total_actual_expenses += expense_budget_item.planned_amount
-                    reserved_funds -= expense_budget_item.planned_amount
-
-                for t in expense_budget_item.expense_transactions.all():
-                    # total_actual_expenses += t.amount
-                    all_transactions.append(t)
-                    if t.credit_purchase:
-                        total_new_debt += t.amount
-                    elif t.cash:
-                        total_cash_expenses += t.amount
-                        total_actual_expenses += t.amount
-                    else:
-                        total_bank_expenses += t.amount
-                        total_actual_expenses += t.amount
-                    if t.credit_payoff:
-                        old_debt_paid += t.amount
-                        total_paid_debt += t.amount
-
-        # Add debt payment transactions to all_transactions
-        try:
-            new_debt = bp.expense_categories.get(name='New Debt')
-        except ExpenseCategory.DoesNotExist:
-            new_debt = None
-        if new_debt:
-            # Remove New Debt from queryset and re-add it to a list to add it to the end
-            expense_categories = expense_categories.exclude(name='New Debt')
-            expense_categories = list(expense_categories)
-            expense_categories.append(bp.expense_categories.get(name='New Debt'))
+        income_budget_items = bp.income_budget_items.with_totals()
 
-        sorted_transactions = sorted(all_transactions, key=lambda x: x.date, reverse=True)
+        summary = summarize_budget_period(bp)
+        ledger_page = get_ledger_page(bp)
+
+        # Move New Debt to the end of the expense categories
+        expense_categories = list(bp.expense_categories.prefetch_related(
+            Prefetch('expense_budget_items', queryset=ExpenseBudgetItem.objects.with_totals())
+        ))
+        new_debt = next((category for category in expense_categories if category.is_new_debt()), None)
+        if new_debt:
+            expense_categories.remove(new_debt)
+            expense_categories.append(new_debt)
 
     except BudgetPeriod.DoesNotExist:
         return HttpResponseRedirect('add-budget/')
     except Exception as err:
         return HttpResponseNotFound(f"Page not found! Here is the error: {err} {type(err)}")
 
-    left_to_plan = total_planned_income - total_planned_expenses
-    left_to_spend = total_actual_income - total_actual_expenses
-    total_remaining_debt = total_new_debt - total_paid_debt
-
-    print('total_bank_income: ', total_bank_income)
-    print('total_bank_expenses: ', total_bank_expenses)
-    bank_balance_change = total_bank_income - total_bank_expenses
-    current_bank_balance = bp.starting_bank_balance + bank_balance_change
-
-    print('total_cash_income: ', total_cash_income)
-    print('total_cash_expenses: ', total_cash_expenses)
-    cash_balance_change = total_cash_income - total_cash_expenses
-    current_cash_balance = bp.starting_cash_balance + cash_balance_change
-
     return render(request,
                   'budget/view_budget.html',
                   {
@@ -1428,27 +1336,143 @@ def specific_budget(request, month, year):
                    'income_budget_items': income_budget_items,
                    'expense_categories': expense_categories,
                    'new_debt': new_debt,
-                   'total_planned_income': total_planned_income,
-                   'total_planned_expenses': total_planned_expenses,
-                   'total_actual_income': total_actual_income,
-                   'total_actual_expenses': total_actual_expenses,
-                   'total_new_debt': total_new_debt,
-                   'total_paid_debt': total_paid_debt,
-                   'total_remaining_debt': total_remaining_debt,
-                   'left_to_plan': left_to_plan,
-                   'left_to_spend': left_to_spend,
                    'bp_id': bp.id,
-                   'all_transactions': sorted_transactions,
+                   'all_transactions': ledger_page.transactions,
+                   'next_cursor': ledger_page.next_cursor,
                    'starting_bank_balance': bp.starting_bank_balance,
-                   'bank_balance_change': bank_balance_change,
-                   'current_bank_balance': current_bank_balance,
                    'starting_cash_balance': bp.starting_cash_balance,
-                   'cash_balance_change': cash_balance_change,
-                   'current_cash_balance': current_cash_balance,
+                   **summary,
                   }
                   )
 
 
+@login_required
+def view_year_overview(request, year):
+    """ Shows the planned and actual totals of every budget in a year side by side """
+    budget_periods = {bp.month: bp for bp in BudgetPeriod.objects.filter(user=request.user.id, year=year)}
+    summaries = read_budget_period_summaries(budget_periods.values())
+
+    months = []
+    year_totals = dict.fromkeys(
+        ('total_planned_income', 'total_planned_expenses', 'total_actual_income', 'total_actual_expenses',
+         'left_to_spend'),
+        Decimal(0.00),
+    )
+    for month_number in range(1, 13):
+        month_name = calendar.month_name[month_number]
+        bp = budget_periods.get(month_number)
+        summary = summaries[bp.id] if bp else None
+        if summary:
+            for key in year_totals:
+                year_totals[key] += summary[key]
+        months.append({'name': month_name, 'url_name': month_name.lower(), 'summary': summary})
+
+    return render(request,
+                  'budget/view_year_overview.html',
+                  {
+                   'year': year,
+                   'months': months,
+                   'year_totals': year_totals,
+                  }
+                  )
+
+
+@login_required
+def view_ledger(request, month, year):
+    """ Shows a budget period's transactions a page at a time, newest first, and moves selected ones to other items """
+    try:
+        bp = get_budget_period(user=request.user.id, month=month, year=year)
+    except BudgetPeriod.DoesNotExist:
+        return HttpResponseRedirect('add-budget/')
+
+    form = MoveTransactionsForm(request.POST or None, budget_period=bp)
+    if request.method == 'POST' and form.is_valid():
+        expenses_moved, income_moved = move_transactions(request.user.id,
+                                                         [expense.id for expense in form.cleaned_data['expense']],
+                                                         [income.id for income in form.cleaned_data['income']],
+                                                         form.cleaned_data['expense_budget_item'],
+                                                         form.cleaned_data['income_budget_item'])
+        messages.success(request, f'Moved {expenses_moved} expense and {income_moved} income transactions.')
+        return HttpResponseRedirect(request.get_full_path())
+
+    try:
+        ledger_page = get_ledger_page(bp, request.GET.get('cursor'))
+    except ValueError:
+        raise Http404('Invalid ledger cursor')
+
+    return render(request,
+                  'budget/view_ledger.html',
+                  {
+                   'month': month.capitalize(),
+                   'year': year,
+                   'transactions': ledger_page.transactions,
+                   'next_cursor': ledger_page.next_cursor,
+                   'form': form,
+                  }
+                  )
+
+
+@login_required
+def suggest_expense_budget_items(request, month, year):
+    """ Returns the budget items that a transaction name most likely belongs in based on past transactions """
+    try:
+        bp = get_budget_period(user=request.user.id, month=month, year=year)
+    except BudgetPeriod.DoesNotExist:
+        raise Http404('Budget does not exist')
+
+    items = suggest_budget_items(bp, request.GET.get('name', ''))
+    return JsonResponse({'suggestions': [
+        {
+            'id': item.id,
+            'name': item.name,
+            'category': item.expense_category.name,
+            'url': f'expense-category/{item.expense_category_id}/expense-budget-item/{item.id}/add-expense-transaction',
+        }
+        for item in items
+    ]})
+
+
+@login_required
+@require_POST
+def quick_edit(request, month, year, kind, id=None):
+    """
+    Adds or updates a budget item or transaction from the budget page without reloading it.
+
+    Returns the changed rows and how the budget's totals changed as JSON, or the form errors with a 400 status.
+    """
+    try:
+        bp = get_budget_period(user=request.user.id, month=month, year=year)
+    except BudgetPeriod.DoesNotExist:
+        raise Http404('Budget does not exist')
+    if kind not in QUICK_EDIT_KINDS:
+        raise Http404('Nothing to edit')
+
+    instance = get_object_or_404(get_quick_edit_queryset(kind, bp), id=id) if id else None
+    form = get_quick_edit_form(kind, bp, request.POST, instance)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        result = save_quick_edit(kind, bp, form)
+    except IntegrityError:
+        return JsonResponse({'errors': {'__all__': [f'There is already an entry for {form.instance}.']}}, status=400)
+    return JsonResponse(result, status=200 if id else 201)
+
+
+@login_required
+@require_POST
+def quick_delete(request, month, year, kind, id):
+    """ Deletes a budget item or transaction from the budget page and returns what changed as JSON """
+    try:
+        bp = get_budget_period(user=request.user.id, month=month, year=year)
+    except BudgetPeriod.DoesNotExist:
+        raise Http404('Budget does not exist')
+    if kind not in QUICK_EDIT_KINDS:
+        raise Http404('Nothing to delete')
+
+    obj = get_object_or_404(get_quick_edit_queryset(kind, bp), id=id)
+    return JsonResponse(delete_quick_edit(kind, bp, obj))
+
+
 @login_required
 def change_budget(request, month, year):
     month = datetime.strptime(month, '%B').month
@@ -1599,6 +1623,7 @@ class AddExpenseTransaction(LoginRequiredMixin, SuccessMessageMixin, CreateView)
         # TODO: Make sure foreign key 'Budget Item' only shows that months items
         return {
                 'date': datetime.today(),
+                'name': self.request.GET.get('name', ''),  # Carried over when switching to a suggested item
                 }
 
     def get_success_url(self):
@@ -1627,33 +1652,6 @@ class AddExpenseTransaction(LoginRequiredMixin, SuccessMessageMixin, CreateView)
         user = self.request.user
         form.instance.user = user
         form.instance.expense_budget_item_id = self.request.get_full_path().split('/')[-2]
-
-        # If transaction was a credit purchase, add item to new debt expense
-        if form.cleaned_data['credit_purchase']:
-            month, year = get_month_and_year_from_request(self.request)
-            bp = get_budget_period(user, month, year)
-            expense_cat, cat_created = ExpenseCategory.objects.get_or_create(
-                user=user,
-                budget_period=bp,
-                name='New Debt')
-
-            try:
-                expense_bi, created = ExpenseBudgetItem.objects.get_or_create(
-                    user=user,
-                    expense_category=expense_cat,
-                    name='New Debt',
-                    defaults={'planned_amount': 0},
-                )
-                expense_bi.planned_amount += form.cleaned_data['amount']
-                expense_bi.save()
-            except IntegrityError:
-                return self.render_to_response(
-                    self.get_context_data(
-                        form=form,
-                        message=f'Your data has not been saved because'
-                                f' there is already an entry for {form.instance.date}.',
-                    )
-                )
         return super(AddExpenseTransaction, self).form_valid(form)
 
 
@@ -1740,74 +1738,57 @@ class AddDebtPayment(LoginRequiredMixin, SuccessMessageMixin, CreateView):
 
 
 # Schedule Views
-def get_items_by_frequency(request, frequency):
+# Schedule item frequencies - (context key, frequency)
+SCHEDULE_FREQUENCIES = (
+    ('weekly', 'Weekly'),
+    ('every_two_weeks', 'Every two weeks'),
+    ('monthly', 'Monthly'),
+    ('every_two_months', 'Every two months'),
+    ('quarterly', 'Quarterly'),
+    ('every_six_months', 'Every six months'),
+    ('yearly', 'Yearly'),
+    ('one_time', 'One time only'),
+)
+
+
+def get_schedule_summary(request):
     """
-    Get schedule items by frequency and user ID
+    Gets all of the schedule items for a particular user split up by frequency along with their yearly totals.
+    Fetches the items once and totals them with a single grouped query.
+
     Parameters:
         request (django.core.handlers.wsgi.WSGIRequest): The current request
-        frequency (str): The schedule item frequency
 
     Returns:
-        django.db.models.query.QuerySet: Schedule items
+        tuple[list[ScheduleItem], dict, dict]: All items, the items by frequency key and the totals by frequency key
     """
-    return ScheduleItem\
-        .objects\
-        .filter(user=request.user.id, frequency=frequency)\
+    items = list(
+        ScheduleItem.objects
+        .filter(user=request.user.id)
         .order_by('first_due_date__month', 'first_due_date__day')
+    )
 
+    frequency_sums = dict(
+        ScheduleItem.objects
+        .filter(user=request.user.id)
+        .values('frequency')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('frequency', 'total')
+    )
 
-def get_all_schedule_items(request):
-    """
-    Gets a dictionary of all the schedule items for a particular user.
-    Parameters:
-        request (django.core.handlers.wsgi.WSGIRequest): The current request
-
-    Returns:
-        dict: Contains frequency (str) and schedule items (QuerySet)
-    """
-    all_schedule_items = {
-        'weekly': get_items_by_frequency(request, 'Weekly'),
-        'every_two_weeks': get_items_by_frequency(request, 'Every two weeks'),
-        'monthly': get_items_by_frequency(request, 'Monthly'),
-        'every_two_months': get_items_by_frequency(request, 'Every two months'),
-        'quarterly': get_items_by_frequency(request, 'Quarterly'),
-        'every_six_months': get_items_by_frequency(request, 'Every six months'),
-        'yearly': get_items_by_frequency(request, 'Yearly'),
-        'one_time': get_items_by_frequency(request, 'One time only'),
-    }
-    return all_schedule_items
-
-
-def get_all_schedule_totals(request):
-    """
-        Gets a dictionary of all the schedule item totals for a particular user.
-        Parameters:
-            request (django.core.handlers.wsgi.WSGIRequest): The current request
-
-        Returns:
-            dict
-        """
-    all_items = get_all_schedule_items(request)
-    all_totals = {
-        'weekly_total': (all_items['weekly'].aggregate(Sum('amount'))['amount__sum'] or 0) * 52,
-        'every_two_weeks_total': (all_items['every_two_weeks'].aggregate(Sum('amount'))['amount__sum'] or 0) * 26,
-        'monthly_total': (all_items['monthly'].aggregate(Sum('amount'))['amount__sum'] or 0) * 12,
-        'every_two_months_total': (all_items['every_two_months'].aggregate(Sum('amount'))['amount__sum'] or 0) * 6,
-        'quarterly_total': (all_items['quarterly'].aggregate(Sum('amount'))['amount__sum'] or 0) * 4,
-        'every_six_months_total': (all_items['every_six_months'].aggregate(Sum('amount'))['amount__sum'] or 0) * 2,
-        'yearly_total': (all_items['yearly'].aggregate(Sum('amount'))['amount__sum'] or 0) * 1,
-        'one_time_total': (all_items['one_time'].aggregate(Sum('amount'))['amount__sum'] or 0) * 1,
-    }
-    return all_totals
+    items_by_frequency = {}
+    totals = {}
+    for key, frequency in SCHEDULE_FREQUENCIES:
+        items_by_frequency[key] = [item for item in items if item.frequency == frequency]
+        totals[f'{key}_total'] = (frequency_sums.get(frequency) or 0) * DUE_DATES_PER_YEAR[frequency]
+    return items, items_by_frequency, totals
 
 
 @login_required
 def view_schedule(request):
-    # Grab all schedule items
-    context = get_all_schedule_items(request)
-
-    #  Grab all schedule item totals
-    totals = get_all_schedule_totals(request)
+    # Grab all schedule items and their totals
+    items, context, totals = get_schedule_summary(request)
 
     entire_total = Decimal(0.00)
     non_monthly_total = Decimal(0.00)
@@ -1825,36 +1806,27 @@ def view_schedule(request):
     totals['non_monthly_per_month_total'] = Decimal("{:.2f}".format(non_monthly_total / 12))
 
     context['totals'] = totals
-    print('Context')
-    print(context)
-
-    month_labels, year_month_tuple = get_last_12_months_labels(get_next_12=True)
-    print(month_labels)
-    print(year_month_tuple)
 
-    # Separate the month from the year on the last element in the list and add them to separate variables
-    month_labels[11], year = month_labels[11].split(' ')
+    months = get_schedule_horizon(request)
+    month_labels, year_month_tuple = get_month_labels(months, get_next=True)
 
-    # Loop through months and add the year next to Jan
-    for idx, month in enumerate(month_labels):
-        if month == 'Jan':
-            month_labels[idx] = 'Jan ' + year
+    # Show the year on the first month and on every January
+    for idx, (year, month) in enumerate(year_month_tuple):
+        month_labels[idx] = month_labels[idx].split(' ')[0]
+        if idx == 0 or month == '1':
+            month_labels[idx] += ' ' + year
 
-    item_data = []
-
-    # Loop through a year of year/month pairs
-    idx = 0
-    for year, month in year_month_tuple:
-        # Loop through all schedule items
-        month_total = Decimal(0.0)
-        for item in ScheduleItem.objects.filter(user=request.user.id).exclude(frequency="Monthly"):
-            month_total += item.get_monthly_total(int(year), int(month))
-        item_data.append((month_labels[idx], "{:0.2f}".format(month_total)))
-        idx += 1
+    # Project every non-monthly item across all months at once
+    projection = project_schedule([item for item in items if item.frequency != 'Monthly'], year_month_tuple)
+    item_data = [
+        (label, "{:0.2f}".format(cents_to_decimal(total)))
+        for label, total in zip(month_labels, projection.totals)
+    ]
 
     context['month_data'] = item_data
+    context['months'] = months
+    context['horizons'] = SCHEDULE_HORIZONS
 
-    # TODO: Fix month column to show the new year next to January
     # TODO: Fix alignment and formatting
     return render(request, 'money-schedule/view_schedule.html', context)
 
@@ -1898,74 +1870,35 @@ class DeleteScheduleItem(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
         return super(DeleteScheduleItem, self).delete(request, *args, **kwargs)
 
 
-def get_active_items(request):
-    """ Return only active schedule items for requested user """
-    items = ScheduleItem.objects.filter(user_id=request.user.id)
-    print(items)
-    active_item_ids = [item.id for item in items if item.is_active() == True]
-    active_items = items.filter(id__in=active_item_ids)
-    return active_items
-
-
+@login_required
 def calculate_expense_fund(request):
     """ A form to figure out how much to contribute to your emergency fund """
 
+    strategy = request.GET.get('strategy', 'flat')
+    if strategy not in dict(EXPENSE_FUND_STRATEGIES):
+        strategy = 'flat'
+
+    months = get_schedule_horizon(request)
+    next_months, year_month_tuples = get_month_labels(months, get_next=True)
+
     # TODO: Figure out how to handle weekly and every two weeks - add only the extra amounts to the non-monthly total?
-    # Get total of all items except 'monthly' items
-    totals = get_all_schedule_totals(request)
-    non_monthly_total = Decimal(0.00)
-    for key, value in totals.items():
-        entire_total = 0
-        if key != 'monthly_total':
-            non_monthly_total += value
-        entire_total += value
-    non_monthly_total = non_monthly_total
+    projection, simulation, non_monthly_total, suggestion = run_expense_fund_simulation(
+        request.user, year_month_tuples, strategy
+    )
     non_monthly_total_avg = non_monthly_total / 12
-    suggestion = math.ceil(non_monthly_total_avg / 10) * 10
 
-    next_12_months, year_month_tuples = get_last_12_months_labels(True)
-    print('year_month_tuples')
-    print(year_month_tuples)
-    print(next_12_months)
     table_data = []
-    last_month_balance = 0
-    print('get_all_schedule_totals(request)')
-    print(get_all_schedule_totals(request))
-    for idx in range(12):
-        print('idx:', idx)
-        if idx == 0:
-            fund_in = suggestion
-        else:
-            fund_in = suggestion
-
-        # Get month and year based on index of loop
-        current_month = year_month_tuples[idx][1]
-        current_year = year_month_tuples[idx][0]
-
-        # Loop through all objects
-        print('Month/Year: ' + current_month + '/' + current_year)
-        active_items = get_active_items(request)
-        month_total = 0
-        for item in active_items:
-            # item.get_monthly_total(current_year, current_month)
-            print(item.name, '-', item.get_monthly_total(current_year, current_month))
-            month_total += item.get_monthly_total(current_year, current_month)
-        print('Month Total: ' + str(month_total))
-        fund_out = month_total
-        current_month_balance = last_month_balance + fund_in - fund_out
-        last_month_balance = current_month_balance
+    for idx in range(months):
         month_data = {
-            'month': next_12_months[idx],
-            'fund_in': fund_in,
-            'fund_out': fund_out,
-            'fund_balance': current_month_balance,
+            'month': next_months[idx],
+            'fund_in': cents_to_decimal(simulation.contributions[idx]),
+            'fund_out': cents_to_decimal(simulation.outflows[idx]),
+            'fund_balance': cents_to_decimal(simulation.balances[idx]),
         }
         table_data.append(month_data)
 
-    print(table_data)
-
     # TODO: Add expenses that may happen outside of the next year to make sure they are accounted for
-    active_items = get_active_items(request).exclude(frequency="Monthly")
+    active_items = [item for item in projection.items if item.frequency != 'Monthly']
     active_items = sorted(active_items, key=lambda a: a.get_next_payment())
 
     return render(
@@ -1975,21 +1908,134 @@ def calculate_expense_fund(request):
             "suggestion": suggestion,
             "non_monthly_total": format_to_currency_str(non_monthly_total),
             "non_monthly_total_avg": format_to_currency_str(non_monthly_total_avg),
-            "next_12_months": next_12_months,
+            "next_months": next_months,
             "table_data": table_data,
-            "non_monthly_total": format_to_currency_str(non_monthly_total),
-            "non_monthly_total_avg": format_to_currency_str(non_monthly_total_avg),
+            "months": months,
+            "horizons": SCHEDULE_HORIZONS,
+            "strategy": strategy,
+            "strategies": EXPENSE_FUND_STRATEGIES,
+            "minimum_balance": cents_to_decimal(simulation.minimum_balance),
+            "minimum_balance_month": next_months[simulation.minimum_balance_month],
         }
     )
 
 
 # Report Views
+# The longest range the reports page covers, ten years, so a far off start month can't build a huge table
+REPORT_MAX_MONTHS = 120
+
+
+def get_report_month(request, key, default):
+    """ Reads a YYYY-MM month from the query string or returns the default if it is missing or invalid """
+    try:
+        return datetime.strptime(request.GET.get(key, ''), '%Y-%m').date()
+    except ValueError:
+        return default
+
+
 # TODO: Asset and debts reports
 # TODO: Money schedule reports
 # TODO: Budget reports
 @login_required
 def view_reports(request):
-    return render(request, 'reports/reports.html')
+    """ Shows how much was spent in each expense category per month over a range of months """
+    this_month = datetime.today().date().replace(day=1)
+    last_month = get_report_month(request, 'end', this_month)
+    first_month = get_report_month(request, 'start', last_month - relativedelta(months=11))
+    if first_month > last_month:
+        first_month, last_month = last_month, first_month
+    first_month = max(first_month, last_month - relativedelta(months=REPORT_MAX_MONTHS - 1))
+
+    year_months, category_spending = get_category_spending(request.user.id, first_month, last_month)
+    month_labels = [datetime(year, month, 1).strftime('%b %Y') for year, month in year_months]
+    categories = [
+        {'name': name, 'totals': totals, 'total': sum(totals)}
+        for name, totals in category_spending
+    ]
+    monthly_totals = [sum(month_totals) for month_totals in zip(*[totals for name, totals in category_spending])]
+
+    return render(request, 'reports/reports.html', {
+        'start': first_month.strftime('%Y-%m'),
+        'end': last_month.strftime('%Y-%m'),
+        'month_labels': month_labels,
+        'categories': categories,
+        'monthly_totals': monthly_totals,
+        'grand_total': sum(monthly_totals),
+    })
+
+
+@login_required
+def view_search(request):
+    """ Searches the names of the user's transactions, budget items and schedule items across all budgets """
+    form = SearchForm(request.GET or None)
+    results = []
+    has_next = False
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    if form.is_valid():
+        search_page = search(request.user.id,
+                             form.cleaned_data['q'],
+                             form.cleaned_data['kinds'],
+                             form.cleaned_data['start'],
+                             form.cleaned_data['end'],
+                             form.cleaned_data['min_amount'],
+                             form.cleaned_data['max_amount'],
+                             page)
+        has_next = search_page.has_next
+        for result in search_page.results:
+            url = '/money-schedule/'
+            if result.budget_period:
+                url = f'/budget/{calendar.month_name[result.budget_period.month].lower()}/{result.budget_period.year}/'
+            results.append({'result': result, 'url': url})
+
+    query_string = request.GET.copy()
+    query_string.pop('page', None)
+    return render(request, 'search/search.html', {
+        'form': form,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+        'query_string': query_string.urlencode(),
+    })
+
+
+def stream_csv(rows, filename):
+    """ Sends rows as a CSV download, writing each row as the client reads it instead of building the whole file """
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse((writer.writerow(escape_csv_row(row)) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def export_transactions(request):
+    """ Downloads the user's income and expense transactions, optionally only for budgets between two months """
+    first_month = get_report_month(request, 'start', None)
+    last_month = get_report_month(request, 'end', None)
+    return stream_csv(iter_transaction_rows(request.user.id, first_month, last_month), 'transactions.csv')
+
+
+@login_required
+def export_balances(request):
+    """ Downloads the balance history of the user's assets and debts """
+    return stream_csv(iter_balance_rows(request.user.id), 'balances.csv')
+
+
+@login_required
+def backup_account(request):
+    """ Downloads the user's whole account as newline-delimited JSON, gzip compressed unless ?gzip=0 is given """
+    lines = iter_backup_lines(request.user)
+    filename = f'trackmydollars-backup-{datetime.today():%Y-%m-%d}.ndjson'
+    if request.GET.get('gzip') == '0':
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    else:
+        response = StreamingHttpResponse(iter_gzip(lines), content_type='application/gzip')
+        filename += '.gz'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 # Offer Views